@@ -0,0 +1,234 @@
+import argparse
+import asyncio
+import os
+import signal
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import database
+from cluster import INBOX_BATCH
+from benchmarks.fake_api import FakeBotAPI
+from benchmarks.fake_bot import FAKE_TOKEN, callback_update, message_update
+
+
+COUNTDOWN = "⏳ Осталось"
+
+
+def lease_rows(db_file: str) -> list:
+    conn = sqlite3.connect(db_file, timeout=5)
+    try:
+        return conn.execute(
+            "SELECT name, owner, token FROM leases WHERE expires_at > ? ORDER BY name", (time.time(),)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def backlog(db_file: str) -> Counter:
+    conn = sqlite3.connect(db_file, timeout=5)
+    try:
+        return Counter(dict(conn.execute("""
+            SELECT l.owner, COUNT(*) FROM update_inbox i JOIN leases l ON l.name = 'shard:' || i.shard
+            WHERE i.done_at IS NULL GROUP BY l.owner
+        """).fetchall()))
+    finally:
+        conn.close()
+
+
+def replies(api: FakeBotAPI, prefix: str) -> Counter:
+    return Counter(
+        chat_id for _, _, chat_id, text in api.delivered
+        if text and text.startswith(prefix) and COUNTDOWN not in text
+    )
+
+
+async def wait_for(condition, timeout: float, step: float = 0.1) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        await asyncio.sleep(step)
+    return condition()
+
+
+class Updates:
+    def __init__(self, api: FakeBotAPI):
+        self.api = api
+        self.next_id = 1
+
+    def _push(self, make, users, value):
+        updates = []
+        for user_id in users:
+            update = make(self.next_id, user_id, value)
+            updates.append(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+            self.next_id += 1
+        self.api.push_updates(updates)
+
+    def messages(self, users, text):
+        self._push(message_update, users, text)
+
+    def callbacks(self, users, data):
+        self._push(callback_update, users, data)
+
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Three bot workers sharing one database, with one killed mid-session")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--users", type=int, default=60)
+    parser.add_argument("--lease-seconds", type=float, default=2)
+    parser.add_argument("--backlog", type=int, default=10, help="/status messages per user pushed at once")
+    args = parser.parse_args(argv)
+
+    api = FakeBotAPI(global_rate=10_000, chat_rate=100, chat_burst=100, latency=0)
+    url = await api.start()
+    users = range(1, args.users + 1)
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "workbot.db")
+        database.DB_FILE = db_file
+        database.init_db()
+        database.close_db()
+
+        workers = []
+        for i in range(args.workers):
+            env = dict(
+                os.environ, BOT_TOKEN=FAKE_TOKEN, TELEGRAM_API_URL=url, CLUSTER_SHARDS=str(args.shards),
+                WORKER_ID=f"w{i}", LEASE_SECONDS=str(args.lease_seconds), METRICS_PORT="0",
+                ADMIN_ID="0", ALLOWED_USER_IDS="", OPEN_REGISTRATION="1",
+            )
+            log = open(os.path.join(tmp, f"w{i}.log"), "w")
+            workers.append(await asyncio.create_subprocess_exec(
+                sys.executable, os.path.join(ROOT, "main.py"), cwd=tmp, env=env, stdout=log, stderr=log,
+            ))
+
+        def started():
+            return sum(name.startswith("worker:") for name, _, _ in lease_rows(db_file)) == args.workers
+
+        start = time.monotonic()
+        if not await wait_for(started, 120):
+            failures.append("workers did not start")
+        print(f"workers started in {time.monotonic() - start:.1f} s")
+
+        def balanced():
+            rows = lease_rows(db_file)
+            shards = [owner for name, owner, _ in rows if name.startswith("shard:")]
+            leaders = [owner for name, owner, _ in rows if name == "scheduler"]
+            return len(shards) == args.shards and len(set(shards)) == args.workers and len(leaders) == 1
+
+        start = time.monotonic()
+        if not await wait_for(balanced, 10 * args.lease_seconds):
+            failures.append("shards were not spread over all workers")
+        rows = lease_rows(db_file)
+        owners = Counter(owner for name, owner, _ in rows if name.startswith("shard:"))
+        leader = [owner for name, owner, _ in rows if name == "scheduler"]
+        print(f"balanced in {time.monotonic() - start:.1f} s: shards per worker {dict(sorted(owners.items()))}, "
+              f"scheduler leader {leader}")
+
+        updates = Updates(api)
+        start = time.monotonic()
+        updates.messages(users, "/start")
+        await wait_for(lambda: len(replies(api, "👋")) == args.users, 30)
+        updates.callbacks(users, "set_work_duration")
+        await wait_for(lambda: len(replies(api, "Введи общее")) == args.users, 30)
+        updates.messages(users, "1")
+        await wait_for(lambda: len(replies(api, "✅ Общее")) == args.users, 30)
+        updates.callbacks(users, "set_session_duration")
+        await wait_for(lambda: len(replies(api, "Введи длину")) == args.users, 30)
+        updates.messages(users, "1")
+        await wait_for(lambda: len(replies(api, "✅ Длина")) == args.users, 30)
+        updates.callbacks(users, "start_work")
+        await wait_for(lambda: len(replies(api, "🚀")) == args.users, 30)
+        sent = updates.next_id - 1
+        print(f"{sent} updates answered in {time.monotonic() - start:.1f} s")
+        for prefix in ("👋", "Введи общее", "✅ Общее", "Введи длину", "✅ Длина", "🚀"):
+            counts = replies(api, prefix)
+            wrong = {user_id: counts[user_id] for user_id in users if counts[user_id] != 1}
+            if wrong:
+                failures.append(f"{prefix!r}: users without exactly one reply: {wrong}")
+
+        api.latency = 0.02
+        start = time.monotonic()
+        peak = Counter()
+        for _ in range(args.backlog):
+            updates.messages(users, "/status")
+        expected = args.users * args.backlog
+
+        def statuses_answered():
+            peak.update({owner: max(count - peak[owner], 0) for owner, count in backlog(db_file).items()})
+            return sum(replies(api, "📊 Статус").values()) >= expected
+
+        await wait_for(statuses_answered, 60)
+        api.latency = 0
+        counts = replies(api, "📊 Статус")
+        print(f"{expected} queued /status answered in {time.monotonic() - start:.1f} s, "
+              f"peak inbox backlog per worker {dict(sorted(peak.items()))} (claim batch {INBOX_BATCH})")
+        wrong = {user_id: counts[user_id] for user_id in users if counts[user_id] != args.backlog}
+        if wrong:
+            failures.append(f"/status backlog: users without exactly {args.backlog} replies: {wrong}")
+        if max(peak.values(), default=0) <= INBOX_BATCH:
+            failures.append(f"/status backlog never exceeded the claim batch of {INBOX_BATCH} on any worker")
+
+        await asyncio.sleep(args.lease_seconds)
+        victim = workers[0]
+        victim.send_signal(signal.SIGKILL)
+        await victim.wait()
+        killed = time.monotonic()
+        print(f"killed w0 (pid {victim.pid}) with {owners.get('w0', 0)} shards mid-session")
+
+        def taken_over():
+            rows = lease_rows(db_file)
+            return (
+                all(owner != "w0" for _, owner, _ in rows)
+                and sum(name.startswith("shard:") for name, _, _ in rows) == args.shards
+                and sum(name == "scheduler" for name, _, _ in rows) == 1
+            )
+
+        if not await wait_for(taken_over, 10 * args.lease_seconds):
+            failures.append("shards of the killed worker were not taken over")
+        rows = lease_rows(db_file)
+        print(f"took over in {time.monotonic() - killed:.1f} s: "
+              + ", ".join(f"{name}={owner}#{token}" for name, owner, token in rows if name != "worker:w0"))
+
+        await wait_for(lambda: len(replies(api, "🎉")) == args.users, 90, step=1)
+        await asyncio.sleep(args.lease_seconds)
+        ended = replies(api, "🎉")
+        missing = [user_id for user_id in users if ended[user_id] == 0]
+        duplicated = [user_id for user_id in users if ended[user_id] > 1]
+        print(f"session-end messages: {sum(ended.values())} for {args.users} users, "
+              f"missing {len(missing)}, duplicated {len(duplicated)}")
+        if missing or duplicated:
+            failures.append(f"session end missing for {missing}, duplicated for {duplicated}")
+
+        for worker in workers[1:]:
+            worker.send_signal(signal.SIGTERM)
+        for worker in workers[1:]:
+            try:
+                await asyncio.wait_for(worker.wait(), 15)
+            except asyncio.TimeoutError:
+                worker.kill()
+                failures.append(f"worker pid {worker.pid} did not stop on SIGTERM")
+        conn = sqlite3.connect(db_file)
+        pending = conn.execute("SELECT COUNT(*) FROM update_inbox WHERE done_at IS NULL").fetchone()[0]
+        conn.close()
+        print(f"inbox rows left unprocessed: {pending}")
+        if pending:
+            failures.append(f"{pending} inbox rows left unprocessed")
+        if failures:
+            for i in range(args.workers):
+                with open(os.path.join(tmp, f"w{i}.log")) as log:
+                    print(f"--- w{i} log tail ---\n" + "".join(log.readlines()[-20:]))
+    await api.stop()
+    for failure in failures:
+        print("FAIL: " + failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+YEARS = 5
+REQUESTS = 300
+PROBE_INTERVAL = 0.001
+USER_ID = 1
+
+
+def populate():
+    database.init_db()
+    start = date.today() - timedelta(days=365 * YEARS)
+    with database.get_conn() as conn:
+        for i in range(365 * YEARS):
+            d = (start + timedelta(days=i)).isoformat()
+            cur = conn.execute(
+                "INSERT INTO work_days (user_id, date, planned_minutes, worked_minutes, sessions_completed, started_at, completed) "
+                "VALUES (?, ?, 120, 120, 4, ?, 1)",
+                (USER_ID, d, f"{d}T14:00:00")
+            )
+            conn.executemany(
+                "INSERT INTO work_sessions (work_day_id, user_id, session_number, duration_minutes, started_at, finished_at) "
+                "VALUES (?, ?, ?, 30, ?, ?)",
+                [(cur.lastrowid, USER_ID, n, f"{d}T14:00:00", f"{d}T14:30:00") for n in range(1, 5)]
+            )
+    database.rebuild_rollups()
+
+
+def queries():
+    return [
+        (database.get_stats_today, (USER_ID,)),
+        (database.get_stats_week, (USER_ID,)),
+        (database.get_stats_month, (USER_ID,)),
+        (database.get_stats_custom, (USER_ID, 30)),
+        (database.get_all_time_stats, (USER_ID,)),
+    ]
+
+
+async def probe(stalls: list, stop: asyncio.Event):
+    while not stop.is_set():
+        planned = time.perf_counter() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        stalls.append(max(0.0, time.perf_counter() - planned))
+
+
+async def handler_sync(func, args):
+    func(*args)
+
+
+async def handler_async(func, args):
+    await database.run_db(func, *args)
+
+
+async def measure(handler) -> tuple:
+    stalls = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(stalls, stop))
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    qs = queries()
+    for i in range(REQUESTS):
+        func, args = qs[i % len(qs)]
+        await asyncio.gather(*(handler(func, args) for _ in range(4)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+    stalls.sort()
+    return elapsed, stalls[-1], stalls[int(len(stalls) * 0.99)], sum(stalls)
+
+
+def report(name: str, result: tuple):
+    elapsed, worst, p99, total = result
+    print(
+        f"{name:<24} wall {elapsed * 1000:8.1f} ms  "
+        f"max stall {worst * 1000:6.2f} ms  p99 stall {p99 * 1000:6.2f} ms  "
+        f"total stall {total * 1000:8.1f} ms"
+    )
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        populate()
+        report("sync on event loop", await measure(handler_sync))
+        report("run_db executor", await measure(handler_async))
+        database.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
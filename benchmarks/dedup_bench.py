@@ -0,0 +1,102 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import scheduler
+import storage
+from benchmarks.fake_bot import FakeSession, make_bot, callback_update
+from benchmarks.replay_bench import QueryCounter
+from dedup import CallbackDedup
+
+FIRST_USER_ID = 100_000
+
+
+def reset_users(users: int):
+    for user_id in range(FIRST_USER_ID, FIRST_USER_ID + users):
+        scheduler.timers.cancel(user_id)
+        storage.update_session(user_id, active=True, state="ready_check", deadline=None, next_transition=None)
+
+
+async def tap(users: int, taps: int, replays: int, counter: QueryCounter, dedup: CallbackDedup) -> dict:
+    from aiogram import Dispatcher
+    from handlers import router
+    session = FakeSession(latency=0.005)
+    bot = make_bot(session)
+    scheduler._bot = bot
+    dp = Dispatcher()
+    if dedup is not None:
+        dp.callback_query.outer_middleware(dedup)
+    router._parent_router = None
+    dp.include_router(router)
+
+    reset_users(users)
+    await asyncio.to_thread(database.flush_session_events)
+    with database.get_conn() as conn:
+        before = conn.execute("SELECT COUNT(*) FROM work_sessions").fetchone()[0]
+    counter.queries = 0
+    update_id = 0
+    bursts = []
+    for user_id in range(FIRST_USER_ID, FIRST_USER_ID + users):
+        burst = []
+        for _ in range(taps):
+            update_id += 1
+            burst.append(callback_update(update_id, user_id, "continue_work"))
+        bursts.append(burst + burst[:replays])
+    start = time.perf_counter()
+    await asyncio.gather(*(dp.feed_update(bot, update) for burst in bursts for update in burst))
+    elapsed = time.perf_counter() - start
+    await asyncio.to_thread(database.flush_session_events)
+    with database.get_conn() as conn:
+        started = conn.execute("SELECT COUNT(*) FROM work_sessions").fetchone()[0] - before
+    updates = users * (taps + replays)
+    return {
+        "updates": updates,
+        "seconds": elapsed,
+        "sessions_started": started,
+        "queries_per_update": counter.queries / updates,
+        "api_calls_per_update": len(session.calls) / updates,
+        "duplicates": dedup.duplicates if dedup is not None else 0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Burst double taps on continue_work with and without dedup")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--taps", type=int, default=3, help="concurrent taps per user")
+    parser.add_argument("--replays", type=int, default=1, help="redelivered callback ids per user")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    counter = QueryCounter()
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        database.TRACE_CALLBACK = counter
+        storage.DATA_FILE = os.path.join(tmp, "data.json")
+        database.init_db()
+        storage.load_users()
+        for user_id in range(FIRST_USER_ID, FIRST_USER_ID + args.users):
+            storage.register_user(user_id)
+        storage.flush()
+        print(f"{args.users} users x {args.taps} concurrent taps + {args.replays} replayed ids, Bot API latency 5 ms")
+        for name, dedup in (("router only", None), ("with dedup", CallbackDedup())):
+            r = await tap(args.users, args.taps, args.replays, counter, dedup)
+            print(
+                f"{name:<12} {r['updates']:,} updates in {r['seconds']:.2f} s  sessions started {r['sessions_started']:,}  "
+                f"DB queries/update {r['queries_per_update']:.2f}  API calls/update {r['api_calls_per_update']:.2f}  "
+                f"dropped {r['duplicates']:,}"
+            )
+        for user in storage.all_users():
+            scheduler.timers.cancel(user.user_id)
+        storage.flush()
+        database.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+import asyncio
+import gzip
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import manage
+from config import TIMEZONE
+from export import write_export
+
+YEARS = 10
+SESSIONS_PER_DAY = 8
+RANGES = (("1 week", 7), ("1 year", 365), ("10 years", 3650))
+
+
+async def probe_while_exporting(start, end, fmt: str) -> tuple:
+    task = asyncio.create_task(asyncio.to_thread(write_export, 1, start, end, fmt))
+    waits = []
+    while not task.done():
+        begin = time.perf_counter()
+        await database.run_db(database.get_stats_today, 2)
+        waits.append(time.perf_counter() - begin)
+        await asyncio.sleep(0.005)
+    path, _ = await task
+    os.remove(path)
+    waits.sort()
+    return waits
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        database.init_db()
+        totals = manage.generate_history(1, YEARS, SESSIONS_PER_DAY, seed=1)
+        print(f"history: {totals['days']:,} days, {totals['sessions']:,} sessions")
+        today = datetime.now(TIMEZONE).date()
+        for fmt in ("csv", "jsonl"):
+            for name, days in RANGES:
+                tracemalloc.start()
+                start = time.perf_counter()
+                path, counts = write_export(1, today - timedelta(days=days - 1), today, fmt)
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                size = os.path.getsize(path)
+                with gzip.open(path, "rb") as f:
+                    raw = sum(len(chunk) for chunk in iter(lambda: f.read(1 << 16), b""))
+                os.remove(path)
+                print(
+                    f"{fmt:<5} {name:<9} {counts['day'] + counts['session']:7,} rows  {elapsed * 1000:7.1f} ms  "
+                    f"peak {peak / 1024:6.0f} KiB  file {size / 1024:7.1f} KiB (raw {raw / 1024:7.1f} KiB)"
+                )
+        for fmt in ("csv", "jsonl"):
+            waits = asyncio.run(probe_while_exporting(today - timedelta(days=RANGES[-1][1] - 1), today, fmt))
+            print(
+                f"{fmt:<5} {RANGES[-1][0]} export from the bot: concurrent DB call p50 "
+                f"{waits[len(waits) // 2] * 1000:.2f} ms  max {waits[-1] * 1000:.2f} ms over {len(waits)} calls"
+            )
+        database.close_db()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+from outbox import TokenBucket
+
+
+class FakeBotAPI:
+    def __init__(self, global_rate: int = 30, chat_rate: float = 1.0, chat_burst: int = 5, latency: float = 0.02):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.latency = latency
+        self.delivered = []
+        self.updates = deque()
+        self._has_updates = asyncio.Event()
+        self.rejected = 0
+        self._window = deque()
+        self._chats = {}
+        self._message_id = 0
+        self._runner: web.AppRunner = None
+        self.port = None
+
+    def _flood(self, chat_id) -> int:
+        now = time.monotonic()
+        while self._window and self._window[0] <= now - 1:
+            self._window.popleft()
+        if len(self._window) >= self.global_rate:
+            return 1
+        if chat_id is not None:
+            bucket = self._chats.setdefault(chat_id, TokenBucket(self.chat_rate, self.chat_burst))
+            if bucket.delay(now) > 0:
+                return max(1, int(bucket.delay(now) + 0.999))
+            bucket.take()
+        self._window.append(now)
+        return 0
+
+    def push_updates(self, updates: list):
+        self.updates.extend(updates)
+        self._has_updates.set()
+
+    async def _get_updates(self, data) -> web.Response:
+        if not self.updates:
+            self._has_updates.clear()
+            try:
+                await asyncio.wait_for(self._has_updates.wait(), float(data.get("timeout", 0)) or 0.1)
+            except asyncio.TimeoutError:
+                pass
+        limit = int(data.get("limit", 100))
+        batch = [self.updates.popleft() for _ in range(min(limit, len(self.updates)))]
+        return web.json_response({"ok": True, "result": batch})
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = await request.post()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method.lower() == "getupdates":
+            return await self._get_updates(data)
+        if method.lower() == "getme":
+            return web.json_response({"ok": True, "result": {"id": 123456, "is_bot": True, "first_name": "bench"}})
+        chat_id = int(data["chat_id"]) if "chat_id" in data else None
+        retry_after = self._flood(chat_id)
+        if retry_after:
+            self.rejected += 1
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            })
+        self.delivered.append((time.perf_counter(), method, chat_id, data.get("text")))
+        if method.lower() in ("answercallbackquery", "deletewebhook", "setwebhook"):
+            return web.json_response({"ok": True, "result": True})
+        self._message_id += 1
+        return web.json_response({"ok": True, "result": {
+            "message_id": self._message_id,
+            "date": int(datetime.now(timezone.utc).timestamp()),
+            "chat": {"id": chat_id or 0, "type": "private"},
+            "text": data.get("text"),
+        }})
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{self.port}"
+
+    async def stop(self):
+        await self._runner.cleanup()
@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timezone
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message, Update
+
+FAKE_TOKEN = "123456:" + "A" * 35
+
+
+class FakeSession(BaseSession):
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = []
+        self._message_id = 0
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def make_request(self, bot, method, timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls.append(method)
+        if method.__returning__ is bool:
+            return True
+        self._message_id += 1
+        chat_id = getattr(method, "chat_id", None) or 0
+        return Message(
+            message_id=self._message_id,
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=chat_id, type="private"),
+            text=getattr(method, "text", None),
+        )
+
+
+def make_bot(session: BaseSession = None) -> Bot:
+    return Bot(token=FAKE_TOKEN, session=session or FakeSession())
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+
+def _message(message_id: int, user_id: int, text: str) -> dict:
+    return {
+        "message_id": message_id,
+        "date": int(datetime.now(timezone.utc).timestamp()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": _user(user_id),
+        "text": text,
+    }
+
+
+def message_update(update_id: int, user_id: int, text: str) -> Update:
+    message = _message(update_id, user_id, text)
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return Update.model_validate({"update_id": update_id, "message": message})
+
+
+def callback_update(update_id: int, user_id: int, data: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "message": _message(update_id, user_id, "stats"),
+            "data": data,
+        },
+    })
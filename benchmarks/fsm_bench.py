@@ -0,0 +1,98 @@
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+import database
+from fsm_storage import SQLiteStorage
+from handlers import AdminStates
+
+BOT_ID = 1
+ROUNDS = 20_000
+USERS = 100_000
+CACHE_SIZE = 10_000
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=BOT_ID, chat_id=user_id, user_id=user_id)
+
+
+async def latency(storage, users: int) -> dict:
+    timings = {"set_state": [], "get_state": [], "update_data": [], "get_data": []}
+    for i in range(ROUNDS):
+        k = key(i % users + 1)
+        for name, call in (
+            ("set_state", lambda: storage.set_state(k, AdminStates.waiting_work_duration)),
+            ("get_state", lambda: storage.get_state(k)),
+            ("update_data", lambda: storage.update_data(k, {"step": i})),
+            ("get_data", lambda: storage.get_data(k)),
+        ):
+            start = time.perf_counter()
+            await call()
+            timings[name].append(time.perf_counter() - start)
+    return {name: sorted(values) for name, values in timings.items()}
+
+
+def report(title: str, timings: dict):
+    cells = []
+    for name, values in timings.items():
+        p99 = values[int(len(values) * 0.99) - 1]
+        cells.append(f"{name} {statistics.median(values) * 1e6:6.1f}/{p99 * 1e6:7.1f}")
+    print(f"{title:<28} " + "  ".join(cells))
+
+
+async def abandoned(storage) -> int:
+    tracemalloc.start()
+    for user_id in range(1, USERS + 1):
+        await storage.set_state(key(user_id), AdminStates.waiting_start_time)
+    if isinstance(storage, SQLiteStorage):
+        await storage.flush()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        await database.run_db(database.init_db)
+
+        print(f"latency in us, median/p99, {ROUNDS:,} rounds")
+        report("MemoryStorage", await latency(MemoryStorage(), 100))
+        storage = SQLiteStorage(cache_size=CACHE_SIZE)
+        report("SQLiteStorage hot (100 keys)", await latency(storage, 100))
+        await storage.close()
+        storage = SQLiteStorage(cache_size=100)
+        await latency(storage, 10_000)
+        await storage.flush()
+        report("SQLiteStorage cold (LRU 100)", await latency(storage, 10_000))
+        await storage.close()
+
+        print(f"\n{USERS:,} users abandoning a dialog")
+        memory = await abandoned(MemoryStorage())
+        storage = SQLiteStorage(cache_size=CACHE_SIZE)
+        bounded = await abandoned(storage)
+        print(f"MemoryStorage {memory / 1024 / 1024:6.1f} MiB, SQLiteStorage {bounded / 1024 / 1024:6.1f} MiB "
+              f"({len(storage):,} cached)")
+        await storage.close()
+
+        restarted = SQLiteStorage()
+        state = await restarted.get_state(key(USERS))
+        print(f"after restart: state of user {USERS} = {state}")
+        restarted.ttl = 0
+        await asyncio.sleep(0.01)
+        print(f"expired after TTL: {await restarted.sweep():,} rows, state now {await restarted.get_state(key(USERS))}")
+        await restarted.close()
+        database.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
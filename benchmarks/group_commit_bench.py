@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import storage
+
+USERS = 500
+SESSIONS = 8
+STATS_EVERY = 4
+
+_commits = 0
+
+
+def _trace(statement: str):
+    global _commits
+    if statement == "COMMIT":
+        _commits += 1
+
+
+async def user_day(user_id: int) -> int:
+    stale = 0
+    for number in range(1, SESSIONS + 1):
+        session_id = await database.run_db(database.record_session_start, user_id, number, 30)
+        await database.run_db(database.record_session_end, user_id, session_id, 30)
+        if number % STATS_EVERY == 0:
+            stats = await database.run_db(database.get_stats_today, user_id)
+            stale += stats["sessions_completed"] != number
+    return stale
+
+
+async def run(mode: str, tmp: str):
+    global _commits
+    database.DB_FILE = os.path.join(tmp, f"{mode}.db")
+    storage.DATA_FILE = os.path.join(tmp, "data.json")
+    database.DURABILITY = mode
+    database.init_db()
+    storage.load_users()
+    for user_id in range(1, USERS + 1):
+        storage.register_user(user_id)
+    storage.flush()
+
+    _commits = 0
+    start = time.perf_counter()
+    stale = sum(await asyncio.gather(*(user_day(user_id) for user_id in range(1, USERS + 1))))
+    database.flush_session_events()
+    elapsed = time.perf_counter() - start
+    events = USERS * SESSIONS * 2
+
+    problems = database.check_rollups()
+    with database.get_conn() as conn:
+        worked = conn.execute("SELECT COALESCE(SUM(worked_minutes), 0) FROM work_days").fetchone()[0]
+    print(
+        f"{mode:<10} {elapsed:6.2f} s  {events / elapsed:8,.0f} events/s  {_commits:6,} commits  "
+        f"{events / max(_commits, 1):6.1f} events/commit  stale reads {stale}  "
+        f"minutes ok {worked == USERS * SESSIONS * 30}  rollups ok {not problems}"
+    )
+    storage.flush()
+    database.close_db()
+
+
+def main():
+    database.TRACE_CALLBACK = _trace
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{USERS} users x {SESSIONS} sessions, stats read every {STATS_EVERY} sessions")
+        for mode in ("immediate", "group"):
+            asyncio.run(run(mode, tmp))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import asyncio
+import csv
+import gzip
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import storage
+from importer import import_file, import_history, open_text
+
+USERS = 250
+DAYS = 1_000
+SESSIONS_PER_DAY = 4
+SESSION_MINUTES = 30
+
+
+def write_source(path: str) -> int:
+    rng = random.Random(1)
+    first = datetime(2020, 1, 1, 9, 0)
+    rows = 0
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("user_id", "session_number", "duration_minutes", "started_at", "finished_at"))
+        for user_id in range(1, USERS + 1):
+            for day in range(DAYS):
+                start = first + timedelta(days=day, minutes=rng.randint(0, 120))
+                for number in range(1, rng.randint(1, SESSIONS_PER_DAY) + 1):
+                    begin = start + timedelta(minutes=(number - 1) * (SESSION_MINUTES + 10))
+                    end = begin + timedelta(minutes=SESSION_MINUTES)
+                    writer.writerow((user_id, number, SESSION_MINUTES, begin.isoformat(), end.isoformat()))
+                    rows += 1
+    return rows
+
+
+async def probe_while_importing(source: str) -> tuple:
+    task = asyncio.create_task(asyncio.to_thread(import_file, source, "csv"))
+    waits = []
+    while not task.done():
+        start = time.perf_counter()
+        await database.run_db(database.get_stats_today, 1)
+        waits.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+    counts = await task
+    waits.sort()
+    return counts, waits
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        storage.DATA_FILE = os.path.join(tmp, "data.json")
+        database.init_db()
+        source = os.path.join(tmp, "sessions.csv.gz")
+        rows = write_source(source)
+        print(f"source: {rows:,} session rows for {USERS} users, {os.path.getsize(source) / 1024 / 1024:.1f} MiB gzip")
+
+        for run in ("first import", "re-import"):
+            start = time.perf_counter()
+            with open_text(source) as f:
+                counts = import_history(f, "csv")
+            elapsed = time.perf_counter() - start
+            print(
+                f"{run:<13} {elapsed:6.1f} s  {rows / elapsed * 60:12,.0f} rows/min  "
+                f"new sessions {counts['inserted']:,}  batches {counts['batches']}"
+            )
+
+        start = time.perf_counter()
+        counts, waits = asyncio.run(probe_while_importing(source))
+        elapsed = time.perf_counter() - start
+        print(
+            f"bot import  {elapsed:6.1f} s  {rows / elapsed * 60:12,.0f} rows/min  batches {counts['batches']}  "
+            f"concurrent DB call p50 {waits[len(waits) // 2] * 1000:.1f} ms  "
+            f"p99 {waits[int(len(waits) * 0.99)] * 1000:.1f} ms  max {waits[-1] * 1000:.1f} ms"
+        )
+
+        start = time.perf_counter()
+        problems = database.check_rollups()
+        print(f"rollups consistent: {not problems} ({time.perf_counter() - start:.1f} s to check)")
+        with database.get_conn() as conn:
+            mismatched = conn.execute("""
+                SELECT COUNT(*) FROM work_days d
+                WHERE worked_minutes != (SELECT COALESCE(SUM(duration_minutes), 0) FROM work_sessions WHERE work_day_id = d.id)
+            """).fetchone()[0]
+        print(f"days whose totals disagree with their sessions: {mismatched}")
+        storage.flush()
+        database.close_db()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import manage
+from handlers import format_insights
+from insights import compute_insights
+
+SAMPLES = 50
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Latency of /insights over a large synthetic history")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--years", type=float, default=10)
+    parser.add_argument("--sessions-per-day", type=int, default=4)
+    parser.add_argument("--max-p95-ms", type=float, default=100)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        database.init_db()
+        start = time.perf_counter()
+        totals = manage.generate_history(args.users, args.years, args.sessions_per_day, seed=1)
+        print(
+            f"generated {totals['days']:,} days / {totals['sessions']:,} sessions for {totals['users']} users "
+            f"in {time.perf_counter() - start:.1f} s"
+        )
+
+        users = random.Random(1).sample(range(1, args.users + 1), min(SAMPLES, args.users))
+        timings, sessions = [], []
+        for user_id in users:
+            start = time.perf_counter()
+            s = compute_insights(user_id)
+            format_insights(s)
+            timings.append((time.perf_counter() - start) * 1000)
+            sessions.append(s["sessions"])
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(
+            f"/insights over {len(users)} users (~{statistics.mean(sessions):,.0f} sessions each): "
+            f"min {timings[0]:.1f} ms  p50 {statistics.median(timings):.1f} ms  p95 {p95:.1f} ms  "
+            f"max {timings[-1]:.1f} ms"
+        )
+        database.close_db()
+    return 0 if p95 <= args.max_p95_ms else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
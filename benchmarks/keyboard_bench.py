@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import handlers
+import storage
+
+ROUNDS = 20_000
+USER_ID = 1
+
+
+def uncached_admin_panel():
+    handlers._admin_panels.pop(USER_ID, None)
+    return handlers.admin_panel_kb(USER_ID)
+
+
+def rebuilt_stats_kb():
+    return handlers.InlineKeyboardMarkup(inline_keyboard=[
+        [handlers.InlineKeyboardButton(text=b.text, callback_data=b.callback_data) for b in row]
+        for row in handlers.STATS_KB.inline_keyboard
+    ])
+
+
+def measure(func) -> tuple:
+    seconds = timeit.timeit(func, number=ROUNDS) / ROUNDS
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    func()
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        storage.DATA_FILE = os.path.join(tmp, "data.json")
+        database.init_db()
+        storage.load_users()
+        storage.register_user(USER_ID)
+        cases = (
+            ("admin_panel_kb rebuilt", uncached_admin_panel),
+            ("admin_panel_kb cached", lambda: handlers.admin_panel_kb(USER_ID)),
+            ("stats keyboard rebuilt", rebuilt_stats_kb),
+            ("STATS_KB", lambda: handlers.STATS_KB),
+        )
+        for name, func in cases:
+            seconds, peak = measure(func)
+            print(f"{name:<24} {seconds * 1e6:7.2f} us  {peak:6,} B allocated")
+        storage.set_setting(USER_ID, "break_minutes", 15)
+        print(f"after set_setting: panel shows new value: {'15 мин' in handlers.admin_panel_kb(USER_ID).inline_keyboard[3][0].text}")
+        storage.flush()
+        database.close_db()
+
+
+if __name__ == "__main__":
+    main()
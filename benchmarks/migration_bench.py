@@ -0,0 +1,93 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import manage
+from config import TIMEZONE
+
+ROUNDS = 50
+
+
+def queries(conn, user_id: int) -> dict:
+    day_id = conn.execute(
+        "SELECT id FROM work_days WHERE user_id = ? ORDER BY date DESC LIMIT 1", (user_id,)
+    ).fetchone()[0]
+    since = (datetime.now(TIMEZONE) - timedelta(days=1)).isoformat()
+    until = datetime.now(TIMEZONE).isoformat()
+    return {
+        "today sessions": (
+            "SELECT * FROM work_sessions WHERE work_day_id = ? ORDER BY session_number", (day_id,)
+        ),
+        "sessions started in last 24h": (
+            "SELECT COUNT(*) FROM work_sessions WHERE started_at BETWEEN ? AND ?", (since, until)
+        ),
+        "open sessions": (
+            "SELECT id, user_id, started_at, duration_minutes FROM work_sessions WHERE finished_at IS NULL", ()
+        ),
+    }
+
+
+def measure(conn, sql: str, params: tuple) -> float:
+    conn.execute(sql, params).fetchall()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def report(title: str, user_id: int) -> dict:
+    print(f"\n{title} (schema version {database.schema_version()})")
+    timings = {}
+    with database.get_conn() as conn:
+        for name, (sql, params) in queries(conn, user_id).items():
+            plan = "; ".join(row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+            timings[name] = measure(conn, sql, params)
+            print(f"  {name:<30} {timings[name] * 1000:9.3f} ms  {plan}")
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        database.get_stats_today(user_id)
+    timings["get_stats_today()"] = (time.perf_counter() - start) / ROUNDS
+    print(f"  {'get_stats_today()':<30} {timings['get_stats_today()'] * 1000:9.3f} ms")
+    return timings
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Query plans and timings before and after schema migrations")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--sessions-per-day", type=int, default=6)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        database.migrate(target=1)
+        start = time.perf_counter()
+        totals = manage.generate_history(args.users, args.years, args.sessions_per_day, seed=1)
+        print(
+            f"generated {totals['days']:,} days / {totals['sessions']:,} sessions for {totals['users']} users "
+            f"in {time.perf_counter() - start:.1f} s"
+        )
+        with database.get_conn() as conn:
+            user_id = conn.execute("SELECT user_id FROM work_days ORDER BY date DESC LIMIT 1").fetchone()[0]
+
+        before = report("before", user_id)
+        start = time.perf_counter()
+        applied = database.migrate()
+        print(f"\nmigrations {applied} applied in {(time.perf_counter() - start) * 1000:.0f} ms")
+        after = report("after", user_id)
+
+        print()
+        for name in before:
+            print(f"  {name:<30} {before[name] / after[name]:8.1f}x faster")
+        database.close_db()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import storage
+from benchmarks.fake_bot import FakeSession, make_bot, message_update, callback_update
+
+USERS = 10_000
+HISTORY_DAYS = 30
+UPDATES = 5_000
+FIRST_USER_ID = 100_000
+
+
+def populate_history():
+    start = date.today() - timedelta(days=HISTORY_DAYS)
+    rows = [
+        (FIRST_USER_ID + u, (start + timedelta(days=d)).isoformat(), 120, random.choice((0, 30, 60, 120)))
+        for u in range(USERS) for d in range(HISTORY_DAYS)
+    ]
+    with database.get_conn() as conn:
+        conn.executemany(
+            "INSERT INTO work_days (user_id, date, planned_minutes, worked_minutes, sessions_completed, completed) "
+            "VALUES (?, ?, ?, ?, ?/30, ? >= 120)",
+            [(u, d, p, w, w, w) for u, d, p, w in rows]
+        )
+    database.rebuild_rollups()
+
+
+def measure_registry() -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(USERS):
+        storage.register_user(FIRST_USER_ID + i)
+        storage.update_session(FIRST_USER_ID + i, active=True, state="working", completed_minutes=30)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / USERS
+
+
+async def measure_jobs() -> float:
+    from scheduler import scheduler, reschedule_daily
+    scheduler.start()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for user in storage.all_users():
+        reschedule_daily(user.user_id)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    scheduler.shutdown(wait=False)
+    return (after - before) / USERS
+
+
+def make_updates() -> list:
+    kinds = ["/status", "/admin", "stats_today", "stats_week", "stats_month", "stats_30", "stats_alltime"]
+    updates = []
+    for i in range(UPDATES):
+        user_id = FIRST_USER_ID + random.randrange(USERS)
+        kind = random.choice(kinds)
+        if kind.startswith("/"):
+            updates.append(message_update(i + 1, user_id, kind))
+        else:
+            updates.append(callback_update(i + 1, user_id, kind))
+    return updates
+
+
+async def measure_handlers() -> list:
+    from aiogram import Dispatcher
+    from handlers import router
+    bot = make_bot(FakeSession())
+    dp = Dispatcher()
+    dp.include_router(router)
+    latencies = []
+    for update in make_updates():
+        start = time.perf_counter()
+        await dp.feed_update(bot, update)
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+async def main():
+    random.seed(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        storage.DATA_FILE = os.path.join(tmp, "data.json")
+        database.init_db()
+        storage.load_users()
+
+        per_user = measure_registry()
+        print(f"registry: {per_user:.0f} bytes per active user ({USERS:,} users)")
+        start = time.perf_counter()
+        storage.flush()
+        print(f"flush of {USERS:,} dirty users: {(time.perf_counter() - start) * 1000:.1f} ms")
+        print(f"daily job: {await measure_jobs():.0f} bytes per user")
+
+        populate_history()
+        latencies = await measure_handlers()
+        pct = lambda p: latencies[int(len(latencies) * p)] * 1000
+        print(
+            f"handlers: {len(latencies) / sum(latencies):,.0f} updates/sec  "
+            f"p50 {pct(0.5):.2f} ms  p95 {pct(0.95):.2f} ms  p99 {pct(0.99):.2f} ms"
+        )
+        database.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+
+from benchmarks.fake_api import FakeBotAPI
+from benchmarks.fake_bot import FAKE_TOKEN
+from outbox import Outbox, priority, BROADCAST
+
+USERS = 300
+FOLLOWUPS = 100
+CALLBACKS = 50
+CALLBACK_INTERVAL = 0.1
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def make_bot() -> tuple:
+    api = FakeBotAPI()
+    url = await api.start()
+    bot = Bot(token=FAKE_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+    return api, bot
+
+
+async def timed(coro, delays: list, errors: list):
+    start = time.perf_counter()
+    try:
+        await coro
+    except TelegramRetryAfter as e:
+        errors.append(e)
+        return
+    delays.append(time.perf_counter() - start)
+
+
+async def workload(bot: Bot) -> dict:
+    broadcast, interactive, errors = [], [], []
+
+    async def prompts():
+        with priority(BROADCAST):
+            await asyncio.gather(*(
+                timed(bot.send_message(user_id, "⏰ Время работать!"), broadcast, errors)
+                for user_id in list(range(1, USERS + 1)) + list(range(1, FOLLOWUPS + 1))
+            ))
+
+    async def callbacks():
+        tasks = []
+        for i in range(CALLBACKS):
+            tasks.append(asyncio.create_task(timed(bot.answer_callback_query(str(i)), interactive, errors)))
+            await asyncio.sleep(CALLBACK_INTERVAL)
+        await asyncio.gather(*tasks)
+
+    start = time.perf_counter()
+    await asyncio.gather(prompts(), callbacks())
+    return {"elapsed": time.perf_counter() - start, "broadcast": broadcast, "interactive": interactive, "errors": errors}
+
+
+def report(name: str, api: FakeBotAPI, result: dict):
+    sent = len(api.delivered)
+    first, last = api.delivered[0][0], api.delivered[-1][0]
+    print(
+        f"{name:<8} delivered {sent:4d}/{USERS + FOLLOWUPS + CALLBACKS}  lost {len(result['errors']):4d}  "
+        f"429s {api.rejected:4d}  sustained {sent / (last - first):5.1f} msg/s  elapsed {result['elapsed']:5.1f} s"
+    )
+    for kind in ("interactive", "broadcast"):
+        delays = result[kind]
+        if delays:
+            print(
+                f"         {kind:<11} p50 {statistics.median(delays) * 1000:7.0f} ms  "
+                f"p99 {percentile(delays, 0.99) * 1000:7.0f} ms"
+            )
+
+
+async def main():
+    print(f"{USERS} prompts + {FOLLOWUPS} follow-ups in one burst, {CALLBACKS} callback answers meanwhile")
+
+    api, bot = await make_bot()
+    report("direct", api, await workload(bot))
+    await bot.session.close()
+    await api.stop()
+
+    api, bot = await make_bot()
+    outbox = Outbox()
+    bot.session.middleware(outbox)
+    outbox.start()
+    result = await workload(bot)
+    await outbox.stop()
+    report("outbox", api, result)
+    print(f"         retries {outbox.retries}, failed {outbox.failed}")
+    await bot.session.close()
+    await api.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
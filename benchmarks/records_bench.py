@@ -0,0 +1,94 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import storage
+from config import TIMEZONE
+
+USERS = 20
+YEARS = 5
+ROUNDS = 1000
+
+
+def replay(rng: random.Random) -> int:
+    today = datetime.now(TIMEZONE).replace(hour=0, minute=0, second=0, microsecond=0)
+    first = today - timedelta(days=int(365 * YEARS))
+    events = 0
+    day = first
+    while day <= today:
+        for user_id in range(1, USERS + 1):
+            if rng.random() < 0.2:
+                continue
+            planned = storage.get_setting(user_id, "work_duration_minutes")
+            sessions = rng.randint(1, planned // 30 + 1)
+            start = day + timedelta(hours=9, minutes=rng.randint(0, 120))
+            with database.transaction(start) as (conn, now):
+                worked = 0
+                for number in range(1, sessions + 1):
+                    begin = start + timedelta(minutes=(number - 1) * 40)
+                    session_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM work_sessions").fetchone()[0]
+                    database._apply_session_start(conn, begin, user_id, session_id, number, 30)
+                    worked += 30
+                    done = worked if worked >= planned else None
+                    database._apply_session_end(conn, begin + timedelta(minutes=30), user_id, session_id, 30, done)
+                    events += 2
+            if rng.random() < 0.01:
+                back = day - timedelta(days=rng.randint(1, 30), hours=-12)
+                with database.transaction(back) as (conn, now):
+                    database._apply_day_complete(conn, now, user_id, rng.randint(0, planned))
+                    events += 1
+        day += timedelta(days=1)
+    return events
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        storage.DATA_FILE = os.path.join(tmp, "data.json")
+        database.init_db()
+        storage.load_users()
+        rng = random.Random(1)
+        for user_id in range(1, USERS + 1):
+            storage.register_user(user_id)
+            storage.set_setting(user_id, "work_duration_minutes", rng.choice((60, 90, 120)))
+
+        start = time.perf_counter()
+        events = replay(rng)
+        print(f"replayed {events:,} session events for {USERS} users over {YEARS} years in {time.perf_counter() - start:.1f} s")
+        print(f"streaks expired at rollover: {database.expire_streaks()}")
+
+        start = time.perf_counter()
+        problems = database.check_rollups()
+        print(f"incremental records match full recompute: {not problems} ({time.perf_counter() - start:.2f} s)")
+        for problem in problems[:10]:
+            print("  " + problem)
+
+        stats = database.get_all_time_stats(1)
+        print(
+            f"user 1: streak {stats['current_streak']} (longest {stats['longest_streak']}), "
+            f"best day {stats['best_day']} {stats['best_day_minutes']} min, "
+            f"best week {stats['best_week']} {stats['best_week_minutes']} min"
+        )
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            database.get_all_time_stats(1)
+        read = (time.perf_counter() - start) / ROUNDS
+        start = time.perf_counter()
+        with database.get_conn() as conn:
+            for _ in range(ROUNDS // 100):
+                database._scan_records(conn, 1)
+        scan = (time.perf_counter() - start) / (ROUNDS // 100)
+        print(f"get_all_time_stats {read * 1000:.3f} ms vs full recompute for one user {scan * 1000:.2f} ms")
+        storage.flush()
+        database.close_db()
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import scheduler
+import storage
+from config import TIMEZONE
+
+SESSIONS = 50_000
+FIRST_USER_ID = 1_000_000
+
+
+def populate():
+    now = datetime.now(TIMEZONE)
+    today = now.date().isoformat()
+    with database.get_conn() as conn:
+        conn.executemany(
+            "INSERT INTO work_days (id, user_id, date, planned_minutes, started_at) VALUES (?, ?, ?, 120, ?)",
+            [(i + 1, FIRST_USER_ID + i, today, now.isoformat()) for i in range(SESSIONS)]
+        )
+        conn.executemany(
+            "INSERT INTO work_sessions (id, work_day_id, user_id, session_number, duration_minutes, started_at) "
+            "VALUES (?, ?, ?, 1, 30, ?)",
+            [
+                (i + 1, i + 1, FIRST_USER_ID + i, (now - timedelta(minutes=random.randint(0, 40))).isoformat())
+                for i in range(SESSIONS)
+            ]
+        )
+        rows = conn.execute("SELECT id, user_id, started_at FROM work_sessions").fetchall()
+    for row in rows:
+        user = storage.register_user(row["user_id"])
+        started = datetime.fromisoformat(row["started_at"]).timestamp()
+        deadline = started + 30 * 60 if random.random() > 0.1 else None
+        storage.update_session(
+            user.user_id, active=True, state="working", session_counter=1, session_db_id=row["id"],
+            deadline=deadline, next_transition="session_end" if deadline else None
+        )
+    storage.flush()
+
+
+async def main():
+    random.seed(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        storage.DATA_FILE = os.path.join(tmp, "data.json")
+        database.init_db()
+        storage.load_users()
+        populate()
+
+        start = time.perf_counter()
+        await database.run_db(storage.load_users)
+        loaded = time.perf_counter()
+        result = await scheduler.recover_sessions()
+        recovered = time.perf_counter()
+        print(
+            f"{SESSIONS:,} sessions: load users {(loaded - start) * 1000:.1f} ms, "
+            f"recover {(recovered - loaded) * 1000:.1f} ms, total {(recovered - start) * 1000:.1f} ms"
+        )
+        print(f"resumed {result['resumed']:,}, overdue {result['overdue']:,}, pending timers {scheduler.pending_timers():,}")
+        storage.flush()
+        database.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import scheduler
+import storage
+from benchmarks.fake_bot import FakeSession, make_bot, message_update, callback_update
+
+USERS = 1_000
+HISTORY_DAYS = 60
+UPDATES = 10_000
+FIRST_USER_ID = 100_000
+
+SCENARIOS = [
+    (20, "status", ["/status"]),
+    (15, "stats_menu", ["/stats", "cb:stats_week"]),
+    (15, "stats_today", ["cb:stats_today"]),
+    (8, "stats_month", ["cb:stats_month", "cb:stats_30"]),
+    (6, "stats_alltime", ["cb:stats_alltime"]),
+    (4, "stats_range", ["/stats 2024-01-01 2024-03-31"]),
+    (10, "start_work", ["cb:start_work"]),
+    (8, "continue_work", ["cb:continue_work"]),
+    (5, "settings_session", ["/admin", "cb:set_session_duration", "msg:30"]),
+    (3, "settings_start", ["/admin", "cb:set_start_time", "msg:oops", "msg:09:30"]),
+    (3, "settings_break", ["cb:set_break_duration", "msg:10"]),
+    (3, "reset", ["cb:reset_session"]),
+]
+
+
+class QueryCounter:
+    IGNORED = ("BEGIN", "COMMIT", "ROLLBACK", "PRAGMA")
+
+    def __init__(self):
+        self.queries = 0
+
+    def __call__(self, statement: str):
+        if not statement.lstrip().upper().startswith(self.IGNORED):
+            self.queries += 1
+
+
+def populate_history():
+    start = date.today() - timedelta(days=HISTORY_DAYS)
+    rows = []
+    for u in range(USERS):
+        for d in range(HISTORY_DAYS):
+            worked = random.choice((0, 30, 60, 90, 120))
+            rows.append((FIRST_USER_ID + u, (start + timedelta(days=d)).isoformat(), worked, worked // 30, worked >= 120))
+    with database.get_conn() as conn:
+        conn.executemany(
+            "INSERT INTO work_days (user_id, date, planned_minutes, worked_minutes, sessions_completed, completed) "
+            "VALUES (?, ?, 120, ?, ?, ?)",
+            rows
+        )
+    database.rebuild_rollups()
+    for u in range(USERS):
+        storage.register_user(FIRST_USER_ID + u)
+    storage.flush()
+
+
+def make_stream() -> list:
+    weights = [w for w, _, _ in SCENARIOS]
+    queues = defaultdict(list)
+    stream = []
+    update_id = 0
+    while len(stream) < UPDATES:
+        user_id = FIRST_USER_ID + random.randrange(USERS)
+        if not queues[user_id]:
+            _, name, steps = random.choices(SCENARIOS, weights)[0]
+            queues[user_id] = [(name, step) for step in steps]
+        name, step = queues[user_id].pop(0)
+        update_id += 1
+        kind, _, payload = step.partition(":") if not step.startswith("/") else ("cmd", "", step)
+        if kind == "cb":
+            update = callback_update(update_id, user_id, payload)
+        else:
+            update = message_update(update_id, user_id, payload)
+        stream.append((name, update))
+    return stream
+
+
+def percentiles(values: list) -> dict:
+    values = sorted(values)
+    pick = lambda p: values[min(len(values) - 1, int(len(values) * p))] * 1000
+    return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+async def replay(stream: list, counter: QueryCounter, allocations: bool = False) -> dict:
+    from aiogram import Dispatcher
+    from handlers import router
+    session = FakeSession()
+    bot = make_bot(session)
+    scheduler._bot = bot
+    dp = Dispatcher()
+    dp.include_router(router)
+
+    latencies = []
+    by_scenario = defaultdict(list)
+    peaks = defaultdict(list)
+    counter.queries = 0
+    if allocations:
+        tracemalloc.start()
+    start = time.perf_counter()
+    for name, update in stream:
+        if allocations:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        t = time.perf_counter()
+        await dp.feed_update(bot, update)
+        elapsed = time.perf_counter() - t
+        if allocations:
+            peaks[name].append(tracemalloc.get_traced_memory()[1] - before)
+        latencies.append(elapsed)
+        by_scenario[name].append(elapsed)
+    total = time.perf_counter() - start
+    if allocations:
+        tracemalloc.stop()
+    for user in storage.all_users():
+        scheduler.timers.cancel(user.user_id)
+    return {
+        "updates": len(stream),
+        "throughput": len(stream) / total,
+        **percentiles(latencies),
+        "queries_per_update": counter.queries / len(stream),
+        "api_calls_per_update": len(session.calls) / len(stream),
+        "alloc_kib_per_update": sum(map(sum, peaks.values())) / len(stream) / 1024 if allocations else None,
+        "scenarios": {
+            name: {
+                "count": len(v), **percentiles(v),
+                "alloc_kib": sum(peaks[name]) / len(v) / 1024 if allocations else None,
+            }
+            for name, v in sorted(by_scenario.items())
+        },
+    }
+
+
+def report(result: dict):
+    print(
+        f"{result['updates']:,} updates: {result['throughput']:,.0f} updates/s  "
+        f"p50 {result['p50_ms']:.2f} ms  p95 {result['p95_ms']:.2f} ms  p99 {result['p99_ms']:.2f} ms"
+    )
+    print(f"DB queries/update {result['queries_per_update']:.2f}  API calls/update {result['api_calls_per_update']:.2f}")
+    if result["alloc_kib_per_update"] is not None:
+        print(f"peak allocation/update {result['alloc_kib_per_update']:.1f} KiB (tracemalloc, latencies inflated)")
+    for name, s in result["scenarios"].items():
+        alloc = f"  {s['alloc_kib']:6.1f} KiB" if s["alloc_kib"] is not None else ""
+        print(
+            f"  {name:<18} {s['count']:6d}  p50 {s['p50_ms']:6.2f}  p95 {s['p95_ms']:6.2f}  p99 {s['p99_ms']:6.2f} ms{alloc}"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic updates through the handlers router")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--max-p99-ms", type=float, help="fail if p99 latency exceeds this")
+    parser.add_argument("--max-queries", type=float, help="fail if DB queries per update exceed this")
+    parser.add_argument("--allocations", action="store_true", help="trace peak allocations per update")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    random.seed(args.seed)
+    counter = QueryCounter()
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        database.TRACE_CALLBACK = counter
+        storage.DATA_FILE = os.path.join(tmp, "data.json")
+        database.init_db()
+        storage.load_users()
+        populate_history()
+        result = await replay(make_stream(), counter, args.allocations)
+        storage.flush()
+        database.close_db()
+
+    report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+    failures = []
+    if args.max_p99_ms is not None and result["p99_ms"] > args.max_p99_ms:
+        failures.append(f"p99 {result['p99_ms']:.2f} ms > {args.max_p99_ms} ms")
+    if args.max_queries is not None and result["queries_per_update"] > args.max_queries:
+        failures.append(f"queries/update {result['queries_per_update']:.2f} > {args.max_queries}")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import storage
+
+SESSIONS = 2000
+USER_ID = 1
+
+_counters = {"connects": 0, "commits": 0}
+
+
+def _trace(statement: str):
+    if statement == "COMMIT":
+        _counters["commits"] += 1
+
+
+def _counting_connect(*args, **kwargs):
+    conn = _real_connect(*args, **kwargs)
+    _counters["connects"] += 1
+    conn.set_trace_callback(_trace)
+    return conn
+
+
+_real_connect = sqlite3.connect
+sqlite3.connect = _counting_connect
+
+
+def legacy_conn():
+    conn = sqlite3.connect(database.DB_FILE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def legacy_get_or_create_today() -> int:
+    today = database._today()
+    conn = legacy_conn()
+    try:
+        row = conn.execute("SELECT id FROM work_days WHERE user_id = ? AND date = ?", (USER_ID, today)).fetchone()
+        if row:
+            return row["id"]
+        conn.execute(
+            "INSERT INTO work_days (user_id, date, planned_minutes, started_at) VALUES (?, ?, ?, ?)",
+            (USER_ID, today, 120, database._now().isoformat())
+        )
+        conn.commit()
+        return conn.execute("SELECT id FROM work_days WHERE user_id = ? AND date = ?", (USER_ID, today)).fetchone()["id"]
+    finally:
+        conn.close()
+
+
+def legacy_record_session(number: int):
+    day_id = legacy_get_or_create_today()
+    conn = legacy_conn()
+    try:
+        session_id = conn.execute(
+            "INSERT INTO work_sessions (work_day_id, user_id, session_number, duration_minutes, started_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (day_id, USER_ID, number, 30, database._now().isoformat())
+        ).lastrowid
+        conn.commit()
+    finally:
+        conn.close()
+    legacy_get_or_create_today()
+    today = database._today()
+    conn = legacy_conn()
+    try:
+        conn.execute("UPDATE work_sessions SET finished_at = ? WHERE id = ?", (database._now().isoformat(), session_id))
+        conn.execute(
+            "UPDATE work_days SET worked_minutes = worked_minutes + ?, sessions_completed = sessions_completed + 1 "
+            "WHERE user_id = ? AND date = ?",
+            (30, USER_ID, today)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def tx_record_session(number: int):
+    session_id = database.record_session_start(USER_ID, number, 30)
+    database.record_session_end(USER_ID, session_id, 30)
+
+
+def run(name: str, record):
+    _counters.update(connects=0, commits=0)
+    start = time.perf_counter()
+    for i in range(SESSIONS):
+        record(i + 1)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<22} {elapsed / SESSIONS * 1e6:8.1f} us/session  "
+        f"{_counters['connects'] / SESSIONS:5.2f} connects/session  "
+        f"{_counters['commits'] / SESSIONS:5.2f} commits/session"
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        database.init_db()
+        storage.load_users()
+        storage.register_user(USER_ID)
+        run("legacy per-call conns", legacy_record_session)
+        database.DURABILITY = "immediate"
+        run("unit of work", tx_record_session)
+        database.DURABILITY = "group"
+        run("group commit", tx_record_session)
+        database.flush_session_events()
+        database.close_db()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import manage
+
+MIN_ROUNDS = 5
+MIN_SECONDS = 0.2
+MAX_ROUNDS = 10_000
+REGRESSION_THRESHOLD = 0.2
+
+
+def measure(func) -> dict:
+    func()
+    timings = []
+    budget = time.perf_counter() + MIN_SECONDS
+    while len(timings) < MIN_ROUNDS or (time.perf_counter() < budget and len(timings) < MAX_ROUNDS):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        "rounds": len(timings),
+        "min_us": min(timings) * 1e6,
+        "median_us": statistics.median(timings) * 1e6,
+        "mean_us": statistics.fmean(timings) * 1e6,
+        "stddev_us": statistics.pstdev(timings) * 1e6,
+    }
+
+
+def suite(user_id: int) -> dict:
+    from handlers import (
+        format_today_stats, format_period_stats, format_days_page, format_alltime_stats, period_kb, days_page_kb,
+    )
+    from config import TIMEZONE
+    today = datetime.now(TIMEZONE).date()
+    year_ago = today - timedelta(days=365)
+    record_day = today - timedelta(days=1)
+    week = database.get_stats_week(user_id)
+    page = database.get_days_page(user_id, year_ago, today)
+    alltime = database.get_all_time_stats(user_id)
+    today_stats = database.get_stats_today(user_id)
+    return {
+        "db.get_stats_today": lambda: database.get_stats_today(user_id),
+        "db.get_stats_week": lambda: database.get_stats_week(user_id),
+        "db.get_stats_month": lambda: database.get_stats_month(user_id),
+        "db.get_stats_custom_30": lambda: database.get_stats_custom(user_id, 30),
+        "db.get_stats_custom_365": lambda: database.get_stats_custom(user_id, 365),
+        "db.get_stats_range_year": lambda: database.get_stats_range(user_id, year_ago, today),
+        "db.get_days_page_first": lambda: database.get_days_page(user_id, year_ago, today),
+        "db.get_days_page_after": lambda: database.get_days_page(user_id, year_ago, today, after=record_day.isoformat()),
+        "db.get_days_page_before": lambda: database.get_days_page(user_id, year_ago, today, before=today.isoformat()),
+        "db.get_all_time_stats": lambda: database.get_all_time_stats(user_id),
+        "db.load_user_rows": database.load_user_rows,
+        "db.load_open_sessions": database.load_open_sessions,
+        "fmt.format_today_stats": lambda: format_today_stats(today_stats),
+        "fmt.format_period_stats": lambda: format_period_stats(week),
+        "fmt.format_days_page": lambda: format_days_page(year_ago, today, page),
+        "fmt.format_alltime_stats": lambda: format_alltime_stats(alltime),
+        "fmt.period_kb": lambda: period_kb(week),
+        "fmt.days_page_kb": lambda: days_page_kb(year_ago, today, page),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: dict, baseline_path: str) -> list:
+    with open(baseline_path) as f:
+        baseline = json.load(f)["benchmarks"]
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["median_us"], result["median_us"]
+        change = (after - before) / before if before else 0.0
+        marker = "  REGRESSION" if change > REGRESSION_THRESHOLD else ""
+        print(f"  {name:<28} {before:10.1f} -> {after:10.1f} us  {change:+7.1%}{marker}")
+        if marker:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time stats queries and formatters against synthetic history")
+    parser.add_argument("--db", help="use an existing database instead of generating one")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--sessions-per-day", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file (default: stats-<commit>.json in a temp dir)")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = args.db or os.path.join(tmp, "bench.db")
+        database.init_db()
+        if not args.db:
+            start = time.perf_counter()
+            totals = manage.generate_history(args.users, args.years, args.sessions_per_day, seed=args.seed)
+            print(
+                f"generated {totals['days']:,} days / {totals['sessions']:,} sessions for {totals['users']} users "
+                f"in {time.perf_counter() - start:.1f} s"
+            )
+        with database.get_conn() as conn:
+            user_id = conn.execute(
+                "SELECT user_id FROM work_days GROUP BY user_id ORDER BY MAX(date) DESC, COUNT(*) DESC LIMIT 1"
+            ).fetchone()[0]
+        results = {name: measure(func) for name, func in suite(user_id).items()}
+        database.close_db()
+
+    for name, r in results.items():
+        print(f"{name:<28} median {r['median_us']:10.1f} us  min {r['min_us']:10.1f} us  rounds {r['rounds']}")
+    commit = git_commit()
+    output = args.json or os.path.join(tempfile.gettempdir(), f"stats-{commit}.json")
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "params": {"users": args.users, "years": args.years, "sessions_per_day": args.sessions_per_day, "db": args.db},
+            "benchmarks": results,
+        }, f, indent=2)
+    print(f"results written to {output}")
+    if args.compare:
+        print(f"compared with {args.compare}:")
+        if compare(results, args.compare):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
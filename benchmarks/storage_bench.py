@@ -0,0 +1,88 @@
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+import storage
+
+OPS = 2000
+
+LEGACY_DATA = {
+    **storage.DEFAULT_SETTINGS,
+    "session": {"active": False, "completed_minutes": 0, "state": "idle"},
+}
+USER_ID = 1
+
+
+def legacy_load() -> dict:
+    if os.path.exists(storage.DATA_FILE):
+        with open(storage.DATA_FILE, "r") as f:
+            data = json.load(f)
+        for key, value in LEGACY_DATA.items():
+            if key not in data:
+                data[key] = value
+        return data
+    return LEGACY_DATA.copy()
+
+
+def legacy_save(data: dict):
+    with open(storage.DATA_FILE, "w") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def legacy_get_setting(key: str):
+    return legacy_load()[key]
+
+
+def legacy_update_session(**kwargs):
+    data = legacy_load()
+    data["session"].update(kwargs)
+    legacy_save(data)
+
+
+def workload(get_setting, get_session, update_session):
+    for i in range(OPS):
+        get_setting("session_minutes")
+        get_setting("work_duration_minutes")
+        get_session()
+        update_session(completed_minutes=i, state="working")
+
+
+def run(name: str, fn) -> float:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    ops = OPS * 4 / elapsed
+    print(f"{name:<28} {ops:>12,.0f} ops/sec  ({elapsed * 1000:.1f} ms)")
+    return ops
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.DATA_FILE = os.path.join(tmp, "data.json")
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        legacy_save(LEGACY_DATA)
+
+        legacy = run("load/save per call", lambda: workload(
+            legacy_get_setting, lambda: legacy_load()["session"], legacy_update_session
+        ))
+        database.init_db()
+        storage.load_users()
+        storage.register_user(USER_ID)
+        cached = run("cached write-behind", lambda: workload(
+            lambda key: storage.get_setting(USER_ID, key),
+            lambda: storage.get_user(USER_ID),
+            lambda **kwargs: storage.update_session(USER_ID, **kwargs),
+        ))
+        storage.flush()
+        assert database.load_user_rows()[0][storage.USER_COLUMNS.index("completed_minutes")] == OPS - 1
+        database.close_db()
+        print(f"speedup: {cached / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
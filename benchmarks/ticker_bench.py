@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ticker
+from benchmarks.fake_bot import FakeSession, make_bot
+
+FIRST_USER_ID = 100_000
+
+
+async def sleeper(seconds: float):
+    while True:
+        await asyncio.sleep(seconds)
+
+
+async def task_per_user_bytes(sessions: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = [asyncio.create_task(sleeper(ticker.MIN_REFRESH_SECONDS)) for _ in range(sessions)]
+    await asyncio.sleep(0)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return (after - before) / sessions
+
+
+async def run(sessions: int, seconds: float, session_minutes: int, edit_rate: float) -> dict:
+    session = FakeSession(latency=0.02)
+    countdown = ticker.LiveCountdown(edit_rate)
+    countdown.bot = make_bot(session)
+    now = time.time()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(sessions):
+        started = now - (i % (session_minutes * 60))
+        countdown.track(FIRST_USER_ID + i, FIRST_USER_ID + i, i + 1, "🚀 Поехали!", started, started + session_minutes * 60)
+    tracked = (tracemalloc.get_traced_memory()[0] - before) / sessions
+    tracemalloc.stop()
+
+    ticks = []
+    coalesced = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        await asyncio.sleep(ticker.TICK_SECONDS)
+        busy = countdown._batch is not None and not countdown._batch.done()
+        t = time.perf_counter()
+        countdown.tick(time.time())
+        ticks.append(time.perf_counter() - t)
+        coalesced += busy
+    elapsed = time.perf_counter() - start
+    await countdown.stop()
+    ticks.sort()
+    return {
+        "edits_per_second": len(session.calls) / elapsed,
+        "unchanged_per_second": countdown.unchanged / elapsed,
+        "refresh_seconds": countdown.refresh_seconds(),
+        "tick_p50_ms": ticks[len(ticks) // 2] * 1000,
+        "tick_max_ms": ticks[-1] * 1000,
+        "coalesced": coalesced,
+        "bytes_per_session": tracked,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Live countdown edits per second as concurrent sessions grow")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--session-minutes", type=int, default=25)
+    parser.add_argument("--edit-rate", type=float, default=ticker.LIVE_EDIT_RATE)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    print(f"edit budget {args.edit_rate:g}/s, tick {ticker.TICK_SECONDS:g} s, {args.seconds:g} s per run, "
+          f"Bot API latency 20 ms")
+    for sessions in args.sessions:
+        r = await run(sessions, args.seconds, args.session_minutes, args.edit_rate)
+        naive = await task_per_user_bytes(sessions)
+        print(
+            f"{sessions:>7,} sessions: {r['edits_per_second']:6.2f} edits/s  {r['unchanged_per_second']:7.2f} unchanged/s  "
+            f"refresh {r['refresh_seconds']:6.1f} s  tick p50 {r['tick_p50_ms']:.2f} ms max {r['tick_max_ms']:.2f} ms  "
+            f"coalesced {r['coalesced']}  {r['bytes_per_session']:.0f} B/session "
+            f"(task per user: {naive:.0f} B, {sessions / ticker.MIN_REFRESH_SECONDS:,.0f} edits/s)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timers import TimerQueue
+
+SESSIONS = 100_000
+SPREAD_SECONDS = 2.0
+CANCEL_RATIO = 0.1
+
+
+async def run_tasks(delays: list, cancelled: set) -> tuple:
+    fired = 0
+    done = asyncio.Event()
+
+    async def session(delay: float):
+        nonlocal fired
+        await asyncio.sleep(delay)
+        fired += 1
+        if fired == len(delays) - len(cancelled):
+            done.set()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(session(d)) for d in delays]
+    scheduled = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for i in cancelled:
+        tasks[i].cancel()
+    cancel_time = time.perf_counter() - start
+    await done.wait()
+    return scheduled, cancel_time, memory
+
+
+async def run_queue(delays: list, cancelled: set) -> tuple:
+    fired = 0
+    done = asyncio.Event()
+    queue = TimerQueue()
+    queue.start()
+
+    async def transition(user_id: int):
+        nonlocal fired
+        fired += 1
+        if fired == len(delays) - len(cancelled):
+            done.set()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    now = time.time()
+    for user_id, delay in enumerate(delays):
+        queue.schedule(user_id, now + delay, transition, user_id)
+    scheduled = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    pending = queue.pending()
+    start = time.perf_counter()
+    for user_id in cancelled:
+        queue.cancel(user_id)
+    cancel_time = time.perf_counter() - start
+    await done.wait()
+    await queue.stop()
+    assert pending == len(delays)
+    return scheduled, cancel_time, memory
+
+
+def report(name: str, result: tuple):
+    scheduled, cancel_time, memory = result
+    print(
+        f"{name:<18} schedule {scheduled * 1000:8.1f} ms  "
+        f"cancel {cancel_time * 1000:7.1f} ms  "
+        f"memory {memory / SESSIONS:6.0f} bytes/session"
+    )
+
+
+async def main():
+    random.seed(1)
+    delays = [0.5 + random.random() * SPREAD_SECONDS for _ in range(SESSIONS)]
+    cancelled = set(random.sample(range(SESSIONS), int(SESSIONS * CANCEL_RATIO)))
+    print(f"{SESSIONS:,} concurrent sessions, {len(cancelled):,} cancelled")
+    report("task per session", await run_tasks(delays, cancelled))
+    report("timer queue", await run_queue(delays, cancelled))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
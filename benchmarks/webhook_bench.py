@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+import database
+import storage
+from benchmarks.fake_api import FakeBotAPI
+from benchmarks.fake_bot import FAKE_TOKEN, message_update, callback_update
+from webhook import WebhookServer, SECRET_HEADER
+
+USERS = 500
+UPDATES = 3_000
+POST_CONCURRENCY = 40
+SECRET = "bench-secret"
+FIRST_USER_ID = 100_000
+
+
+def make_updates(first_id: int) -> list:
+    kinds = ["/status", "/stats", "stats_today", "stats_week", "stats_alltime"]
+    updates = []
+    for i in range(UPDATES):
+        user_id = FIRST_USER_ID + random.randrange(USERS)
+        kind = random.choice(kinds)
+        make = message_update if kind.startswith("/") else callback_update
+        updates.append(make(first_id + i, user_id, kind).model_dump(mode="json", exclude_none=True))
+    return updates
+
+
+class Counter:
+    def __init__(self):
+        self.done = 0
+        self.finished = asyncio.Event()
+
+    async def __call__(self, handler, event, data):
+        try:
+            return await handler(event, data)
+        finally:
+            self.done += 1
+            if self.done == UPDATES:
+                self.finished.set()
+
+
+async def run_polling(dp: Dispatcher, bot: Bot, api: FakeBotAPI, counter: Counter) -> float:
+    api.push_updates(make_updates(1))
+    start = time.perf_counter()
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False, polling_timeout=1))
+    await counter.finished.wait()
+    elapsed = time.perf_counter() - start
+    await dp.stop_polling()
+    await polling
+    return elapsed
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, counter: Counter) -> float:
+    server = WebhookServer(dp, bot, secret=SECRET)
+    await server.start("127.0.0.1", 0)
+    url = f"http://127.0.0.1:{server.port}{server.path}"
+    updates = make_updates(UPDATES + 1)
+    queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+
+    async with aiohttp.ClientSession(headers={SECRET_HEADER: SECRET}) as session:
+        async with session.post(url, json=updates[0], headers={SECRET_HEADER: "wrong"}) as response:
+            assert response.status == 401
+
+        async def sender():
+            while not queue.empty():
+                async with session.post(url, json=queue.get_nowait()) as response:
+                    assert response.status == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(sender() for _ in range(POST_CONCURRENCY)))
+        accepted = time.perf_counter() - start
+        await counter.finished.wait()
+        elapsed = time.perf_counter() - start
+    await server.stop()
+    print(f"webhook  accepted all POSTs in {accepted:.2f} s")
+    return elapsed
+
+
+async def main():
+    logging.disable(logging.INFO)
+    random.seed(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "bench.db")
+        storage.DATA_FILE = os.path.join(tmp, "data.json")
+        database.init_db()
+        storage.load_users()
+        for i in range(USERS):
+            storage.register_user(FIRST_USER_ID + i)
+
+        from handlers import router
+        api = FakeBotAPI(global_rate=10 ** 9, chat_burst=10 ** 9)
+        url = await api.start()
+        bot = Bot(token=FAKE_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(url)))
+        dp = Dispatcher()
+        dp.include_router(router)
+
+        print(f"{UPDATES:,} updates from {USERS} users, Bot API latency {api.latency * 1000:.0f} ms")
+        for name, run in (
+            ("polling", lambda counter: run_polling(dp, bot, api, counter)),
+            ("webhook", lambda counter: run_webhook(dp, bot, counter)),
+        ):
+            counter = Counter()
+            dp.update.outer_middleware.register(counter)
+            elapsed = await run(counter)
+            dp.update.outer_middleware.unregister(counter)
+            print(f"{name:<8} {UPDATES / elapsed:7.0f} updates/s  ({elapsed:.2f} s)")
+
+        await bot.session.close()
+        await api.stop()
+        storage.flush()
+        database.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import math
+import time
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+import database
+import metrics
+import scheduler
+import stats_cache
+import storage
+from config import CLUSTER_SHARDS, WORKER_ID, LEASE_SECONDS, WEBHOOK_URL
+from database import run_db, shard_lease
+
+log = logging.getLogger(__name__)
+
+LEADER_LEASE = "scheduler"
+INBOX_BATCH = 100
+INBOX_IDLE_SECONDS = 0.05
+INBOX_RETENTION_SECONDS = 3600
+POLL_TIMEOUT_SECONDS = 10
+
+
+def worker_lease(worker_id: str) -> str:
+    return f"worker:{worker_id}"
+
+
+class Cluster:
+    def __init__(self, dp: Dispatcher, bot: Bot, shards: int = CLUSTER_SHARDS, worker_id: str = WORKER_ID,
+                 lease_seconds: float = LEASE_SECONDS, poll_updates: bool = True):
+        self.dp = dp
+        self.bot = bot
+        self.shards = shards
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.poll_updates = poll_updates
+        self.owned = {}
+        self.heartbeat = None
+        self.leader_token = None
+        self._purged = 0.0
+        self._releasing = set()
+        self._processing = None
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = []
+        self._ingress: asyncio.Task = None
+
+    def fence(self, user_id: int):
+        shard = user_id % self.shards
+        token = self.owned.get(shard)
+        return None if token is None else (shard_lease(shard), token)
+
+    def shard_of(self, update: Update) -> int:
+        try:
+            user = getattr(update.event, "from_user", None)
+        except Exception:
+            user = None
+        return user.id % self.shards if user else 0
+
+    def _rows(self, updates: list) -> list:
+        return [
+            (update.update_id, self.shard_of(update), update.model_dump_json(by_alias=True, exclude_unset=True))
+            for update in updates
+        ]
+
+    def shard_users(self, shard: int) -> list:
+        return [user.user_id for user in storage.all_users() if user.user_id % self.shards == shard]
+
+    async def ingest(self, bot: Bot, update: Update):
+        if self.heartbeat is None:
+            raise RuntimeError("worker lease is not held")
+        queued = await run_db(
+            database.enqueue_updates, self._rows([update]), worker_lease(self.worker_id), self.heartbeat
+        )
+        if queued is None:
+            raise RuntimeError("worker lease token is stale")
+
+    async def _adopt(self, shard: int, token: int):
+        self.owned[shard] = token
+        user_ids = await run_db(storage.load_shard, shard, self.shards)
+        for user_id in user_ids:
+            stats_cache.invalidate(user_id)
+        if hasattr(self.dp.storage, "evict"):
+            self.dp.storage.evict(user_ids)
+        await scheduler.attach_users(user_ids)
+        metrics.set_gauge("bot_cluster_shards_owned", len(self.owned))
+        log.info("Worker %s took shard %d (token %d, %d users)", self.worker_id, shard, token, len(user_ids))
+
+    async def _drop(self, shard: int, release: bool):
+        user_ids = self.shard_users(shard)
+        if release:
+            self._releasing.add(shard)
+            while self._processing == shard:
+                await self._idle.wait()
+            scheduler.detach_users(user_ids)
+            await run_db(database.flush_session_events)
+            await run_db(storage.drop_users, user_ids)
+            if hasattr(self.dp.storage, "flush"):
+                await self.dp.storage.flush()
+            token = self.owned.pop(shard)
+            self._releasing.discard(shard)
+            await run_db(database.release_lease, shard_lease(shard), self.worker_id, token)
+        else:
+            self.owned.pop(shard)
+            scheduler.detach_users(user_ids)
+            await run_db(storage.drop_users, user_ids)
+        for user_id in user_ids:
+            stats_cache.invalidate(user_id)
+        if hasattr(self.dp.storage, "evict"):
+            self.dp.storage.evict(user_ids)
+        metrics.set_gauge("bot_cluster_shards_owned", len(self.owned))
+        log.info("Worker %s %s shard %d", self.worker_id, "released" if release else "lost", shard)
+
+    async def _renew(self):
+        for shard, token in list(self.owned.items()):
+            renewed = await run_db(database.acquire_lease, shard_lease(shard), self.worker_id, self.lease_seconds)
+            if renewed != token:
+                await self._drop(shard, release=False)
+                if renewed is not None:
+                    await self._adopt(shard, renewed)
+
+    async def _rebalance(self):
+        workers = len(await run_db(database.live_leases, "worker:"))
+        fair = math.ceil(self.shards / max(workers, 1))
+        if len(self.owned) > fair:
+            await self._drop(max(self.owned), release=True)
+            return
+        if len(self.owned) == fair:
+            return
+        held = {int(row["name"].split(":")[1]) for row in await run_db(database.live_leases, "shard:")}
+        for shard in range(self.shards):
+            if len(self.owned) >= fair:
+                break
+            if shard in held or shard in self.owned:
+                continue
+            token = await run_db(database.acquire_lease, shard_lease(shard), self.worker_id, self.lease_seconds)
+            if token is not None:
+                await self._adopt(shard, token)
+
+    async def _lead(self):
+        token = await run_db(database.acquire_lease, LEADER_LEASE, self.worker_id, self.lease_seconds)
+        if token != self.leader_token:
+            if self.leader_token is not None:
+                log.warning("Worker %s lost scheduler leadership", self.worker_id)
+                scheduler.remove_global_jobs()
+                self._stop_ingress()
+            self.leader_token = token
+            if token is not None:
+                log.info("Worker %s leads the scheduler (token %d)", self.worker_id, token)
+                scheduler.add_global_jobs()
+                if self.poll_updates:
+                    self._ingress = asyncio.create_task(self._poll(token))
+        if token is not None and time.time() - self._purged > INBOX_RETENTION_SECONDS / 10:
+            self._purged = time.time()
+            await run_db(database.purge_updates, self._purged - INBOX_RETENTION_SECONDS)
+
+    async def tick(self):
+        self.heartbeat = await run_db(
+            database.acquire_lease, worker_lease(self.worker_id), self.worker_id, self.lease_seconds
+        )
+        await self._renew()
+        await self._rebalance()
+        await self._lead()
+
+    async def _tick_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.tick()
+            except Exception:
+                log.exception("Cluster tick failed")
+
+    async def _poll(self, token: int):
+        offset = await run_db(database.last_update_id)
+        offset = offset + 1 if offset is not None else None
+        allowed = self.dp.resolve_used_update_types()
+        webhook_deleted = False
+        while True:
+            try:
+                if not webhook_deleted:
+                    webhook_deleted = await self.bot.delete_webhook()
+                updates = await self.bot.get_updates(
+                    offset=offset, timeout=POLL_TIMEOUT_SECONDS, allowed_updates=allowed,
+                    request_timeout=POLL_TIMEOUT_SECONDS + 5,
+                )
+            except Exception:
+                log.exception("getUpdates failed")
+                await asyncio.sleep(1)
+                continue
+            if not updates:
+                continue
+            if await run_db(database.enqueue_updates, self._rows(updates), LEADER_LEASE, token) is None:
+                if self.leader_token != token:
+                    return
+                continue
+            offset = updates[-1].update_id + 1
+
+    def _stop_ingress(self):
+        if self._ingress is not None:
+            self._ingress.cancel()
+            self._ingress = None
+
+    def _claimable(self) -> dict:
+        return {shard: token for shard, token in self.owned.items() if shard not in self._releasing}
+
+    async def _process(self, update_id: int, shard: int, token: int, payload: str):
+        self._processing = shard
+        self._idle.clear()
+        try:
+            try:
+                update = Update.model_validate_json(payload, context={"bot": self.bot})
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                log.exception("Failed to process update %s", update_id)
+            if await run_db(database.complete_update, update_id, shard, token):
+                metrics.inc("bot_cluster_updates_total")
+        finally:
+            self._processing = None
+            self._idle.set()
+
+    async def _consume(self):
+        while True:
+            try:
+                rows = await run_db(database.claim_updates, self._claimable(), INBOX_BATCH)
+            except Exception:
+                log.exception("Failed to claim updates")
+                rows = []
+            if not rows:
+                await asyncio.sleep(INBOX_IDLE_SECONDS)
+                continue
+            for update_id, shard, token, payload in rows:
+                if self.owned.get(shard) != token or shard in self._releasing:
+                    continue
+                await self._process(update_id, shard, token, payload)
+
+    async def start(self):
+        database.FENCE = self.fence
+        await self.tick()
+        self._tasks = [asyncio.create_task(self._tick_loop()), asyncio.create_task(self._consume())]
+
+    async def stop(self):
+        self._stop_ingress()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for shard in list(self.owned):
+            await self._drop(shard, release=True)
+        if self.leader_token is not None:
+            scheduler.remove_global_jobs()
+            await run_db(database.release_lease, LEADER_LEASE, self.worker_id, self.leader_token)
+            self.leader_token = None
+        if self.heartbeat is not None:
+            await run_db(database.release_lease, worker_lease(self.worker_id), self.worker_id, self.heartbeat)
+            self.heartbeat = None
+
+
+async def run_cluster(dp: Dispatcher, bot: Bot):
+    from webhook import WebhookServer, set_webhook, wait_for_shutdown
+    cluster = Cluster(dp, bot, poll_updates=not WEBHOOK_URL)
+    server = WebhookServer(dp, bot, ingest=cluster.ingest) if WEBHOOK_URL else None
+    await cluster.start()
+    if server is not None:
+        await server.start(reuse_port=True)
+        await set_webhook(dp, bot)
+    await dp.emit_startup(bot=bot)
+    try:
+        await wait_for_shutdown()
+    finally:
+        if server is not None:
+            await server.stop()
+        await cluster.stop()
+        await dp.emit_shutdown(bot=bot)
@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 from zoneinfo import ZoneInfo
 
@@ -6,4 +7,27 @@ load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")
 ADMIN_ID = int(os.getenv("ADMIN_ID", "0"))
+ALLOWED_USER_IDS = {int(x) for x in os.getenv("ALLOWED_USER_IDS", "").split(",") if x.strip()}
+OPEN_REGISTRATION = os.getenv("OPEN_REGISTRATION", "0") == "1"
 TIMEZONE = ZoneInfo(os.getenv("TIMEZONE", "Europe/Kiev"))
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+DB_DURABILITY = os.getenv("DB_DURABILITY", "group")
+DB_GROUP_COMMIT_MS = int(os.getenv("DB_GROUP_COMMIT_MS", "50"))
+DB_GROUP_COMMIT_EVENTS = int(os.getenv("DB_GROUP_COMMIT_EVENTS", "256"))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+FSM_TTL_SECONDS = int(os.getenv("FSM_TTL_SECONDS", "86400"))
+FSM_FLUSH_MS = int(os.getenv("FSM_FLUSH_MS", "500"))
+LIVE_EDIT_RATE = float(os.getenv("LIVE_EDIT_RATE", "10"))
+CALLBACK_DEDUP_SIZE = int(os.getenv("CALLBACK_DEDUP_SIZE", "4096"))
+CLUSTER_SHARDS = int(os.getenv("CLUSTER_SHARDS", "0"))
+WORKER_ID = os.getenv("WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
+LEASE_SECONDS = float(os.getenv("LEASE_SECONDS", "10"))
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
@@ -1,11 +1,45 @@
+import asyncio
+import logging
 import sqlite3
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
 from contextlib import contextmanager
+from functools import partial
+from itertools import groupby
+from operator import itemgetter
 from zoneinfo import ZoneInfo
 
+import metrics
+import stats_cache
+from config import DB_DURABILITY, DB_GROUP_COMMIT_MS, DB_GROUP_COMMIT_EVENTS
+
+
+log = logging.getLogger(__name__)
 
 DB_FILE = "workbot.db"
+DB_WORKERS = 1
+TRACE_CALLBACK = None
+FENCE = None
+EXPORT_BATCH_DAYS = 100
+SESSION_ID_BLOCK = 1024
+DURABILITY = DB_DURABILITY
+GROUP_COMMIT_SECONDS = DB_GROUP_COMMIT_MS / 1000
+GROUP_COMMIT_EVENTS = DB_GROUP_COMMIT_EVENTS
+
+_local = threading.local()
+_connections: list = []
+_connections_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+
+_events: list = []
+_events_lock = threading.Lock()
+_events_flush_lock = threading.Lock()
+_events_timer: threading.Timer = None
+_last_session_id = 0
+_session_id_limit = 0
 
 
 def _now() -> datetime:
@@ -18,100 +52,1104 @@ def _today() -> str:
     return datetime.now(TIMEZONE).date().isoformat()
 
 
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA cache_size=-16000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    if TRACE_CALLBACK:
+        conn.set_trace_callback(TRACE_CALLBACK)
+    with _connections_lock:
+        _connections.append(conn)
+    return conn
+
+
 @contextmanager
 def get_conn():
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
     try:
         yield conn
         conn.commit()
-    finally:
-        conn.close()
+    except BaseException:
+        conn.rollback()
+        raise
 
-        
-def init_db():
-    with get_conn() as conn:
+
+async def run_db(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+def submit_db(func, *args):
+    try:
+        return _executor.submit(func, *args)
+    except RuntimeError:
+        return None
+
+
+def call_db(func, *args):
+    return _executor.submit(func, *args).result()
+
+
+def close_db():
+    global _executor, _last_session_id, _session_id_limit
+    _executor.shutdown(wait=True)
+    flush_session_events()
+    _last_session_id = _session_id_limit = 0
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+    _local.__dict__.clear()
+    _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+
+
+ROLLUP_COLUMNS = ("days", "planned_minutes", "worked_minutes", "sessions", "days_worked", "days_completed")
+
+ROLLUP_TABLES = (
+    ("stats_weekly", "week_start"),
+    ("stats_monthly", "month"),
+    ("stats_alltime", None),
+)
+
+_ROLLUP_SELECT = """
+    COUNT(*) AS days,
+    COALESCE(SUM(planned_minutes), 0) AS planned_minutes,
+    COALESCE(SUM(worked_minutes), 0) AS worked_minutes,
+    COALESCE(SUM(sessions_completed), 0) AS sessions,
+    COALESCE(SUM(worked_minutes > 0), 0) AS days_worked,
+    COALESCE(SUM(completed = 1), 0) AS days_completed
+"""
+
+_ROLLUP_KEYS = {
+    "stats_weekly": "date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7) || ' days')",
+    "stats_monthly": "substr(date, 1, 7)",
+    "stats_alltime": "NULL",
+}
+
+
+RECORD_COLUMNS = (
+    "current_streak", "streak_end", "longest_streak", "longest_streak_end",
+    "best_day", "best_day_minutes", "best_week", "best_week_minutes",
+)
+
+_EMPTY_RECORDS = (0, None, 0, None, None, 0, None, 0)
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> set:
+    return {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _migrate_to_multi_user(conn: sqlite3.Connection):
+    from config import ADMIN_ID
+    day_columns = _columns(conn, "work_days")
+    if day_columns and "user_id" not in day_columns:
         conn.execute("""
-            CREATE TABLE IF NOT EXISTS work_days (
+            CREATE TABLE work_days_multi_user (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL UNIQUE,
+                user_id INTEGER NOT NULL,
+                date TEXT NOT NULL,
                 planned_minutes INTEGER NOT NULL DEFAULT 120,
                 worked_minutes INTEGER NOT NULL DEFAULT 0,
                 sessions_completed INTEGER NOT NULL DEFAULT 0,
                 started_at TEXT,
                 finished_at TEXT,
-                completed BOOLEAN NOT NULL DEFAULT 0
+                completed BOOLEAN NOT NULL DEFAULT 0,
+                UNIQUE (user_id, date)
             )
         """)
         conn.execute("""
-            CREATE TABLE IF NOT EXISTS work_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                work_day_id INTEGER NOT NULL,
-                session_number INTEGER NOT NULL,
-                duration_minutes INTEGER NOT NULL,
-                started_at TEXT NOT NULL,
-                finished_at TEXT,
-                FOREIGN KEY (work_day_id) REFERENCES work_days(id)
+            INSERT INTO work_days_multi_user
+                (id, user_id, date, planned_minutes, worked_minutes, sessions_completed, started_at, finished_at, completed)
+            SELECT id, ?, date, planned_minutes, worked_minutes, sessions_completed, started_at, finished_at, completed
+            FROM work_days
+        """, (ADMIN_ID,))
+        conn.execute("DROP TABLE work_days")
+        conn.execute("ALTER TABLE work_days_multi_user RENAME TO work_days")
+    session_columns = _columns(conn, "work_sessions")
+    if session_columns and "user_id" not in session_columns:
+        conn.execute("ALTER TABLE work_sessions ADD COLUMN user_id INTEGER NOT NULL DEFAULT 0")
+        conn.execute("UPDATE work_sessions SET user_id = (SELECT user_id FROM work_days WHERE id = work_day_id)")
+    alltime_columns = _columns(conn, "stats_alltime")
+    if alltime_columns and "user_id" not in alltime_columns:
+        for table in ("stats_weekly", "stats_monthly", "stats_alltime", "stats_alltime_bounds"):
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def _migration_baseline(conn: sqlite3.Connection):
+    _migrate_to_multi_user(conn)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            work_start_time TEXT NOT NULL,
+            work_duration_minutes INTEGER NOT NULL,
+            session_minutes INTEGER NOT NULL,
+            break_minutes INTEGER NOT NULL,
+            warning_before_end_minutes INTEGER NOT NULL,
+            active BOOLEAN NOT NULL DEFAULT 0,
+            completed_minutes INTEGER NOT NULL DEFAULT 0,
+            state TEXT NOT NULL DEFAULT 'idle',
+            session_counter INTEGER NOT NULL DEFAULT 0,
+            session_db_id INTEGER,
+            deadline REAL,
+            next_transition TEXT
+        )
+    """)
+    user_columns = _columns(conn, "users")
+    for column, definition in (("deadline", "REAL"), ("next_transition", "TEXT")):
+        if column not in user_columns:
+            conn.execute(f"ALTER TABLE users ADD COLUMN {column} {definition}")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS work_days (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            planned_minutes INTEGER NOT NULL DEFAULT 120,
+            worked_minutes INTEGER NOT NULL DEFAULT 0,
+            sessions_completed INTEGER NOT NULL DEFAULT 0,
+            started_at TEXT,
+            finished_at TEXT,
+            completed BOOLEAN NOT NULL DEFAULT 0,
+            UNIQUE (user_id, date)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS work_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            work_day_id INTEGER NOT NULL,
+            session_number INTEGER NOT NULL,
+            duration_minutes INTEGER NOT NULL,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            user_id INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (work_day_id) REFERENCES work_days(id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_work_sessions_user ON work_sessions (user_id, started_at)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_work_sessions_open ON work_sessions (user_id) WHERE finished_at IS NULL"
+    )
+    for table, key in ROLLUP_TABLES:
+        bucket = f"{key} TEXT NOT NULL," if key else ""
+        primary_key = f"user_id, {key}" if key else "user_id"
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                user_id INTEGER NOT NULL,
+                {bucket}
+                days INTEGER NOT NULL DEFAULT 0,
+                planned_minutes INTEGER NOT NULL DEFAULT 0,
+                worked_minutes INTEGER NOT NULL DEFAULT 0,
+                sessions INTEGER NOT NULL DEFAULT 0,
+                days_worked INTEGER NOT NULL DEFAULT 0,
+                days_completed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY ({primary_key})
             )
         """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats_alltime_bounds (
+            user_id INTEGER PRIMARY KEY,
+            first_day TEXT,
+            last_day TEXT
+        )
+    """)
 
-        
-        
-def get_or_create_today() -> int:
-    today = _today()
+
+def _migration_session_indexes(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_work_sessions_day ON work_sessions (work_day_id, session_number)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_work_sessions_started ON work_sessions (started_at)")
+    conn.execute("ANALYZE")
+
+
+def _migration_records(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats_records (
+            user_id INTEGER PRIMARY KEY,
+            current_streak INTEGER NOT NULL DEFAULT 0,
+            streak_end TEXT,
+            longest_streak INTEGER NOT NULL DEFAULT 0,
+            longest_streak_end TEXT,
+            best_day TEXT,
+            best_day_minutes INTEGER NOT NULL DEFAULT 0,
+            best_week TEXT,
+            best_week_minutes INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    _rebuild_records(conn)
+
+
+def _migration_fsm_states(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at)")
+
+
+def _migration_cluster(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            token INTEGER NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS update_inbox (
+            update_id INTEGER PRIMARY KEY,
+            shard INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            received_at REAL NOT NULL,
+            done_at REAL
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_update_inbox_pending ON update_inbox (shard, update_id) WHERE done_at IS NULL"
+    )
+
+
+def _migration_inbox_claims(conn: sqlite3.Connection):
+    if "claim_token" not in _columns(conn, "update_inbox"):
+        conn.execute("ALTER TABLE update_inbox ADD COLUMN claim_token INTEGER")
+
+
+MIGRATIONS = (
+    (1, "baseline schema", _migration_baseline),
+    (2, "work_sessions indexes for day and start lookups", _migration_session_indexes),
+    (3, "stats_records streaks and personal bests", _migration_records),
+    (4, "fsm_states for persistent dialog state", _migration_fsm_states),
+    (5, "leases and update_inbox for clustered workers", _migration_cluster),
+    (6, "update_inbox claim tokens", _migration_inbox_claims),
+)
+
+
+def _schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def schema_version() -> int:
     with get_conn() as conn:
-        row = conn.execute("SELECT id FROM work_days WHERE date = ?", (today,)).fetchone()
-        if row:
-            return row["id"]
-        from storage import get_setting
-        planned = get_setting("work_duration_minutes")
+        if not _columns(conn, "schema_version"):
+            return 0
+        return _schema_version(conn)
+
+
+@metrics.timed_db
+def migrate(target: int = None) -> list:
+    applied = []
+    with get_conn() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL
+            )
+        """)
+        current = _schema_version(conn)
+        for version, name, upgrade in MIGRATIONS:
+            if version <= current or (target is not None and version > target):
+                continue
+            upgrade(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                (version, name, _now().isoformat())
+            )
+            applied.append(version)
+    return applied
+
+
+@metrics.timed_db
+def init_db() -> list:
+    applied = migrate()
+    with get_conn() as conn:
+        has_days = conn.execute("SELECT 1 FROM work_days LIMIT 1").fetchone()
+        has_rollup = conn.execute("SELECT 1 FROM stats_alltime LIMIT 1").fetchone()
+    if has_days and not has_rollup:
+        rebuild_rollups()
+    return applied
+
+
+@metrics.timed_db
+def load_user_rows(shard: int = None, shards: int = None) -> list:
+    from storage import USER_COLUMNS
+    where, params = ("WHERE user_id % ? = ?", (shards, shard)) if shards else ("", ())
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return cursor.execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users {where}", params).fetchall()
+
+
+@metrics.timed_db
+def save_user_rows(rows: list):
+    _read_your_writes()
+    from storage import USER_COLUMNS
+    columns = ", ".join(USER_COLUMNS)
+    placeholders = ", ".join("?" * len(USER_COLUMNS))
+    updates = ", ".join(f"{c} = excluded.{c}" for c in USER_COLUMNS[1:])
+    with transaction() as (conn, now):
+        owned = _fence_checker(conn)
+        if owned is not None:
+            rows = [row for row in rows if owned(row[0])]
+        conn.executemany(
+            f"INSERT INTO users ({columns}) VALUES ({placeholders}) ON CONFLICT(user_id) DO UPDATE SET {updates}",
+            rows
+        )
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _day_contribution(row) -> tuple:
+    if row is None:
+        return (0,) * len(ROLLUP_COLUMNS)
+    return (
+        1,
+        row["planned_minutes"],
+        row["worked_minutes"],
+        row["sessions_completed"],
+        1 if row["worked_minutes"] > 0 else 0,
+        1 if row["completed"] else 0,
+    )
+
+
+def _apply_rollup_delta(conn: sqlite3.Connection, before, after):
+    delta = tuple(a - b for a, b in zip(_day_contribution(after), _day_contribution(before)))
+    if not any(delta):
+        return
+    user_id = after["user_id"]
+    day = date.fromisoformat(after["date"])
+    buckets = {
+        "stats_weekly": _week_start(day).isoformat(),
+        "stats_monthly": day.isoformat()[:7],
+    }
+    columns = ", ".join(ROLLUP_COLUMNS)
+    placeholders = ", ".join("?" * len(ROLLUP_COLUMNS))
+    updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in ROLLUP_COLUMNS)
+    for table, key in ROLLUP_TABLES:
+        if key:
+            conn.execute(
+                f"INSERT INTO {table} (user_id, {key}, {columns}) VALUES (?, ?, {placeholders}) "
+                f"ON CONFLICT(user_id, {key}) DO UPDATE SET {updates}",
+                (user_id, buckets[table], *delta)
+            )
+        else:
+            conn.execute(
+                f"INSERT INTO {table} (user_id, {columns}) VALUES (?, {placeholders}) "
+                f"ON CONFLICT(user_id) DO UPDATE SET {updates}",
+                (user_id, *delta)
+            )
+    if after["worked_minutes"] > 0:
+        conn.execute("""
+            INSERT INTO stats_alltime_bounds (user_id, first_day, last_day) VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                first_day = MIN(first_day, excluded.first_day),
+                last_day = MAX(last_day, excluded.last_day)
+        """, (user_id, after["date"], after["date"]))
+    _apply_records_delta(conn, before, after)
+
+
+def _yesterday() -> str:
+    return (date.fromisoformat(_today()) - timedelta(days=1)).isoformat()
+
+
+def _effective_records(record: tuple, yesterday: str) -> tuple:
+    current, streak_end, *rest = record
+    return (current if streak_end and streak_end >= yesterday else 0, streak_end, *rest)
+
+
+def _scan_records(conn: sqlite3.Connection, user_id: int = None) -> dict:
+    where, params = ("WHERE user_id = ?", (user_id,)) if user_id is not None else ("", ())
+    yesterday = _yesterday()
+    one_day = timedelta(days=1)
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    records = {}
+    rows = cursor.execute(
+        f"SELECT user_id, date, worked_minutes, completed FROM work_days {where} ORDER BY user_id, date", params
+    )
+    for uid, days in groupby(rows, itemgetter(0)):
+        run, run_end, longest, longest_end = 0, None, 0, None
+        best_day, best_day_minutes, weeks = None, 0, {}
+        for _, day, worked, completed in days:
+            current = date.fromisoformat(day)
+            if completed:
+                run = run + 1 if run_end is not None and current - run_end == one_day else 1
+                run_end = current
+                if run > longest:
+                    longest, longest_end = run, day
+            if worked > best_day_minutes:
+                best_day, best_day_minutes = day, worked
+            if worked:
+                week = _week_start(current).isoformat()
+                weeks[week] = weeks.get(week, 0) + worked
+        best_week = min(weeks, key=lambda week: (-weeks[week], week)) if weeks else None
+        record = (
+            run, run_end and run_end.isoformat(), longest, longest_end,
+            best_day, best_day_minutes, best_week, weeks.get(best_week, 0),
+        )
+        if record != _EMPTY_RECORDS:
+            records[uid] = _effective_records(record, yesterday)
+    return records
+
+
+def _rebuild_records(conn: sqlite3.Connection, user_id: int = None):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_records'").fetchone():
+        return
+    where, params = ("WHERE user_id = ?", (user_id,)) if user_id is not None else ("", ())
+    conn.execute(f"DELETE FROM stats_records {where}", params)
+    conn.executemany(
+        f"INSERT INTO stats_records (user_id, {', '.join(RECORD_COLUMNS)}) VALUES (?{', ?' * len(RECORD_COLUMNS)})",
+        [(uid, *record) for uid, record in _scan_records(conn, user_id).items()]
+    )
+
+
+def _apply_records_delta(conn: sqlite3.Connection, before, after):
+    user_id = after["user_id"]
+    row = conn.execute(
+        f"SELECT {', '.join(RECORD_COLUMNS)} FROM stats_records WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    record = dict(zip(RECORD_COLUMNS, row or _EMPTY_RECORDS))
+    original = dict(record)
+    day = date.fromisoformat(after["date"])
+    week = _week_start(day).isoformat()
+    worked_delta = after["worked_minutes"] - (before["worked_minutes"] if before else 0)
+    was_completed = bool(before and before["completed"])
+    newly_completed = bool(after["completed"]) and not was_completed
+    streak_end = record["streak_end"] and date.fromisoformat(record["streak_end"])
+    follows = bool(streak_end) and day - streak_end == timedelta(days=1)
+    if (
+        (was_completed and not after["completed"])
+        or (worked_delta < 0 and (after["date"] == record["best_day"] or week == record["best_week"]))
+        or (newly_completed and streak_end and (day <= streak_end or (follows and not record["current_streak"])))
+    ):
+        _rebuild_records(conn, user_id)
+        return
+    if newly_completed:
+        record["current_streak"] = record["current_streak"] + 1 if follows else 1
+        record["streak_end"] = after["date"]
+        if record["current_streak"] > record["longest_streak"]:
+            record["longest_streak"] = record["current_streak"]
+            record["longest_streak_end"] = after["date"]
+    if worked_delta > 0:
+        worked = after["worked_minutes"]
+        if worked > record["best_day_minutes"] or (worked == record["best_day_minutes"] and after["date"] < record["best_day"]):
+            record["best_day"], record["best_day_minutes"] = after["date"], worked
+        weekly = conn.execute(
+            "SELECT worked_minutes FROM stats_weekly WHERE user_id = ? AND week_start = ?", (user_id, week)
+        ).fetchone()[0]
+        if weekly > record["best_week_minutes"] or (weekly == record["best_week_minutes"] and week < record["best_week"]):
+            record["best_week"], record["best_week_minutes"] = week, weekly
+    if record != original:
         conn.execute(
-            "INSERT INTO work_days (date, planned_minutes, started_at) VALUES (?, ?, ?)",
-            (today, planned, _now().isoformat())
+            f"INSERT OR REPLACE INTO stats_records (user_id, {', '.join(RECORD_COLUMNS)}) "
+            f"VALUES (?{', ?' * len(RECORD_COLUMNS)})",
+            (user_id, *record.values())
         )
-        return conn.execute("SELECT id FROM work_days WHERE date = ?", (today,)).fetchone()["id"]
 
 
-def record_session_start(session_number: int, duration_minutes: int) -> int:
-    day_id = get_or_create_today()
+def _rebuild_rollups(conn: sqlite3.Connection, user_id: int = None):
+    where, params = ("WHERE user_id = ?", (user_id,)) if user_id is not None else ("", ())
+    columns = ", ".join(ROLLUP_COLUMNS)
+    for table, key in ROLLUP_TABLES:
+        conn.execute(f"DELETE FROM {table} {where}", params)
+        if key:
+            conn.execute(
+                f"INSERT INTO {table} (user_id, {key}, {columns}) "
+                f"SELECT user_id, {_ROLLUP_KEYS[table]} AS bucket, {_ROLLUP_SELECT} "
+                f"FROM work_days {where} GROUP BY user_id, bucket",
+                params
+            )
+        else:
+            conn.execute(
+                f"INSERT INTO {table} (user_id, {columns}) "
+                f"SELECT user_id, {_ROLLUP_SELECT} FROM work_days {where} GROUP BY user_id",
+                params
+            )
+    conn.execute(f"DELETE FROM stats_alltime_bounds {where}", params)
+    conn.execute(f"""
+        INSERT INTO stats_alltime_bounds (user_id, first_day, last_day)
+        SELECT user_id, MIN(date), MAX(date) FROM work_days
+        WHERE worked_minutes > 0 {"AND user_id = ?" if user_id is not None else ""} GROUP BY user_id
+    """, params)
+    _rebuild_records(conn, user_id)
+
+
+@metrics.timed_db
+def rebuild_rollups(user_id: int = None):
+    _read_your_writes()
+    with transaction() as (conn, now):
+        _rebuild_rollups(conn, user_id)
+    stats_cache.invalidate(user_id)
+
+
+@metrics.timed_db
+def check_rollups() -> list:
+    _read_your_writes()
+    problems = []
+    empty = (0,) * len(ROLLUP_COLUMNS)
     with get_conn() as conn:
-        conn.execute(
-            "INSERT INTO work_sessions (work_day_id, session_number, duration_minutes, started_at) VALUES (?, ?, ?, ?)",
-            (day_id, session_number, duration_minutes, _now().isoformat())
+        for table, key in ROLLUP_TABLES:
+            expected = {
+                (row["user_id"], row["bucket"]): tuple(row[c] for c in ROLLUP_COLUMNS)
+                for row in conn.execute(
+                    f"SELECT user_id, {_ROLLUP_KEYS[table]} AS bucket, {_ROLLUP_SELECT} "
+                    f"FROM work_days GROUP BY user_id, bucket"
+                )
+            }
+            actual = {
+                (row["user_id"], row[key] if key else None): tuple(row[c] for c in ROLLUP_COLUMNS)
+                for row in conn.execute(f"SELECT * FROM {table}")
+            }
+            for bucket in sorted(set(expected) | set(actual), key=str):
+                if expected.get(bucket, empty) != actual.get(bucket, empty):
+                    problems.append(f"{table}{list(bucket)}: expected {expected.get(bucket)}, got {actual.get(bucket)}")
+        expected = {
+            row["user_id"]: (row["first_day"], row["last_day"])
+            for row in conn.execute("""
+                SELECT user_id, MIN(date) AS first_day, MAX(date) AS last_day
+                FROM work_days WHERE worked_minutes > 0 GROUP BY user_id
+            """)
+        }
+        actual = {
+            row["user_id"]: (row["first_day"], row["last_day"])
+            for row in conn.execute("SELECT * FROM stats_alltime_bounds")
+        }
+        for user_id in sorted(set(expected) | set(actual)):
+            if expected.get(user_id) != actual.get(user_id):
+                problems.append(
+                    f"stats_alltime_bounds[{user_id}]: expected {expected.get(user_id)}, got {actual.get(user_id)}"
+                )
+        yesterday = _yesterday()
+        expected = _scan_records(conn)
+        actual = {
+            row["user_id"]: _effective_records(tuple(row[c] for c in RECORD_COLUMNS), yesterday)
+            for row in conn.execute("SELECT * FROM stats_records")
+        }
+        for user_id in sorted(set(expected) | set(actual)):
+            if expected.get(user_id, _EMPTY_RECORDS) != actual.get(user_id, _EMPTY_RECORDS):
+                problems.append(f"stats_records[{user_id}]: expected {expected.get(user_id)}, got {actual.get(user_id)}")
+    return problems
+
+
+@metrics.timed_db
+def expire_streaks() -> int:
+    _read_your_writes()
+    with transaction() as (conn, now):
+        expired = conn.execute(
+            "UPDATE stats_records SET current_streak = 0 WHERE current_streak > 0 AND streak_end < ?",
+            (_yesterday(),)
+        ).rowcount
+    stats_cache.invalidate()
+    return expired
+
+
+@contextmanager
+def transaction(at: datetime = None):
+    now = at or _now()
+    with get_conn() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn, now
+
+
+def _day_row(conn: sqlite3.Connection, day_id: int):
+    return conn.execute("SELECT * FROM work_days WHERE id = ?", (day_id,)).fetchone()
+
+
+def _ensure_day(conn: sqlite3.Connection, user_id: int, now: datetime) -> int:
+    today = now.date().isoformat()
+    row = conn.execute("SELECT id FROM work_days WHERE user_id = ? AND date = ?", (user_id, today)).fetchone()
+    if row:
+        return row["id"]
+    from storage import get_setting
+    planned = get_setting(user_id, "work_duration_minutes")
+    day_id = conn.execute(
+        "INSERT INTO work_days (user_id, date, planned_minutes, started_at) VALUES (?, ?, ?, ?)",
+        (user_id, today, planned, now.isoformat())
+    ).lastrowid
+    _apply_rollup_delta(conn, None, _day_row(conn, day_id))
+    return day_id
+
+
+def _mark_day_complete(conn: sqlite3.Connection, day_id: int, total_minutes: int, now: datetime):
+    conn.execute("""
+        UPDATE work_days
+        SET completed = 1, finished_at = ?, worked_minutes = ?
+        WHERE id = ?
+    """, (now.isoformat(), total_minutes, day_id))
+
+
+@metrics.timed_db
+def get_or_create_today(user_id: int) -> int:
+    with transaction() as (conn, now):
+        return _ensure_day(conn, user_id, now)
+
+
+def _fence_checker(conn: sqlite3.Connection):
+    if FENCE is None:
+        return None
+    held = {}
+
+    def owned(user_id: int) -> bool:
+        lease = FENCE(user_id)
+        if lease is None:
+            return False
+        if lease not in held:
+            row = conn.execute("SELECT token FROM leases WHERE name = ?", (lease[0],)).fetchone()
+            held[lease] = row is not None and row[0] == lease[1]
+            if not held[lease]:
+                metrics.inc("bot_cluster_fenced_writes_total", lease=lease[0])
+        return held[lease]
+
+    return owned
+
+
+@metrics.timed_db
+def acquire_lease(name: str, owner: str, ttl: float) -> int:
+    now = time.time()
+    with transaction() as (conn, _):
+        row = conn.execute("SELECT owner, token, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            token = 1
+        elif row["expires_at"] > now:
+            if row["owner"] != owner:
+                return None
+            token = row["token"]
+        else:
+            token = row["token"] + 1
+        conn.execute("""
+            INSERT INTO leases (name, owner, token, expires_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, token = excluded.token, expires_at = excluded.expires_at
+        """, (name, owner, token, now + ttl))
+    return token
+
+
+@metrics.timed_db
+def release_lease(name: str, owner: str, token: int) -> bool:
+    with get_conn() as conn:
+        return conn.execute(
+            "UPDATE leases SET expires_at = 0 WHERE name = ? AND owner = ? AND token = ?", (name, owner, token)
+        ).rowcount > 0
+
+
+@metrics.timed_db
+def live_leases(prefix: str) -> list:
+    with get_conn() as conn:
+        return conn.execute(
+            "SELECT name, owner, token, expires_at FROM leases WHERE name LIKE ? AND expires_at > ?",
+            (prefix + "%", time.time())
+        ).fetchall()
+
+
+def shard_lease(shard: int) -> str:
+    return f"shard:{shard}"
+
+
+def _holds_lease(conn: sqlite3.Connection, lease: str, token: int) -> bool:
+    row = conn.execute("SELECT token FROM leases WHERE name = ?", (lease,)).fetchone()
+    if row is None or row[0] != token:
+        metrics.inc("bot_cluster_fenced_writes_total", lease=lease)
+        return False
+    return True
+
+
+@metrics.timed_db
+def enqueue_updates(rows: list, lease: str, token: int) -> int:
+    with transaction() as (conn, _):
+        if not _holds_lease(conn, lease, token):
+            return None
+        before = conn.total_changes
+        received_at = time.time()
+        conn.executemany(
+            "INSERT OR IGNORE INTO update_inbox (update_id, shard, payload, received_at) VALUES (?, ?, ?, ?)",
+            [(*update, received_at) for update in rows]
         )
-        return conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return conn.total_changes - before
 
 
-def record_session_end(session_id: int, duration_minutes: int):
-    day_id = get_or_create_today()
-    today = _today()
+@metrics.timed_db
+def claim_updates(shards: dict, limit: int = 100) -> list:
+    if not shards:
+        return []
+    claimed = []
+    share = -(-limit // len(shards))
+    with transaction() as (conn, _):
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        for shard, token in shards.items():
+            if not _holds_lease(conn, shard_lease(shard), token):
+                continue
+            claimed += cursor.execute("""
+                UPDATE update_inbox SET claim_token = ?
+                WHERE update_id IN (
+                    SELECT update_id FROM update_inbox
+                    WHERE shard = ? AND done_at IS NULL AND (claim_token IS NULL OR claim_token < ?)
+                    ORDER BY update_id LIMIT ?
+                )
+                RETURNING update_id, shard, claim_token, payload
+            """, (token, shard, token, share)).fetchall()
+    return sorted(claimed)
+
+
+@metrics.timed_db
+def complete_update(update_id: int, shard: int, token: int) -> bool:
+    with transaction() as (conn, _):
+        if not _holds_lease(conn, shard_lease(shard), token):
+            return False
+        return conn.execute(
+            "UPDATE update_inbox SET done_at = ? WHERE update_id = ? AND claim_token = ? AND done_at IS NULL",
+            (time.time(), update_id, token)
+        ).rowcount > 0
+
+
+@metrics.timed_db
+def last_update_id() -> int:
     with get_conn() as conn:
-        conn.execute(
+        return conn.execute("SELECT MAX(update_id) FROM update_inbox").fetchone()[0]
+
+
+@metrics.timed_db
+def purge_updates(before: float) -> int:
+    with get_conn() as conn:
+        return conn.execute("DELETE FROM update_inbox WHERE done_at < ?", (before,)).rowcount
+
+
+def _reserve_session_ids(conn: sqlite3.Connection):
+    global _last_session_id, _session_id_limit
+    conn.execute("BEGIN IMMEDIATE")
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'work_sessions'").fetchone()
+    _last_session_id = max(_last_session_id, row[0] if row else 0)
+    _session_id_limit = _last_session_id + SESSION_ID_BLOCK
+    if row:
+        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'work_sessions'", (_session_id_limit,))
+    else:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('work_sessions', ?)", (_session_id_limit,))
+
+
+def _allocate_session_id(conn: sqlite3.Connection) -> int:
+    global _last_session_id
+    if _last_session_id >= _session_id_limit:
+        _reserve_session_ids(conn)
+    _last_session_id += 1
+    return _last_session_id
+
+
+def _apply_session_start(conn: sqlite3.Connection, now: datetime, user_id: int, session_id: int,
+                         session_number: int, duration_minutes: int):
+    day_id = _ensure_day(conn, user_id, now)
+    conn.execute(
+        "INSERT INTO work_sessions (id, work_day_id, user_id, session_number, duration_minutes, started_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (session_id, day_id, user_id, session_number, duration_minutes, now.isoformat())
+    )
+
+
+def _apply_session_end(conn: sqlite3.Connection, now: datetime, user_id: int, session_id: int,
+                       duration_minutes: int, day_total_minutes: int = None) -> bool:
+    closed = conn.execute(
+        "UPDATE work_sessions SET finished_at = ? WHERE id = ? AND finished_at IS NULL",
+        (now.isoformat(), session_id)
+    ).rowcount
+    if not closed:
+        return False
+    day_id = _ensure_day(conn, user_id, now)
+    before = _day_row(conn, day_id)
+    conn.execute("""
+        UPDATE work_days
+        SET worked_minutes = worked_minutes + ?,
+            sessions_completed = sessions_completed + 1
+        WHERE id = ?
+    """, (duration_minutes, day_id))
+    if day_total_minutes is not None:
+        _mark_day_complete(conn, day_id, day_total_minutes, now)
+    _apply_rollup_delta(conn, before, _day_row(conn, day_id))
+    return True
+
+
+def _apply_day_complete(conn: sqlite3.Connection, now: datetime, user_id: int, total_minutes: int):
+    day_id = _ensure_day(conn, user_id, now)
+    before = _day_row(conn, day_id)
+    _mark_day_complete(conn, day_id, total_minutes, now)
+    _apply_rollup_delta(conn, before, _day_row(conn, day_id))
+
+
+def _flush_soon():
+    submit_db(flush_session_events)
+
+
+def _record_event(apply, now: datetime, user_id: int, *args):
+    global _events_timer
+    if DURABILITY == "immediate":
+        with transaction(now) as (conn, now):
+            owned = _fence_checker(conn)
+            result = apply(conn, now, user_id, *args) if owned is None or owned(user_id) else None
+        stats_cache.invalidate(user_id)
+        return result
+    with _events_lock:
+        _events.append((apply, now, user_id, args))
+        if len(_events) >= GROUP_COMMIT_EVENTS:
+            _flush_soon()
+        elif _events_timer is None:
+            _events_timer = threading.Timer(GROUP_COMMIT_SECONDS, _flush_soon)
+            _events_timer.daemon = True
+            _events_timer.start()
+    stats_cache.invalidate(user_id)
+    return None
+
+
+def _apply_isolated(conn: sqlite3.Connection, apply, now: datetime, user_id: int, args: tuple):
+    conn.execute("SAVEPOINT session_event")
+    try:
+        apply(conn, now, user_id, *args)
+    except Exception:
+        conn.execute("ROLLBACK TO session_event")
+        log.exception("Dropped %s for user %s", apply.__name__, user_id)
+        metrics.inc("bot_db_events_dropped_total", event=apply.__name__)
+    conn.execute("RELEASE session_event")
+
+
+def flush_session_events() -> int:
+    global _events_timer
+    with _events_flush_lock:
+        with _events_lock:
+            if _events_timer is not None:
+                _events_timer.cancel()
+                _events_timer = None
+            events = _events[:]
+            _events.clear()
+        if not events:
+            return 0
+        try:
+            with transaction() as (conn, _):
+                owned = _fence_checker(conn)
+                for apply, now, user_id, args in events:
+                    if owned is None or owned(user_id):
+                        _apply_isolated(conn, apply, now, user_id, args)
+        except BaseException:
+            with _events_lock:
+                _events[:0] = events
+            raise
+    for user_id in {event[2] for event in events}:
+        stats_cache.invalidate(user_id)
+    metrics.inc("bot_db_event_flushes_total")
+    metrics.inc("bot_db_events_flushed_total", len(events))
+    return len(events)
+
+
+def pending_session_events() -> int:
+    return len(_events)
+
+
+def _read_your_writes():
+    if _events or _events_flush_lock.locked():
+        flush_session_events()
+
+
+@metrics.timed_db
+def record_session_start(user_id: int, session_number: int, duration_minutes: int) -> int:
+    with get_conn() as conn, _events_lock:
+        session_id = _allocate_session_id(conn)
+    _record_event(_apply_session_start, _now(), user_id, session_id, session_number, duration_minutes)
+    return session_id
+
+
+@metrics.timed_db
+def record_session_end(user_id: int, session_id: int, duration_minutes: int, day_total_minutes: int = None,
+                       finished_at: datetime = None):
+    _record_event(
+        _apply_session_end, finished_at or _now(), user_id, session_id, duration_minutes, day_total_minutes
+    )
+
+
+@metrics.timed_db
+def record_day_complete(user_id: int, total_minutes: int):
+    _record_event(_apply_day_complete, _now(), user_id, total_minutes)
+
+
+@metrics.timed_db
+def load_fsm_record(key: str):
+    with get_conn() as conn:
+        return conn.execute("SELECT state, data, updated_at FROM fsm_states WHERE key = ?", (key,)).fetchone()
+
+
+@metrics.timed_db
+def save_fsm_records(rows: list, deleted: list):
+    with transaction() as (conn, now):
+        conn.executemany("""
+            INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+        """, rows)
+        conn.executemany("DELETE FROM fsm_states WHERE key = ?", [(key,) for key in deleted])
+
+
+@metrics.timed_db
+def expire_fsm_records(before: float) -> int:
+    with get_conn() as conn:
+        return conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (before,)).rowcount
+
+
+@metrics.timed_db
+def load_open_sessions() -> list:
+    _read_your_writes()
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return cursor.execute(
+            "SELECT id, user_id, started_at, duration_minutes FROM work_sessions WHERE finished_at IS NULL"
+        ).fetchall()
+
+
+@metrics.timed_db
+def close_orphan_sessions(session_ids: list):
+    _read_your_writes()
+    finished_at = _now().isoformat()
+    with get_conn() as conn:
+        conn.executemany(
             "UPDATE work_sessions SET finished_at = ? WHERE id = ?",
-            (_now().isoformat(), session_id)
+            [(finished_at, session_id) for session_id in session_ids]
+        )
+
+
+@metrics.timed_db
+def import_history_batch(days: list, new_days: list, sessions: list) -> int:
+    _read_your_writes()
+    with transaction() as (conn, now):
+        conn.executemany("""
+            INSERT INTO work_days
+                (user_id, date, planned_minutes, worked_minutes, sessions_completed, started_at, finished_at, completed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, date) DO UPDATE SET
+                planned_minutes = excluded.planned_minutes,
+                worked_minutes = excluded.worked_minutes,
+                sessions_completed = excluded.sessions_completed,
+                started_at = COALESCE(excluded.started_at, started_at),
+                finished_at = COALESCE(excluded.finished_at, finished_at),
+                completed = excluded.completed
+        """, days)
+        conn.executemany(
+            "INSERT INTO work_days (user_id, date, planned_minutes) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id, date) DO NOTHING",
+            new_days
+        )
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS import_days (user_id INTEGER, date TEXT, PRIMARY KEY (user_id, date))")
+        conn.execute("DELETE FROM import_days")
+        conn.executemany(
+            "INSERT OR IGNORE INTO import_days (user_id, date) VALUES (?, ?)",
+            [row[:2] for row in days] + [row[:2] for row in new_days]
+        )
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        day_ids = {
+            (user_id, day): day_id for user_id, day, day_id in cursor.execute(
+                "SELECT d.user_id, d.date, d.id FROM import_days i CROSS JOIN work_days d ON d.user_id = i.user_id AND d.date = i.date"
+            )
+        }
+        existing = set(cursor.execute("""
+            SELECT s.work_day_id, s.session_number FROM import_days i
+            CROSS JOIN work_days d ON d.user_id = i.user_id AND d.date = i.date
+            CROSS JOIN work_sessions s ON s.work_day_id = d.id
+        """))
+        rows = []
+        for user_id, day, number, duration, started, finished in sessions:
+            key = (day_ids[user_id, day], number)
+            if key not in existing:
+                existing.add(key)
+                rows.append((*key, user_id, duration, started, finished))
+        conn.executemany(
+            "INSERT INTO work_sessions (work_day_id, session_number, user_id, duration_minutes, started_at, finished_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows
         )
         conn.execute("""
-            UPDATE work_days
-            SET worked_minutes = worked_minutes + ?,
-                sessions_completed = sessions_completed + 1
-            WHERE date = ?
-        """, (duration_minutes, today))
-
-        
-def record_day_complete(total_minutes: int):
-    today = _today()
+            UPDATE work_days SET
+                worked_minutes = totals.worked,
+                sessions_completed = totals.sessions,
+                started_at = COALESCE(work_days.started_at, totals.first_started),
+                completed = work_days.completed OR (planned_minutes > 0 AND totals.worked >= planned_minutes)
+            FROM (
+                SELECT s.work_day_id, SUM(s.duration_minutes) AS worked, COUNT(*) AS sessions,
+                       MIN(s.started_at) AS first_started
+                FROM import_days i
+                CROSS JOIN work_days d ON d.user_id = i.user_id AND d.date = i.date
+                CROSS JOIN work_sessions s ON s.work_day_id = d.id
+                WHERE s.finished_at IS NOT NULL
+                GROUP BY s.work_day_id
+            ) AS totals
+            WHERE work_days.id = totals.work_day_id
+        """)
+        users = {row[0] for row in days} | {row[0] for row in new_days}
+        for user_id in users:
+            _rebuild_rollups(conn, user_id)
+    for user_id in users:
+        stats_cache.invalidate(user_id)
+    return len(rows)
+
+
+@metrics.timed_db
+def load_history_batch(user_id: int, start: date, end: date, after: str = "", limit: int = EXPORT_BATCH_DAYS) -> list:
+    _read_your_writes()
     with get_conn() as conn:
-        conn.execute("""
-            UPDATE work_days
-            SET completed = 1, finished_at = ?, worked_minutes = ?
-            WHERE date = ?
-        """, (_now().isoformat(), total_minutes, today))
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return cursor.execute("""
+            SELECT d.id, d.date, d.planned_minutes, d.worked_minutes, d.sessions_completed, d.started_at,
+                   d.finished_at, d.completed, s.session_number, s.duration_minutes, s.started_at, s.finished_at
+            FROM work_days d LEFT JOIN work_sessions s ON s.work_day_id = d.id
+            WHERE d.id IN (
+                SELECT id FROM work_days WHERE user_id = ? AND date BETWEEN ? AND ? AND date > ?
+                ORDER BY date LIMIT ?
+            )
+            ORDER BY d.date, s.session_number
+        """, (user_id, start.isoformat(), end.isoformat(), after, limit)).fetchall()
+
+
+def iter_history(user_id: int, start: date, end: date):
+    after = ""
+    while True:
+        rows = call_db(load_history_batch, user_id, start, end, after)
+        if not rows:
+            break
+        yield from rows
+        after = rows[-1][1]
+
 
-        
-def get_stats_today() -> dict:
+@metrics.timed_db
+def load_insight_rows(user_id: int) -> tuple:
+    _read_your_writes()
+    with get_conn() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        sessions = cursor.execute("""
+            SELECT CAST(julianday(substr(started_at, 1, 10)) AS INTEGER), CAST(substr(started_at, 12, 2) AS INTEGER),
+                   duration_minutes
+            FROM work_sessions
+            WHERE user_id = ? AND finished_at IS NOT NULL
+        """, (user_id,)).fetchall()
+        days = cursor.execute("""
+            SELECT CAST(julianday(date) AS INTEGER), planned_minutes, worked_minutes
+            FROM work_days
+            WHERE user_id = ?
+        """, (user_id,)).fetchall()
+    return sessions, days
+
+
+@metrics.timed_db
+def get_stats_today(user_id: int) -> dict:
+    _read_your_writes()
     today = _today()
     with get_conn() as conn:
-        row = conn.execute("SELECT * FROM work_days WHERE date = ?", (today,)).fetchone()
+        row = conn.execute("SELECT * FROM work_days WHERE user_id = ? AND date = ?", (user_id, today)).fetchone()
         if not row:
             return {"exists": False}
         sessions = conn.execute(
@@ -131,74 +1169,147 @@ def get_stats_today() -> dict:
         }
 
 
-def get_stats_week() -> dict:
+@metrics.timed_db
+def get_stats_week(user_id: int) -> dict:
+    _read_your_writes()
     from config import TIMEZONE
     today = datetime.now(TIMEZONE).date()
-    monday = today - timedelta(days=today.weekday())
-    days = [(monday + timedelta(days=i)).isoformat() for i in range(7)]
-    return _get_stats_for_dates(days, "неделя")
+    monday = _week_start(today)
+    with get_conn() as conn:
+        totals = _bucket_totals(conn, user_id, "stats_weekly", "week_start", monday.isoformat(), monday.isoformat())
+    return _period_stats(monday, monday + timedelta(days=6), totals, "неделя")
 
 
-def get_stats_month() -> dict:
+@metrics.timed_db
+def get_stats_month(user_id: int) -> dict:
+    _read_your_writes()
     from config import TIMEZONE
     today = datetime.now(TIMEZONE).date()
-    days = []
-    d = today.replace(day=1)
-    while d.month == today.month:
-        days.append(d.isoformat())
-        d += timedelta(days=1)
-    return _get_stats_for_dates(days, "месяц")
+    first = today.replace(day=1)
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    with get_conn() as conn:
+        totals = _bucket_totals(conn, user_id, "stats_monthly", "month", first.isoformat()[:7], first.isoformat()[:7])
+    return _period_stats(first, last, totals, "месяц")
 
 
-def get_stats_custom(days_back: int) -> dict:
+@metrics.timed_db
+def get_stats_custom(user_id: int, days_back: int) -> dict:
+    _read_your_writes()
     from config import TIMEZONE
     today = datetime.now(TIMEZONE).date()
-    days = [(today - timedelta(days=i)).isoformat() for i in range(days_back - 1, -1, -1)]
-    return _get_stats_for_dates(days, f"последние {days_back} дней")
+    start = today - timedelta(days=days_back - 1)
+    with get_conn() as conn:
+        totals = _range_totals(conn, user_id, start, today)
+    return _period_stats(start, today, totals, f"последние {days_back} дней")
 
 
-def _get_stats_for_dates(dates: list, period_name: str) -> dict:
-    placeholders = ",".join("?" * len(dates))
+@metrics.timed_db
+def get_stats_range(user_id: int, start: date, end: date) -> dict:
+    _read_your_writes()
     with get_conn() as conn:
-        rows = conn.execute(
-            f"SELECT * FROM work_days WHERE date IN ({placeholders}) ORDER BY date",
-            dates
-        ).fetchall()
-    
-    rows = [dict(r) for r in rows]
-    total_worked = sum(r["worked_minutes"] for r in rows)
-    total_planned = sum(r["planned_minutes"] for r in rows)
-    days_worked = len([r for r in rows if r["worked_minutes"] > 0])
-    days_completed = len([r for r in rows if r["completed"]])
-    total_sessions = sum(r["sessions_completed"] for r in rows)
-    avg_per_day = total_worked / days_worked if days_worked > 0 else 0
+        totals = _range_totals(conn, user_id, start, end)
+    return _period_stats(start, end, totals, f"период {start:%d.%m.%Y} — {end:%d.%m.%Y}")
 
+
+@metrics.timed_db
+def get_days_page(user_id: int, start: date, end: date, after: str = None, before: str = None,
+                  limit: int = 31) -> dict:
+    _read_your_writes()
+    query = "SELECT * FROM work_days WHERE user_id = ? AND date BETWEEN ? AND ? AND worked_minutes > 0"
+    params = [user_id, start.isoformat(), end.isoformat()]
+    if before:
+        query += " AND date < ? ORDER BY date DESC LIMIT ?"
+        params += [before, limit + 1]
+    elif after:
+        query += " AND date > ? ORDER BY date LIMIT ?"
+        params += [after, limit + 1]
+    else:
+        query += " ORDER BY date LIMIT ?"
+        params.append(limit + 1)
+    with get_conn() as conn:
+        rows = [dict(r) for r in conn.execute(query, params)]
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        rows.reverse()
+    return {
+        "days": rows,
+        "has_prev": more if before else after is not None,
+        "has_next": True if before else more,
+    }
+
+
+def _bucket_totals(conn: sqlite3.Connection, user_id: int, table: str, key: str, first: str, last: str) -> dict:
+    sums = ", ".join(f"COALESCE(SUM({c}), 0) AS {c}" for c in ROLLUP_COLUMNS)
+    return dict(conn.execute(
+        f"SELECT {sums} FROM {table} WHERE user_id = ? AND {key} BETWEEN ? AND ?", (user_id, first, last)
+    ).fetchone())
+
+
+def _raw_totals(conn: sqlite3.Connection, user_id: int, first: date, last: date) -> dict:
+    if first > last:
+        return dict.fromkeys(ROLLUP_COLUMNS, 0)
+    return dict(conn.execute(
+        f"SELECT {_ROLLUP_SELECT} FROM work_days WHERE user_id = ? AND date BETWEEN ? AND ?",
+        (user_id, first.isoformat(), last.isoformat())
+    ).fetchone())
+
+
+def _range_totals(conn: sqlite3.Connection, user_id: int, start: date, end: date) -> dict:
+    first_monday = start.toordinal() + (7 - start.weekday()) % 7
+    last_monday = end.toordinal() - (end.weekday() + 1) % 7 - 6
+    if first_monday > last_monday:
+        return _raw_totals(conn, user_id, start, end)
+    parts = [_bucket_totals(
+        conn, user_id, "stats_weekly", "week_start",
+        date.fromordinal(first_monday).isoformat(), date.fromordinal(last_monday).isoformat(),
+    )]
+    if first_monday > start.toordinal():
+        parts.append(_raw_totals(conn, user_id, start, date.fromordinal(first_monday - 1)))
+    if last_monday + 7 <= end.toordinal():
+        parts.append(_raw_totals(conn, user_id, date.fromordinal(last_monday + 7), end))
+    return {c: sum(p[c] for p in parts) for c in ROLLUP_COLUMNS}
+
+
+def _period_stats(start: date, end: date, totals: dict, period_name: str) -> dict:
+    days_worked = totals["days_worked"]
+    avg_per_day = totals["worked_minutes"] / days_worked if days_worked > 0 else 0
     return {
         "period": period_name,
-        "total_worked_minutes": total_worked,
-        "total_planned_minutes": total_planned,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "total_worked_minutes": totals["worked_minutes"],
+        "total_planned_minutes": totals["planned_minutes"],
         "days_worked": days_worked,
-        "days_completed": days_completed,
-        "total_sessions": total_sessions,
+        "days_completed": totals["days_completed"],
+        "total_sessions": totals["sessions"],
         "avg_per_day_minutes": round(avg_per_day),
-        "days": rows,
-        "total_days": len(dates)
+        "total_days": (end - start).days + 1
     }
 
 
-def get_all_time_stats() -> dict:
+@metrics.timed_db
+def get_all_time_stats(user_id: int) -> dict:
+    _read_your_writes()
     with get_conn() as conn:
         row = conn.execute("""
             SELECT
-                COUNT(*) as total_days,
-                SUM(worked_minutes) as total_minutes,
-                SUM(sessions_completed) as total_sessions,
-                SUM(CASE WHEN completed = 1 THEN 1 ELSE 0 END) as completed_days,
-                MIN(date) as first_day,
-                MAX(date) as last_day
-            FROM work_days WHERE worked_minutes > 0
-        """).fetchone()
-    return dict(row) if row else {}
-
-
-    
+                a.days_worked as total_days,
+                a.worked_minutes as total_minutes,
+                a.sessions as total_sessions,
+                a.days_completed as completed_days,
+                b.first_day as first_day,
+                b.last_day as last_day,
+                r.current_streak, r.streak_end, r.longest_streak, r.longest_streak_end,
+                r.best_day, r.best_day_minutes, r.best_week, r.best_week_minutes
+            FROM stats_alltime a
+            LEFT JOIN stats_alltime_bounds b ON b.user_id = a.user_id
+            LEFT JOIN stats_records r ON r.user_id = a.user_id
+            WHERE a.user_id = ?
+        """, (user_id,)).fetchone()
+    if not row:
+        return {}
+    stats = dict(row)
+    if not stats["streak_end"] or stats["streak_end"] < _yesterday():
+        stats["current_streak"] = 0
+    return stats
@@ -0,0 +1,61 @@
+import asyncio
+from collections import OrderedDict
+
+import metrics
+from config import CALLBACK_DEDUP_SIZE
+
+
+class CallbackDedup:
+    def __init__(self, max_entries: int = CALLBACK_DEDUP_SIZE):
+        self.max_entries = max_entries
+        self._seen: OrderedDict = OrderedDict()
+        self._in_flight = set()
+        self._locks = {}
+        self.duplicates = 0
+
+    def _remember(self, query_id: str) -> bool:
+        if query_id in self._seen:
+            self._seen.move_to_end(query_id)
+            return False
+        self._seen[query_id] = None
+        if len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+        return True
+
+    def _lock(self, user_id: int) -> list:
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry
+
+    def _release(self, user_id: int, entry: list):
+        entry[1] -= 1
+        if not entry[1]:
+            del self._locks[user_id]
+
+    async def __call__(self, handler, event, data):
+        if not self._remember(event.id):
+            self.duplicates += 1
+            metrics.inc("bot_callbacks_deduplicated_total", reason="replay")
+            return None
+        key = (event.from_user.id, event.data)
+        if key in self._in_flight:
+            self.duplicates += 1
+            metrics.inc("bot_callbacks_deduplicated_total", reason="in_flight")
+            await event.answer()
+            return None
+        self._in_flight.add(key)
+        entry = self._lock(key[0])
+        try:
+            async with entry[0]:
+                return await handler(event, data)
+        finally:
+            self._in_flight.discard(key)
+            self._release(key[0], entry)
+
+    def pending(self) -> int:
+        return len(self._in_flight)
+
+
+callback_dedup = CallbackDedup()
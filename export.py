@@ -0,0 +1,53 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+from datetime import date
+
+from database import iter_history
+
+FORMATS = ("csv", "jsonl")
+CSV_COLUMNS = (
+    "record", "date", "session_number", "duration_minutes", "planned_minutes", "worked_minutes",
+    "sessions_completed", "completed", "started_at", "finished_at",
+)
+
+
+def export_records(user_id: int, start: date, end: date):
+    last_day = None
+    for (day_id, day, planned, worked, sessions, day_started, day_finished, completed,
+         number, duration, started, finished) in iter_history(user_id, start, end):
+        if day_id != last_day:
+            last_day = day_id
+            yield {
+                "record": "day", "date": day, "planned_minutes": planned, "worked_minutes": worked,
+                "sessions_completed": sessions, "completed": bool(completed),
+                "started_at": day_started, "finished_at": day_finished,
+            }
+        if number is not None:
+            yield {
+                "record": "session", "date": day, "session_number": number, "duration_minutes": duration,
+                "started_at": started, "finished_at": finished,
+            }
+
+
+def write_export(user_id: int, start: date, end: date, fmt: str = "csv") -> tuple:
+    fd, path = tempfile.mkstemp(prefix="export-", suffix=f".{fmt}.gz")
+    os.close(fd)
+    counts = {"day": 0, "session": 0}
+    try:
+        with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+            if fmt == "csv":
+                writer = csv.DictWriter(f, CSV_COLUMNS)
+                writer.writeheader()
+                write = writer.writerow
+            else:
+                write = lambda record: f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            for record in export_records(user_id, start, end):
+                write(record)
+                counts[record["record"]] += 1
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, counts
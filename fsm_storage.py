@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+import database
+import metrics
+from config import FSM_CACHE_SIZE, FSM_TTL_SECONDS, FSM_FLUSH_MS
+
+log = logging.getLogger(__name__)
+
+SWEEP_SECONDS = 300
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(self, cache_size: int = FSM_CACHE_SIZE, ttl: float = FSM_TTL_SECONDS,
+                 flush_delay: float = FSM_FLUSH_MS / 1000):
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.flush_delay = flush_delay
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._cache: OrderedDict = OrderedDict()
+        self._pending: dict = {}
+        self._flush_task: asyncio.Task = None
+        self._flush_lock = asyncio.Lock()
+        self._swept = time.time()
+
+    async def _record(self, key: StorageKey) -> tuple:
+        name = self.key_builder.build(key)
+        record = self._cache.get(name) or self._pending.get(name)
+        if record is not None:
+            metrics.inc("bot_fsm_cache_hits_total")
+        else:
+            metrics.inc("bot_fsm_cache_misses_total")
+            row = await database.run_db(database.load_fsm_record, name)
+            record = self._cache.get(name) or self._pending.get(name)
+            if record is None:
+                record = [row[0], json.loads(row[1]), row[2]] if row else [None, {}, 0.0]
+        self._cache[name] = record
+        self._cache.move_to_end(name)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        if record[2] and time.time() - record[2] > self.ttl:
+            record[0], record[1] = None, {}
+        return name, record
+
+    def _touch(self, name: str, record: list):
+        record[2] = time.time()
+        self._pending[name] = record
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_delay)
+        try:
+            await self.flush()
+        except Exception:
+            log.exception("FSM flush failed")
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            return await self._flush()
+
+    async def _flush(self) -> int:
+        pending, self._pending = self._pending, {}
+        rows = [
+            (name, state, json.dumps(data, ensure_ascii=False), touched)
+            for name, (state, data, touched) in pending.items() if state is not None or data
+        ]
+        deleted = [name for name, (state, data, _) in pending.items() if state is None and not data]
+        try:
+            if pending:
+                await database.run_db(database.save_fsm_records, rows, deleted)
+        except BaseException:
+            for name, record in pending.items():
+                self._pending.setdefault(name, record)
+            raise
+        metrics.inc("bot_fsm_flushed_total", len(pending))
+        if time.time() - self._swept > SWEEP_SECONDS:
+            await self.sweep()
+        return len(pending)
+
+    async def sweep(self) -> int:
+        self._swept = now = time.time()
+        for name in [name for name, record in self._cache.items() if now - record[2] > self.ttl]:
+            if name not in self._pending:
+                del self._cache[name]
+        expired = await database.run_db(database.expire_fsm_records, now - self.ttl)
+        metrics.inc("bot_fsm_expired_total", expired)
+        return expired
+
+    def evict(self, user_ids: list) -> int:
+        users = {str(user_id) for user_id in user_ids}
+        names = [name for name in self._cache if name.rsplit(":", 2)[-2] in users and name not in self._pending]
+        for name in names:
+            del self._cache[name]
+        return len(names)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        name, record = await self._record(key)
+        record[0] = state.state if isinstance(state, State) else state
+        self._touch(name, record)
+
+    async def get_state(self, key: StorageKey):
+        _, record = await self._record(key)
+        return record[0]
+
+    async def set_data(self, key: StorageKey, data: dict) -> None:
+        name, record = await self._record(key)
+        record[1] = data.copy()
+        self._touch(name, record)
+
+    async def get_data(self, key: StorageKey) -> dict:
+        _, record = await self._record(key)
+        return record[1].copy()
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._flush_task = None
+        await self.flush()
+
+    def __len__(self) -> int:
+        return len(self._cache)
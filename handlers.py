@@ -1,16 +1,26 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from config import ADMIN_ID
-from storage import load_data, set_setting, get_session, update_session, reset_session
-from scheduler import start_work_session, reschedule_daily
-from database import get_stats_today, get_stats_week, get_stats_month, get_stats_custom, get_all_time_stats
+from config import ADMIN_ID, ALLOWED_USER_IDS, OPEN_REGISTRATION
+import metrics
+import stats_cache
+from export import FORMATS as EXPORT_FORMATS, write_export
+from importer import ImportFormatError, detect_format, import_file
+from insights import compute_insights
+from storage import get_user, is_registered, register_user, set_setting, update_session, reset_session
+from scheduler import start_work_session, cancel_work_session, reschedule_daily, show_countdown
+from database import (
+    run_db, get_stats_today, get_stats_week, get_stats_month, get_stats_custom, get_stats_range,
+    get_days_page, get_all_time_stats,
+)
 
 router = Router()
 
+DAYS_PAGE_SIZE = 31
+
 def admin_only(func):
     from functools import wraps
     @wraps(func)
@@ -20,47 +30,124 @@ def admin_only(func):
         return await func(message, *args, **kwargs)
     return wrapper
 
+def user_only(func):
+    from functools import wraps
+    @wraps(func)
+    async def wrapper(message: Message, *args, **kwargs):
+        if not is_registered(message.from_user.id):
+            return
+        return await func(message, *args, **kwargs)
+    return wrapper
+
+def can_register(user_id: int) -> bool:
+    return OPEN_REGISTRATION or user_id in ALLOWED_USER_IDS or user_id == ADMIN_ID
+
 class AdminStates(StatesGroup):
     waiting_start_time = State()
     waiting_work_duration = State()
     waiting_session_duration = State()
     waiting_break_duration = State()
 
-def admin_panel_kb():
-    data = load_data()
-    return InlineKeyboardMarkup(inline_keyboard=[
+ADMIN_ACTION_ROWS = [
+    [InlineKeyboardButton(text="🚀 Запустить сессию сейчас", callback_data="force_start")],
+    [InlineKeyboardButton(text="❌ Сбросить сессию", callback_data="reset_session")],
+]
+
+STATS_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [
+        InlineKeyboardButton(text="📅 Сегодня", callback_data="stats_today"),
+        InlineKeyboardButton(text="📆 Неделя", callback_data="stats_week"),
+    ],
+    [
+        InlineKeyboardButton(text="🗓 Месяц", callback_data="stats_month"),
+        InlineKeyboardButton(text="📊 30 дней", callback_data="stats_30"),
+    ],
+    [
+        InlineKeyboardButton(text="🌍 Всё время", callback_data="stats_alltime"),
+        InlineKeyboardButton(text="🔬 Аналитика", callback_data="stats_insights"),
+    ],
+])
+
+_admin_panels: dict = {}
+
+def admin_panel_kb(user_id: int):
+    user = get_user(user_id)
+    cached = _admin_panels.get(user_id)
+    if cached is not None and cached[0] is user and cached[1] == user.version:
+        return cached[2]
+    kb = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
-            text=f"⏰ Время старта: {data['work_start_time']}",
+            text=f"⏰ Время старта: {user.work_start_time}",
             callback_data="set_start_time"
         )],
         [InlineKeyboardButton(
-            text=f"⏱ Общее время работы: {data['work_duration_minutes']} мин",
+            text=f"⏱ Общее время работы: {user.work_duration_minutes} мин",
             callback_data="set_work_duration"
         )],
         [InlineKeyboardButton(
-            text=f"💼 Длина сессии: {data['session_minutes']} мин",
+            text=f"💼 Длина сессии: {user.session_minutes} мин",
             callback_data="set_session_duration"
         )],
         [InlineKeyboardButton(
-            text=f"☕ Длина перерыва: {data['break_minutes']} мин",
+            text=f"☕ Длина перерыва: {user.break_minutes} мин",
             callback_data="set_break_duration"
         )],
-        [InlineKeyboardButton(text="🚀 Запустить сессию сейчас", callback_data="force_start")],
-        [InlineKeyboardButton(text="❌ Сбросить сессию", callback_data="reset_session")],
+        *ADMIN_ACTION_ROWS,
     ])
+    _admin_panels[user_id] = (user, user.version, kb)
+    return kb
 
-def stats_kb():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text="📅 Сегодня", callback_data="stats_today"),
-            InlineKeyboardButton(text="📆 Неделя", callback_data="stats_week"),
-        ],
-        [
-            InlineKeyboardButton(text="🗓 Месяц", callback_data="stats_month"),
-            InlineKeyboardButton(text="📊 30 дней", callback_data="stats_30"),
-        ],
-        [InlineKeyboardButton(text="🌍 Всё время", callback_data="stats_alltime")],
-    ])
+def parse_date(text: str):
+    from datetime import datetime
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def shift_period(start, end, direction: int):
+    from datetime import date, timedelta
+    if start.day == 1 and (end == date.max or (end + timedelta(days=1)).day == 1):
+        months = (end.year - start.year) * 12 + end.month - start.month + 1
+        index = start.year * 12 + start.month - 1 + direction * months
+        limit = (date.max.year + 1) * 12
+        if index < 12 or index + months > limit:
+            return None
+        new_start = start.replace(year=index // 12, month=index % 12 + 1)
+        index += months
+        if index == limit:
+            return new_start, date.max
+        new_end = new_start.replace(year=index // 12, month=index % 12 + 1) - timedelta(days=1)
+        return new_start, new_end
+    length = (end - start).days + 1
+    first, last = start.toordinal() + direction * length, end.toordinal() + direction * length
+    if first < 1 or last > date.max.toordinal():
+        return None
+    return date.fromordinal(first), date.fromordinal(last)
+
+def period_kb(s: dict):
+    from datetime import date
+    start, end = date.fromisoformat(s["start"]), date.fromisoformat(s["end"])
+    arrows = []
+    for text, direction in (("◀️", -1), ("▶️", 1)):
+        shifted = shift_period(start, end, direction)
+        if shifted:
+            arrows.append(InlineKeyboardButton(text=text, callback_data=f"range:{shifted[0]}:{shifted[1]}"))
+    nav = [arrows] if arrows else []
+    if s["days_worked"]:
+        nav.append([InlineKeyboardButton(text="📋 По дням", callback_data=f"days:{start}:{end}:")])
+    return InlineKeyboardMarkup(inline_keyboard=nav + STATS_KB.inline_keyboard)
+
+def days_page_kb(start, end, page: dict):
+    nav = []
+    if page["has_prev"] and page["days"]:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"days:{start}:{end}:b{page['days'][0]['date']}"))
+    if page["has_next"] and page["days"]:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"days:{start}:{end}:a{page['days'][-1]['date']}"))
+    rows = [nav] if nav else []
+    rows.append([InlineKeyboardButton(text="↩️ Назад", callback_data=f"range:{start}:{end}")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
 
 def fmt_minutes(minutes: int) -> str:
     if not minutes:
@@ -71,6 +158,10 @@ def fmt_minutes(minutes: int) -> str:
     m = minutes % 60
     return f"{h}ч {m}мин" if m > 0 else f"{h}ч"
 
+def fmt_date(value: str) -> str:
+    from datetime import date
+    return date.fromisoformat(value).strftime("%d.%m.%Y")
+
 def progress_bar(current: int, total: int, length: int = 10) -> str:
     if not total:
         return "░" * length
@@ -115,14 +206,17 @@ def format_period_stats(s: dict) -> str:
         f"Дней по плану ✅: {s['days_completed']}",
         f"Всего сессий: {s['total_sessions']}",
         f"Среднее в день: {fmt_minutes(s['avg_per_day_minutes'])}",
-        "",
-        "<b>По дням:</b>",
     ]
+    return "\n".join(lines)
+
+def format_days_page(start, end, page: dict) -> str:
+    if not page["days"]:
+        return "📋 За этот период нет рабочих дней."
+    day_format = "%d.%m" if start.year == end.year else "%d.%m.%Y"
+    lines = [f"📋 <b>По дням: {start.strftime(day_format)} — {end.strftime(day_format)}</b>", ""]
     from datetime import datetime
-    for day in s["days"]:
-        if day["worked_minutes"] == 0:
-            continue
-        d = datetime.fromisoformat(day["date"]).strftime("%d.%m")
+    for day in page["days"]:
+        d = datetime.fromisoformat(day["date"]).strftime(day_format)
         check = "✅" if day["completed"] else "🔄"
         bar = progress_bar(day["worked_minutes"], day["planned_minutes"], 6)
         lines.append(f"{check} {d}: {bar} {fmt_minutes(day['worked_minutes'])}")
@@ -145,133 +239,327 @@ def format_alltime_stats(s: dict) -> str:
     if s["total_days"] and s["total_minutes"]:
         avg = round(s["total_minutes"] / s["total_days"])
         lines.append(f"Среднее в день: {fmt_minutes(avg)}")
+    lines += ["", "🏆 <b>Рекорды</b>", f"🔥 Текущая серия: {s['current_streak'] or 0} дн."]
+    if s["longest_streak"]:
+        lines.append(f"Самая длинная серия: {s['longest_streak']} дн. (по {fmt_date(s['longest_streak_end'])})")
+    if s["best_day"]:
+        lines.append(f"Лучший день: {fmt_date(s['best_day'])} — {fmt_minutes(s['best_day_minutes'])}")
+    if s["best_week"]:
+        lines.append(f"Лучшая неделя: с {fmt_date(s['best_week'])} — {fmt_minutes(s['best_week_minutes'])}")
+    return "\n".join(lines)
+
+WEEKDAYS = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
+SPARKS = "▁▂▃▄▅▆▇█"
+
+def sparkline(values: list) -> str:
+    top = max(values) or 1
+    return "".join(SPARKS[round(v / top * (len(SPARKS) - 1))] for v in values)
+
+def format_insights(s: dict) -> str:
+    if not s or not s["sessions"]:
+        return "🔬 Для аналитики пока мало данных."
+    hours = s["hour_sessions"]
+    peak = sorted(range(24), key=hours.__getitem__, reverse=True)[:3]
+    lines = [
+        "🔬 <b>Аналитика за всё время</b>",
+        "",
+        f"Сессий: {s['sessions']}, дней с работой: {s['days']}",
+        "",
+        "<b>Начало сессий по часам</b>",
+        f"<code>{sparkline(hours)}</code>",
+        "<code>0     6     12    18   </code>",
+        "Чаще всего: " + ", ".join(f"{h:02d}:00" for h in peak if hours[h]),
+        "",
+        "<b>По дням недели</b> (в среднем за рабочий день):",
+    ]
+    for name, minutes, days in zip(WEEKDAYS, s["weekday_minutes"], s["weekday_days"]):
+        lines.append(f"{name}: {fmt_minutes(round(minutes / days)) if days else '—'}")
+    lines += ["", "<b>Скользящее среднее в день</b>:"]
+    for window, r in s["rolling"].items():
+        lines.append(f"{window} дн.: {fmt_minutes(round(r['current']))} (лучшее: {fmt_minutes(round(r['best']))})")
+    if s["adherence"]:
+        lines += [
+            "",
+            f"<b>Выполнение плана</b>: по плану {s['adherence_met']:.0%} дней",
+            " · ".join(f"p{p}: {v:.0%}" for p, v in s["adherence"].items()),
+        ]
+    lines += ["", "<b>Длительность сессий</b>:"]
+    edges = [edge for edge, _ in s["durations"]]
+    for i, (edge, count) in enumerate(s["durations"]):
+        if count:
+            label = f"{edge}–{edges[i + 1] - 1} мин" if i + 1 < len(edges) else f"≥{edge} мин"
+            lines.append(f"{label}: {count}")
     return "\n".join(lines)
 
 
 @router.message(Command("start"))
-@admin_only
 async def cmd_start(message: Message):
+    user_id = message.from_user.id
+    if not can_register(user_id):
+        return
+    if not is_registered(user_id):
+        register_user(user_id)
+        reschedule_daily(user_id)
     await message.answer(
         "👋 Привет! Я твой рабочий бот-трекер.\n\n"
         "/admin — настройки\n"
         "/status — текущий статус\n"
-        "/stats — статистика"
+        "/stats — статистика\n"
+        "/insights — аналитика за всё время\n"
+        "/export — выгрузка истории"
     )
 
 @router.message(Command("admin"))
-@admin_only
+@user_only
 async def cmd_admin(message: Message):
-    await message.answer("⚙️ Панель управления:", reply_markup=admin_panel_kb())
+    await message.answer("⚙️ Панель управления:", reply_markup=admin_panel_kb(message.from_user.id))
 
 @router.message(Command("status"))
-@admin_only
+@user_only
 async def cmd_status(message: Message):
-    session = get_session()
-    data = load_data()
+    user = get_user(message.from_user.id)
     state_map = {
         "idle": "😴 Ожидание",
         "working": "💼 Работаем",
         "break": "☕ Перерыв",
         "ready_check": "🔔 Ожидание подтверждения"
     }
-    state_label = state_map.get(session.get("state", "idle"), "Неизвестно")
+    state_label = state_map.get(user.state, "Неизвестно")
     await message.answer(
         f"📊 Статус:\n"
         f"• Состояние: {state_label}\n"
-        f"• Отработано: {fmt_minutes(session.get('completed_minutes', 0))} / {fmt_minutes(data['work_duration_minutes'])}\n"
-        f"• Время старта: {data['work_start_time']}"
+        f"• Отработано: {fmt_minutes(user.completed_minutes)} / {fmt_minutes(user.work_duration_minutes)}\n"
+        f"• Время старта: {user.work_start_time}"
     )
 
 @router.message(Command("stats"))
+@user_only
+async def cmd_stats(message: Message, command: CommandObject):
+    args = (command.args or "").split()
+    if not args:
+        await message.answer("📊 Выбери период:", reply_markup=STATS_KB)
+        return
+    start, end = (parse_date(a) for a in args[:2]) if len(args) == 2 else (None, None)
+    if not start or not end or start > end:
+        await message.answer("Формат: /stats ГГГГ-ММ-ДД ГГГГ-ММ-ДД (или ДД.ММ.ГГГГ)")
+        return
+    s = await run_db(get_stats_range, message.from_user.id, start, end)
+    await message.answer(format_period_stats(s), parse_mode="HTML", reply_markup=period_kb(s))
+
+@router.message(Command("insights"))
+@user_only
+async def cmd_insights(message: Message):
+    user_id = message.from_user.id
+    text, kb = await stats_cache.get_or_render(user_id, "insights", lambda: render_insights(user_id))
+    await message.answer(text, parse_mode="HTML", reply_markup=kb)
+
+@router.message(Command("export"))
+@user_only
+async def cmd_export(message: Message, command: CommandObject):
+    import asyncio
+    import os
+    args = (command.args or "").split()
+    fmt = args.pop().lower() if args and args[-1].lower() in EXPORT_FORMATS else "csv"
+    start, end = (parse_date(a) for a in args) if len(args) == 2 else (None, None)
+    if not start or not end or start > end:
+        await message.answer("Формат: /export ГГГГ-ММ-ДД ГГГГ-ММ-ДД [csv|jsonl]")
+        return
+    path, counts = await asyncio.to_thread(write_export, message.from_user.id, start, end, fmt)
+    try:
+        if not counts["day"]:
+            await message.answer("📦 За этот период нет данных.")
+            return
+        await message.answer_document(
+            FSInputFile(path, filename=f"worklog_{start}_{end}.{fmt}.gz"),
+            caption=f"📦 Экспорт {start:%d.%m.%Y} — {end:%d.%m.%Y}: {counts['day']} дн., {counts['session']} сессий"
+        )
+    finally:
+        os.remove(path)
+
+@router.message(Command("import"), F.document)
 @admin_only
-async def cmd_stats(message: Message):
-    await message.answer("📊 Выбери период:", reply_markup=stats_kb())
+async def cmd_import(message: Message, command: CommandObject):
+    import asyncio
+    import os
+    import tempfile
+    args = (command.args or "").split()
+    user_id = int(args[0]) if args and args[0].isdigit() else message.from_user.id
+    name = message.document.file_name or "import.csv"
+    fd, path = tempfile.mkstemp(prefix="import-", suffix=".gz" if name.endswith(".gz") else "")
+    os.close(fd)
+    try:
+        await message.bot.download(message.document, destination=path)
+        counts = await asyncio.to_thread(import_file, path, detect_format(name), user_id)
+    except ImportFormatError as e:
+        await message.answer(f"❌ Импорт остановлен, {e}. Предыдущие пакеты сохранены.")
+        return
+    finally:
+        os.remove(path)
+    await message.answer(
+        f"📥 Импорт завершён: {counts['days']} дн., {counts['sessions']} сессий "
+        f"(новых {counts['inserted']}), пакетов: {counts['batches']}"
+    )
+
+async def render_today(user_id: int):
+    s = await run_db(get_stats_today, user_id)
+    return format_today_stats(s), STATS_KB
+
+async def render_week(user_id: int):
+    s = await run_db(get_stats_week, user_id)
+    return format_period_stats(s), period_kb(s)
+
+async def render_month(user_id: int):
+    s = await run_db(get_stats_month, user_id)
+    return format_period_stats(s), period_kb(s)
+
+async def render_last_30(user_id: int):
+    s = await run_db(get_stats_custom, user_id, 30)
+    return format_period_stats(s), period_kb(s)
+
+async def render_alltime(user_id: int):
+    s = await run_db(get_all_time_stats, user_id)
+    return format_alltime_stats(s), STATS_KB
+
+async def render_insights(user_id: int):
+    s = await run_db(compute_insights, user_id)
+    return format_insights(s), STATS_KB
+
+async def send_cached_stats(callback: CallbackQuery, period: str, render):
+    user_id = callback.from_user.id
+    text, kb = await stats_cache.get_or_render(user_id, period, lambda: render(user_id))
+    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
+    await callback.answer()
+
+@router.message(Command("cachestats"))
+@admin_only
+async def cmd_cache_stats(message: Message):
+    c = stats_cache.stats()
+    await message.answer(
+        f"🗄 Кэш статистики:\n"
+        f"• Попаданий: {c['hits']}\n"
+        f"• Промахов: {c['misses']}\n"
+        f"• Hit rate: {c['hit_rate']:.0%}\n"
+        f"• Записей: {c['size']}"
+    )
+
+@router.message(Command("metrics"))
+@admin_only
+async def cmd_metrics(message: Message):
+    await message.answer(metrics.summary(), parse_mode="HTML")
 
 @router.callback_query(F.data == "stats_today")
 async def cb_stats_today(callback: CallbackQuery):
-    if callback.from_user.id != ADMIN_ID:
+    if not is_registered(callback.from_user.id):
         return
-    s = get_stats_today()
-    await callback.message.edit_text(format_today_stats(s), parse_mode="HTML", reply_markup=stats_kb())
-    await callback.answer()
+    await send_cached_stats(callback, "today", render_today)
 
 @router.callback_query(F.data == "stats_week")
 async def cb_stats_week(callback: CallbackQuery):
-    if callback.from_user.id != ADMIN_ID:
+    if not is_registered(callback.from_user.id):
         return
-    s = get_stats_week()
-    await callback.message.edit_text(format_period_stats(s), parse_mode="HTML", reply_markup=stats_kb())
-    await callback.answer()
+    await send_cached_stats(callback, "week", render_week)
 
 @router.callback_query(F.data == "stats_month")
 async def cb_stats_month(callback: CallbackQuery):
-    if callback.from_user.id != ADMIN_ID:
+    if not is_registered(callback.from_user.id):
         return
-    s = get_stats_month()
-    await callback.message.edit_text(format_period_stats(s), parse_mode="HTML", reply_markup=stats_kb())
-    await callback.answer()
+    await send_cached_stats(callback, "month", render_month)
 
 @router.callback_query(F.data == "stats_30")
 async def cb_stats_30(callback: CallbackQuery):
-    if callback.from_user.id != ADMIN_ID:
+    if not is_registered(callback.from_user.id):
         return
-    s = get_stats_custom(30)
-    await callback.message.edit_text(format_period_stats(s), parse_mode="HTML", reply_markup=stats_kb())
-    await callback.answer()
+    await send_cached_stats(callback, "30", render_last_30)
 
 @router.callback_query(F.data == "stats_alltime")
 async def cb_stats_alltime(callback: CallbackQuery):
-    if callback.from_user.id != ADMIN_ID:
+    if not is_registered(callback.from_user.id):
+        return
+    await send_cached_stats(callback, "alltime", render_alltime)
+
+@router.callback_query(F.data == "stats_insights")
+async def cb_stats_insights(callback: CallbackQuery):
+    if not is_registered(callback.from_user.id):
         return
-    s = get_all_time_stats()
-    await callback.message.edit_text(format_alltime_stats(s), parse_mode="HTML", reply_markup=stats_kb())
+    await send_cached_stats(callback, "insights", render_insights)
+
+@router.callback_query(F.data.startswith("range:"))
+async def cb_stats_range(callback: CallbackQuery):
+    if not is_registered(callback.from_user.id):
+        return
+    _, start, end = callback.data.split(":")
+    s = await run_db(get_stats_range, callback.from_user.id, parse_date(start), parse_date(end))
+    await callback.message.edit_text(format_period_stats(s), parse_mode="HTML", reply_markup=period_kb(s))
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("days:"))
+async def cb_stats_days(callback: CallbackQuery):
+    if not is_registered(callback.from_user.id):
+        return
+    _, start, end, cursor = callback.data.split(":")
+    start, end = parse_date(start), parse_date(end)
+    after = cursor[1:] if cursor.startswith("a") else None
+    before = cursor[1:] if cursor.startswith("b") else None
+    page = await run_db(get_days_page, callback.from_user.id, start, end, after, before, DAYS_PAGE_SIZE)
+    await callback.message.edit_text(
+        format_days_page(start, end, page), parse_mode="HTML", reply_markup=days_page_kb(start, end, page)
+    )
     await callback.answer()
 
 @router.callback_query(F.data == "start_work")
 async def cb_start_work(callback: CallbackQuery):
-    if callback.from_user.id != ADMIN_ID:
+    if not is_registered(callback.from_user.id):
         return
-    session = get_session()
-    if session.get("active"):
+    user_id = callback.from_user.id
+    user = get_user(user_id)
+    if user.active:
         await callback.answer("Сессия уже активна!")
         return
-    update_session(active=True, state="working", completed_minutes=0)
-    data = load_data()
-    await callback.message.edit_text(f"🚀 Поехали! Работаем {data['session_minutes']} минут. Удачи! 💪")
+    update_session(user_id, active=True, state="working", completed_minutes=0)
+    text = f"🚀 Поехали! Работаем {user.session_minutes} минут. Удачи! 💪"
+    await callback.message.edit_text(text)
     await callback.answer()
-    await start_work_session()
+    await start_work_session(user_id)
+    show_countdown(user_id, callback.message.chat.id, callback.message.message_id, text)
 
 @router.callback_query(F.data == "continue_work")
 async def cb_continue_work(callback: CallbackQuery):
-    if callback.from_user.id != ADMIN_ID:
+    if not is_registered(callback.from_user.id):
+        return
+    user_id = callback.from_user.id
+    if get_user(user_id).state != "ready_check":
+        await callback.answer("Сессия уже активна!")
         return
-    update_session(state="working")
-    data = load_data()
-    await callback.message.edit_text(f"💪 Отлично! Работаем ещё {data['session_minutes']} минут!")
+    update_session(user_id, state="working")
+    text = f"💪 Отлично! Работаем ещё {get_user(user_id).session_minutes} минут!"
+    await callback.message.edit_text(text)
     await callback.answer()
-    await start_work_session()
+    await start_work_session(user_id)
+    show_countdown(user_id, callback.message.chat.id, callback.message.message_id, text)
 
 @router.callback_query(F.data == "force_start")
 async def cb_force_start(callback: CallbackQuery):
-    if callback.from_user.id != ADMIN_ID:
+    if not is_registered(callback.from_user.id):
         return
-    reset_session()
+    cancel_work_session(callback.from_user.id)
+    reset_session(callback.from_user.id)
     await callback.message.edit_text("🚀 Запускаю рабочую сессию прямо сейчас!")
     await callback.answer()
     from scheduler import send_work_start_prompt
-    await send_work_start_prompt()
+    await send_work_start_prompt(callback.from_user.id)
 
 @router.callback_query(F.data == "reset_session")
 async def cb_reset_session(callback: CallbackQuery):
-    if callback.from_user.id != ADMIN_ID:
+    if not is_registered(callback.from_user.id):
         return
-    reset_session()
+    cancel_work_session(callback.from_user.id)
+    reset_session(callback.from_user.id)
     await callback.answer("✅ Сессия сброшена")
-    await callback.message.edit_text("❌ Сессия сброшена.", reply_markup=admin_panel_kb())
+    await callback.message.edit_text("❌ Сессия сброшена.", reply_markup=admin_panel_kb(callback.from_user.id))
 
 @router.callback_query(F.data == "set_start_time")
 async def cb_set_start_time(callback: CallbackQuery, state: FSMContext):
-    if callback.from_user.id != ADMIN_ID:
+    if not is_registered(callback.from_user.id):
         return
     await state.set_state(AdminStates.waiting_start_time)
     await callback.message.answer("Введи время старта в формате ЧЧ:ММ (например 14:00):")
@@ -279,7 +567,7 @@ async def cb_set_start_time(callback: CallbackQuery, state: FSMContext):
 
 @router.callback_query(F.data == "set_work_duration")
 async def cb_set_work_duration(callback: CallbackQuery, state: FSMContext):
-    if callback.from_user.id != ADMIN_ID:
+    if not is_registered(callback.from_user.id):
         return
     await state.set_state(AdminStates.waiting_work_duration)
     await callback.message.answer("Введи общее время работы в минутах (например 120):")
@@ -287,7 +575,7 @@ async def cb_set_work_duration(callback: CallbackQuery, state: FSMContext):
 
 @router.callback_query(F.data == "set_session_duration")
 async def cb_set_session_duration(callback: CallbackQuery, state: FSMContext):
-    if callback.from_user.id != ADMIN_ID:
+    if not is_registered(callback.from_user.id):
         return
     await state.set_state(AdminStates.waiting_session_duration)
     await callback.message.answer("Введи длину одной рабочей сессии в минутах (например 30):")
@@ -295,7 +583,7 @@ async def cb_set_session_duration(callback: CallbackQuery, state: FSMContext):
 
 @router.callback_query(F.data == "set_break_duration")
 async def cb_set_break_duration(callback: CallbackQuery, state: FSMContext):
-    if callback.from_user.id != ADMIN_ID:
+    if not is_registered(callback.from_user.id):
         return
     await state.set_state(AdminStates.waiting_break_duration)
     await callback.message.answer("Введи длину перерыва в минутах (например 10):")
@@ -310,10 +598,10 @@ async def process_start_time(message: Message, state: FSMContext):
     except:
         await message.answer("Неверный формат. Введи время в формате ЧЧ:ММ:")
         return
-    set_setting("work_start_time", text)
-    reschedule_daily()
+    set_setting(message.from_user.id, "work_start_time", text)
+    reschedule_daily(message.from_user.id)
     await state.clear()
-    await message.answer(f"✅ Время старта обновлено: {text}", reply_markup=admin_panel_kb())
+    await message.answer(f"✅ Время старта обновлено: {text}", reply_markup=admin_panel_kb(message.from_user.id))
 
 @router.message(AdminStates.waiting_work_duration)
 async def process_work_duration(message: Message, state: FSMContext):
@@ -323,9 +611,9 @@ async def process_work_duration(message: Message, state: FSMContext):
     except:
         await message.answer("Введи положительное число:")
         return
-    set_setting("work_duration_minutes", value)
+    set_setting(message.from_user.id, "work_duration_minutes", value)
     await state.clear()
-    await message.answer(f"✅ Общее время работы: {value} мин", reply_markup=admin_panel_kb())
+    await message.answer(f"✅ Общее время работы: {value} мин", reply_markup=admin_panel_kb(message.from_user.id))
 
 @router.message(AdminStates.waiting_session_duration)
 async def process_session_duration(message: Message, state: FSMContext):
@@ -335,9 +623,9 @@ async def process_session_duration(message: Message, state: FSMContext):
     except:
         await message.answer("Введи положительное число:")
         return
-    set_setting("session_minutes", value)
+    set_setting(message.from_user.id, "session_minutes", value)
     await state.clear()
-    await message.answer(f"✅ Длина сессии: {value} мин", reply_markup=admin_panel_kb())
+    await message.answer(f"✅ Длина сессии: {value} мин", reply_markup=admin_panel_kb(message.from_user.id))
 
 @router.message(AdminStates.waiting_break_duration)
 async def process_break_duration(message: Message, state: FSMContext):
@@ -347,6 +635,6 @@ async def process_break_duration(message: Message, state: FSMContext):
     except:
         await message.answer("Введи положительное число:")
         return
-    set_setting("break_minutes", value)
+    set_setting(message.from_user.id, "break_minutes", value)
     await state.clear()
-    await message.answer(f"✅ Длина перерыва: {value} мин", reply_markup=admin_panel_kb())
+    await message.answer(f"✅ Длина перерыва: {value} мин", reply_markup=admin_panel_kb(message.from_user.id))
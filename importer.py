@@ -0,0 +1,170 @@
+import csv
+import gzip
+import json
+from datetime import date, datetime, timedelta
+
+from config import TIMEZONE
+from database import call_db, import_history_batch
+
+FORMATS = ("csv", "jsonl")
+BATCH_ROWS = 50_000
+SHARED_BATCH_ROWS = 2_000
+TRUE_VALUES = (True, 1, "1", "true", "True", "yes")
+
+
+class ImportFormatError(ValueError):
+    def __init__(self, line: int, message: str):
+        super().__init__(f"строка {line}: {message}")
+        self.line = line
+
+
+def detect_format(name: str) -> str:
+    name = name.lower().removesuffix(".gz")
+    return "jsonl" if name.endswith((".jsonl", ".json")) else "csv"
+
+
+def open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def read_records(f, fmt: str):
+    if fmt == "csv":
+        yield from enumerate(csv.DictReader(f), 2)
+        return
+    for line, text in enumerate(f, 1):
+        if not text.strip():
+            continue
+        try:
+            yield line, json.loads(text)
+        except ValueError:
+            raise ImportFormatError(line, "некорректный JSON")
+
+
+def _int(record: dict, field: str, line: int, required: bool = False):
+    value = record.get(field)
+    if value is None or value == "":
+        if required:
+            raise ImportFormatError(line, f"нет поля {field}")
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ImportFormatError(line, f"{field} не число: {value!r}")
+
+
+def _timestamp(record: dict, field: str, line: int, required: bool = False):
+    value = record.get(field)
+    if not value:
+        if required:
+            raise ImportFormatError(line, f"нет поля {field}")
+        return None
+    try:
+        ts = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ImportFormatError(line, f"{field} не ISO-время: {value!r}")
+    return ts.replace(tzinfo=TIMEZONE) if ts.tzinfo is None else ts.astimezone(TIMEZONE)
+
+
+def _date(record: dict, line: int):
+    value = record.get("date")
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise ImportFormatError(line, f"date не ГГГГ-ММ-ДД: {value!r}")
+
+
+def parse_records(records, user_id: int = None):
+    numbers = {}
+    for line, record in records:
+        uid = _int(record, "user_id", line) or user_id
+        if uid is None:
+            raise ImportFormatError(line, "нет user_id")
+        kind = record.get("record") or "session"
+        day = _date(record, line)
+        if kind == "day":
+            if day is None:
+                raise ImportFormatError(line, "нет поля date")
+            started = _timestamp(record, "started_at", line)
+            finished = _timestamp(record, "finished_at", line)
+            yield "day", (
+                uid, day, _int(record, "planned_minutes", line, True), _int(record, "worked_minutes", line) or 0,
+                _int(record, "sessions_completed", line) or 0, started and started.isoformat(),
+                finished and finished.isoformat(), record.get("completed") in TRUE_VALUES,
+            )
+        elif kind == "session":
+            started = _timestamp(record, "started_at", line, True)
+            finished = _timestamp(record, "finished_at", line)
+            if finished and finished < started:
+                raise ImportFormatError(line, "finished_at раньше started_at")
+            session_day = started.date().isoformat()
+            if day and day != session_day:
+                raise ImportFormatError(line, f"date {day} не совпадает с днём started_at {session_day} ({TIMEZONE})")
+            duration = _int(record, "duration_minutes", line)
+            if duration is None:
+                if finished is None:
+                    raise ImportFormatError(line, "нет duration_minutes и finished_at")
+                duration = round((finished - started).total_seconds() / 60)
+            elif finished is None:
+                finished = started + timedelta(minutes=duration)
+            number = _int(record, "session_number", line)
+            if number is None:
+                number = numbers.get((uid, session_day), 0) + 1
+            numbers[(uid, session_day)] = number
+            yield "session", (
+                uid, session_day, number, duration, started.isoformat(), finished.isoformat(),
+            )
+        else:
+            raise ImportFormatError(line, f"неизвестный тип записи {kind!r}")
+
+
+def _planned_minutes(user_id: int) -> int:
+    from storage import DEFAULT_SETTINGS, get_user
+    user = get_user(user_id)
+    return user.work_duration_minutes if user else DEFAULT_SETTINGS["work_duration_minutes"]
+
+
+def commit_on_db_thread(days: list, new_days: list, sessions: list) -> int:
+    return call_db(import_history_batch, days, new_days, sessions)
+
+
+def import_history(f, fmt: str, user_id: int = None, batch_rows: int = BATCH_ROWS,
+                   commit=import_history_batch) -> dict:
+    counts = {"days": 0, "sessions": 0, "inserted": 0, "batches": 0}
+    planned = {}
+    days, new_days, sessions, seen = [], [], [], set()
+
+    def flush():
+        counts["inserted"] += commit(days, new_days, sessions)
+        counts["batches"] += 1
+        counts["days"] += len(days)
+        counts["sessions"] += len(sessions)
+        days.clear()
+        new_days.clear()
+        sessions.clear()
+        seen.clear()
+
+    for kind, row in parse_records(read_records(f, fmt), user_id):
+        if kind == "day":
+            days.append(row)
+        else:
+            key = row[:2]
+            if key not in seen:
+                seen.add(key)
+                if row[0] not in planned:
+                    planned[row[0]] = _planned_minutes(row[0])
+                new_days.append((*key, planned[row[0]]))
+            sessions.append(row)
+        if len(days) + len(sessions) >= batch_rows:
+            flush()
+    if days or sessions:
+        flush()
+    return counts
+
+
+def import_file(path: str, fmt: str, user_id: int = None) -> dict:
+    with open_text(path) as f:
+        return import_history(f, fmt, user_id, SHARED_BATCH_ROWS, commit_on_db_thread)
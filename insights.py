@@ -0,0 +1,65 @@
+from datetime import date, datetime
+
+import numpy as np
+
+from config import TIMEZONE
+from database import load_insight_rows
+
+ROLLING_WINDOWS = (7, 30)
+ADHERENCE_PERCENTILES = (10, 25, 50, 75, 90)
+DURATION_EDGES = (0, 15, 25, 35, 50, 65, 95, 125)
+JULIAN_ORDINAL_OFFSET = 1721424
+
+
+def _columns(rows: list) -> np.ndarray:
+    return np.array(rows, dtype=np.int64).reshape(-1, 3).T
+
+
+def _rolling_means(daily: np.ndarray, window: int) -> np.ndarray:
+    if len(daily) < window:
+        return np.empty(0)
+    sums = np.cumsum(np.concatenate(([0], daily)))
+    return (sums[window:] - sums[:-window]) / window
+
+
+def compute_insights(user_id: int, today: date = None) -> dict:
+    session_rows, day_rows = load_insight_rows(user_id)
+    if not session_rows and not day_rows:
+        return {}
+    session_days, hours, durations = _columns(session_rows)
+    days, planned, worked = _columns(day_rows)
+
+    known = [column for column in (days, session_days) if len(column)]
+    first = min(int(column.min()) for column in known)
+    last = max(int(column.max()) for column in known)
+    today = today or datetime.now(TIMEZONE).date()
+    last = max(last, today.toordinal() + JULIAN_ORDINAL_OFFSET)
+    daily = np.zeros(last - first + 1, dtype=np.int64)
+    daily[days - first] = worked
+
+    rolling = {}
+    for window in ROLLING_WINDOWS:
+        means = _rolling_means(daily, window)
+        rolling[window] = {
+            "current": float(means[-1]) if len(means) else float(daily.sum() / window),
+            "best": float(means.max()) if len(means) else float(daily.sum() / window),
+        }
+
+    planned_days = planned > 0
+    adherence = worked[planned_days] / planned[planned_days]
+    percentiles = np.percentile(adherence, ADHERENCE_PERCENTILES) if len(adherence) else np.zeros(0)
+
+    counts, _ = np.histogram(durations, bins=(*DURATION_EDGES, np.iinfo(np.int64).max))
+    weekdays = (session_days + 1) % 7
+    return {
+        "sessions": len(durations),
+        "days": int(np.count_nonzero(worked)),
+        "hour_sessions": np.bincount(hours, minlength=24)[:24].tolist(),
+        "hour_minutes": np.bincount(hours, weights=durations, minlength=24)[:24].astype(np.int64).tolist(),
+        "weekday_minutes": np.bincount(weekdays, weights=durations, minlength=7).astype(np.int64).tolist(),
+        "weekday_days": np.bincount((days[worked > 0] + 1) % 7, minlength=7).tolist(),
+        "rolling": rolling,
+        "adherence": dict(zip(ADHERENCE_PERCENTILES, percentiles.tolist())),
+        "adherence_met": float(np.mean(adherence >= 1)) if len(adherence) else 0.0,
+        "durations": list(zip(DURATION_EDGES, counts.tolist())),
+    }
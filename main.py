@@ -1,22 +1,51 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
-from config import BOT_TOKEN
+from config import BOT_TOKEN, WEBHOOK_URL, METRICS_HOST, METRICS_PORT, CLUSTER_SHARDS, TELEGRAM_API_URL
+from cluster import run_cluster
+from dedup import callback_dedup
 from handlers import router
-from scheduler import start_scheduler
+from scheduler import start_scheduler, scheduler
+from storage import flush
+from database import close_db
+from fsm_storage import SQLiteStorage
+from outbox import outbox
+from webhook import run_webhook
+import metrics
 
 logging.basicConfig(level=logging.INFO)
 
 
 async def main():
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+    bot = Bot(token=BOT_TOKEN, session=session)
+    dp = Dispatcher(storage=SQLiteStorage())
+    dp.callback_query.outer_middleware(callback_dedup)
     dp.include_router(router)
+    bot.session.middleware(outbox)
+    if metrics.ENABLED:
+        metrics.install(dp, bot, scheduler)
+        if METRICS_PORT:
+            await metrics.start_server(METRICS_HOST, METRICS_PORT)
+    outbox.start()
     
-    await start_scheduler(bot)
-    await dp.start_polling(bot)
+    await start_scheduler(bot, sharded=bool(CLUSTER_SHARDS))
+    try:
+        if CLUSTER_SHARDS:
+            await run_cluster(dp, bot)
+        elif WEBHOOK_URL:
+            await run_webhook(dp, bot)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        await outbox.stop()
+        await bot.session.close()
+        flush()
+        close_db()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+import argparse
+import random
+import sys
+from datetime import date, datetime, time, timedelta
+
+import database
+
+GENERATE_BATCH_DAYS = 10_000
+
+
+def cmd_migrate(args):
+    applied = database.init_db()
+    if applied:
+        print(f"Applied migrations: {', '.join(map(str, applied))}.")
+    print(f"Schema version: {database.schema_version()}.")
+
+
+def cmd_rebuild_rollups(args):
+    database.init_db()
+    database.rebuild_rollups()
+    print("Rollups rebuilt.")
+
+
+def cmd_check_rollups(args):
+    database.init_db()
+    problems = database.check_rollups()
+    for problem in problems:
+        print(problem)
+    if problems:
+        print(f"{len(problems)} mismatches found.")
+        return 1
+    print("Rollups are consistent.")
+    return 0
+
+
+def _history_rows(user_id: int, first_day: date, days: int, sessions_per_day: int, session_minutes: int,
+                  break_minutes: int, day_id: int, rng: random.Random):
+    from config import TIMEZONE
+    planned = sessions_per_day * session_minutes
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        if rng.random() < 0.2:
+            continue
+        sessions = rng.randint(1, sessions_per_day)
+        started = datetime.combine(day, time(9), TIMEZONE) + timedelta(minutes=rng.randint(0, 120))
+        session_rows = []
+        for number in range(1, sessions + 1):
+            begin = started + timedelta(minutes=(number - 1) * (session_minutes + break_minutes))
+            end = begin + timedelta(minutes=session_minutes)
+            session_rows.append(
+                (day_id, user_id, number, session_minutes, begin.isoformat(), end.isoformat())
+            )
+        completed = sessions == sessions_per_day
+        day_row = (
+            day_id, user_id, day.isoformat(), planned, sessions * session_minutes, sessions,
+            started.isoformat(), end.isoformat() if completed else None, completed,
+        )
+        yield day_row, session_rows
+        day_id += 1
+
+
+def _insert_history(conn, day_rows: list, session_rows: list):
+    conn.executemany(
+        "INSERT INTO work_days (id, user_id, date, planned_minutes, worked_minutes, sessions_completed, "
+        "started_at, finished_at, completed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        day_rows
+    )
+    conn.executemany(
+        "INSERT INTO work_sessions (work_day_id, user_id, session_number, duration_minutes, started_at, "
+        "finished_at) VALUES (?, ?, ?, ?, ?, ?)",
+        session_rows
+    )
+
+
+def generate_history(users: int, years: float, sessions_per_day: int, session_minutes: int = 30,
+                     break_minutes: int = 10, first_user_id: int = 1, seed: int = None) -> dict:
+    from config import TIMEZONE
+    from storage import UserState
+    rng = random.Random(seed)
+    days = round(years * 365)
+    first_day = datetime.now(TIMEZONE).date() - timedelta(days=days - 1)
+    totals = {"users": users, "days": 0, "sessions": 0}
+    user_rows, day_rows, session_rows = [], [], []
+    with database.get_conn() as conn:
+        day_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM work_days").fetchone()[0]
+        for user_id in range(first_user_id, first_user_id + users):
+            user = UserState(user_id)
+            user.work_duration_minutes = sessions_per_day * session_minutes
+            user.session_minutes = session_minutes
+            user.break_minutes = break_minutes
+            user_rows.append(user.as_row())
+            for day_row, sessions in _history_rows(user_id, first_day, days, sessions_per_day, session_minutes,
+                                                   break_minutes, day_id, rng):
+                day_rows.append(day_row)
+                session_rows.extend(sessions)
+                day_id += 1
+                if len(day_rows) >= GENERATE_BATCH_DAYS:
+                    _insert_history(conn, day_rows, session_rows)
+                    totals["days"] += len(day_rows)
+                    totals["sessions"] += len(session_rows)
+                    day_rows, session_rows = [], []
+        _insert_history(conn, day_rows, session_rows)
+        totals["days"] += len(day_rows)
+        totals["sessions"] += len(session_rows)
+    database.save_user_rows(user_rows)
+    database.rebuild_rollups()
+    return totals
+
+
+def cmd_generate_history(args):
+    database.init_db()
+    totals = generate_history(
+        args.users, args.years, args.sessions_per_day, args.session_minutes, args.break_minutes,
+        args.first_user_id, args.seed
+    )
+    print(f"Generated {totals['days']:,} days and {totals['sessions']:,} sessions for {totals['users']:,} users.")
+
+
+def cmd_import_history(args):
+    import time as timer
+    from importer import ImportFormatError, detect_format, import_history, open_text
+    database.init_db()
+    fmt = args.format or detect_format(args.path)
+    start = timer.perf_counter()
+    try:
+        with open_text(args.path) as f:
+            counts = import_history(f, fmt, args.user_id, args.batch_rows)
+    except ImportFormatError as e:
+        print(f"Import failed at {e}. Earlier batches were committed.")
+        return 1
+    elapsed = timer.perf_counter() - start
+    rows = counts["days"] + counts["sessions"]
+    print(
+        f"Imported {counts['days']:,} day and {counts['sessions']:,} session records "
+        f"({counts['inserted']:,} new sessions) in {counts['batches']} batches, "
+        f"{elapsed:.1f} s, {rows / elapsed * 60 if elapsed else 0:,.0f} rows/min."
+    )
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Work tracker maintenance commands")
+    parser.add_argument("--db", default=database.DB_FILE, help="path to the SQLite database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("migrate", help="apply pending schema migrations")
+    commands.add_parser("rebuild-rollups", help="recompute stats rollup tables from work_days")
+    commands.add_parser("check-rollups", help="compare stats rollup tables against work_days")
+    generate = commands.add_parser("generate-history", help="fill the database with synthetic work history")
+    generate.add_argument("--users", type=int, default=100)
+    generate.add_argument("--years", type=float, default=3)
+    generate.add_argument("--sessions-per-day", type=int, default=4)
+    generate.add_argument("--session-minutes", type=int, default=30)
+    generate.add_argument("--break-minutes", type=int, default=10)
+    generate.add_argument("--first-user-id", type=int, default=1)
+    generate.add_argument("--seed", type=int)
+
+    import_parser = commands.add_parser("import-history", help="bulk import days and sessions from CSV/JSONL")
+    import_parser.add_argument("path", help="CSV or JSONL file, optionally gzip-compressed")
+    import_parser.add_argument("--format", choices=("csv", "jsonl"), help="default: detect from the file name")
+    import_parser.add_argument("--user-id", type=int, help="owner of rows without a user_id column")
+    import_parser.add_argument("--batch-rows", type=int, default=50_000)
+
+    args = parser.parse_args(argv)
+    database.DB_FILE = args.db
+    handler = {
+        "migrate": cmd_migrate,
+        "rebuild-rollups": cmd_rebuild_rollups,
+        "check-rollups": cmd_check_rollups,
+        "generate-history": cmd_generate_history,
+        "import-history": cmd_import_history,
+    }[args.command]
+    try:
+        return handler(args) or 0
+    finally:
+        database.close_db()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from functools import wraps
+
+from config import METRICS_ENABLED
+
+log = logging.getLogger(__name__)
+
+ENABLED = METRICS_ENABLED
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+METRICS = {
+    "bot_handler_seconds": ("histogram", "Handler latency by handler"),
+    "bot_handler_errors_total": ("counter", "Handler exceptions by handler"),
+    "bot_db_seconds": ("histogram", "database.py call latency by function"),
+    "bot_db_rows_total": ("counter", "Rows returned or written by database.py function"),
+    "bot_db_event_flushes_total": ("counter", "Group commits of queued session events"),
+    "bot_db_events_flushed_total": ("counter", "Session events written by group commits"),
+    "bot_db_events_dropped_total": ("counter", "Session events rolled back and dropped because they failed to apply"),
+    "bot_storage_loads_total": ("counter", "User registry loads"),
+    "bot_storage_load_rows_total": ("counter", "User rows loaded into the registry"),
+    "bot_storage_flushes_total": ("counter", "User registry flushes"),
+    "bot_storage_flush_rows_total": ("counter", "User rows written by registry flushes"),
+    "bot_storage_flush_bytes_total": ("counter", "Approximate payload bytes written by registry flushes"),
+    "bot_fsm_cache_hits_total": ("counter", "FSM state reads served from the in-memory LRU"),
+    "bot_fsm_cache_misses_total": ("counter", "FSM state reads that went to SQLite"),
+    "bot_fsm_flushed_total": ("counter", "FSM records written or deleted by batched flushes"),
+    "bot_fsm_expired_total": ("counter", "Idle FSM records dropped after the TTL"),
+    "bot_callbacks_deduplicated_total": ("counter", "Duplicate callback queries dropped before the handlers by reason"),
+    "bot_live_sessions": ("gauge", "Session messages with a live countdown"),
+    "bot_live_refresh_seconds": ("gauge", "Current refresh interval of each live countdown message"),
+    "bot_live_edits_total": ("counter", "Countdown refreshes by result: sent, unchanged or failed"),
+    "bot_live_ticks_coalesced_total": ("counter", "Countdown ticks skipped while the previous batch of edits was in flight"),
+    "bot_cluster_fenced_writes_total": ("counter", "Writes skipped because the lease token was no longer current"),
+    "bot_cluster_shards_owned": ("gauge", "Shards owned by this worker"),
+    "bot_cluster_updates_total": ("counter", "Updates processed from the shared inbox"),
+    "bot_job_lag_seconds": ("histogram", "Delay between planned and actual scheduler job start"),
+    "bot_jobs_missed_total": ("counter", "Scheduler jobs skipped past their misfire grace time"),
+    "bot_timer_lag_seconds": ("histogram", "Delay between session timer deadline and firing"),
+    "bot_timer_retries_total": ("counter", "Session transitions re-armed after their callback failed"),
+    "bot_api_seconds": ("histogram", "Telegram Bot API request latency by method"),
+    "bot_api_errors_total": ("counter", "Telegram Bot API request errors by method"),
+}
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def copy(self) -> "Histogram":
+        histogram = Histogram(self.buckets)
+        histogram.counts = self.counts.copy()
+        histogram.sum = self.sum
+        histogram.count = self.count
+        return histogram
+
+    def quantile(self, q: float) -> float:
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+_lock = threading.Lock()
+_counters: dict = {}
+_histograms: dict = {}
+
+
+def inc(name: str, value: float = 1, **labels):
+    if not ENABLED:
+        return
+    key = (name, tuple(labels.items()))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    if not ENABLED:
+        return
+    key = (name, tuple(labels.items()))
+    with _lock:
+        _counters[key] = value
+
+
+def observe(name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels):
+    if not ENABLED:
+        return
+    key = (name, tuple(labels.items()))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+
+def _snapshot() -> tuple:
+    with _lock:
+        return dict(_counters), {key: h.copy() for key, h in _histograms.items()}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _row_count(result) -> int:
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return len(result.get("days") or result.get("sessions") or ()) or int(bool(result))
+    return int(result is not None and result is not False)
+
+
+def timed_db(func):
+    if not ENABLED:
+        return func
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        observe("bot_db_seconds", time.perf_counter() - start, function=name)
+        inc("bot_db_rows_total", _row_count(result), function=name)
+        return result
+
+    return wrapper
+
+
+class HandlerMetrics:
+    async def __call__(self, handler, event, data):
+        name = data["handler"].callback.__name__
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            inc("bot_handler_errors_total", handler=name)
+            raise
+        finally:
+            observe("bot_handler_seconds", time.perf_counter() - start, handler=name)
+
+
+class ApiMetrics:
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            inc("bot_api_errors_total", method=name)
+            raise
+        finally:
+            observe("bot_api_seconds", time.perf_counter() - start, method=name)
+
+
+def job_listener(event):
+    from apscheduler.events import EVENT_JOB_MISSED
+    job = event.job_id.split(":")[0]
+    if event.code == EVENT_JOB_MISSED:
+        inc("bot_jobs_missed_total", job=job)
+        return
+    planned = max(event.scheduled_run_times)
+    observe("bot_job_lag_seconds", (datetime.now(planned.tzinfo) - planned).total_seconds(), LAG_BUCKETS, job=job)
+
+
+def install(dp, bot, scheduler):
+    from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED
+    dp.message.middleware(HandlerMetrics())
+    dp.callback_query.middleware(HandlerMetrics())
+    bot.session.middleware(ApiMetrics())
+    scheduler.add_listener(job_listener, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED)
+
+
+def _format_labels(labels: tuple, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render() -> str:
+    counters, histograms = _snapshot()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind in ("counter", "gauge"):
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            continue
+        for (metric, labels), h in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(h.buckets, h.counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{name}_bucket{_format_labels(labels, le)} {h.count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {h.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+    return "\n".join(lines) + "\n"
+
+
+def _fmt_seconds(seconds: float) -> str:
+    if seconds == float("inf"):
+        return "∞"
+    if seconds >= 1:
+        return f"{seconds:.1f} с"
+    return f"{seconds * 1000:.1f} мс" if seconds < 0.01 else f"{seconds * 1000:.0f} мс"
+
+
+def _top(histograms: dict, name: str, limit: int) -> list:
+    rows = [(dict(labels), h) for (metric, labels), h in histograms.items() if metric == name and h.count]
+    return sorted(rows, key=lambda row: row[1].sum, reverse=True)[:limit]
+
+
+def summary() -> str:
+    if not ENABLED:
+        return "📈 Метрики отключены (METRICS_ENABLED=0)."
+    counters, histograms = _snapshot()
+    lines = ["📈 <b>Метрики</b>"]
+    sections = (
+        ("Обработчики", "bot_handler_seconds", "handler"),
+        ("База данных", "bot_db_seconds", "function"),
+        ("Telegram API", "bot_api_seconds", "method"),
+        ("Лаг задач", "bot_job_lag_seconds", "job"),
+        ("Лаг таймеров", "bot_timer_lag_seconds", "transition"),
+    )
+    for title, name, label in sections:
+        rows = _top(histograms, name, 8)
+        if not rows:
+            continue
+        lines += ["", f"<b>{title}</b> (вызовов · среднее · p95):"]
+        for labels, h in rows:
+            lines.append(
+                f"• {labels.get(label, '—')}: {h.count} · {_fmt_seconds(h.sum / h.count)} · ≤{_fmt_seconds(h.quantile(0.95))}"
+            )
+    flushes = counters.get(("bot_storage_flushes_total", ()), 0)
+    if flushes:
+        rows = counters.get(("bot_storage_flush_rows_total", ()), 0)
+        size = counters.get(("bot_storage_flush_bytes_total", ()), 0)
+        lines += ["", f"<b>Реестр</b>: {flushes} сохранений, {rows} строк, {size / 1024:.1f} КБ"]
+    commits = counters.get(("bot_db_event_flushes_total", ()), 0)
+    if commits:
+        events = counters.get(("bot_db_events_flushed_total", ()), 0)
+        lines.append(f"<b>События сессий</b>: {events} в {commits} групповых коммитах ({events / commits:.1f} за коммит)")
+    return "\n".join(lines)
+
+
+async def start_server(host: str, port: int):
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("Metrics endpoint on http://%s:%s/metrics", host, port)
+    return runner
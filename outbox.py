@@ -0,0 +1,187 @@
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery
+
+log = logging.getLogger(__name__)
+
+GLOBAL_RATE = 25.0
+GLOBAL_BURST = 5
+CHAT_RATE = 1.0
+CHAT_BURST = 5
+WORKERS = 8
+MAX_RETRIES = 5
+
+INTERACTIVE = 0
+NORMAL = 1
+BROADCAST = 2
+
+_priority = contextvars.ContextVar("outbox_priority", default=NORMAL)
+
+
+@contextmanager
+def priority(level: int):
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        self._refill(now)
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        return now >= self.blocked_until and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class Outbox(BaseRequestMiddleware):
+    def __init__(self, workers: int = WORKERS):
+        self.workers = workers
+        self._queue: asyncio.PriorityQueue = None
+        self._gate: asyncio.Lock = None
+        self._tasks = []
+        self._counter = itertools.count()
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_BURST)
+        self._chats = {}
+        self._futures = set()
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def pending(self) -> int:
+        return len(self._futures)
+
+    async def __call__(self, make_request, bot, method):
+        interactive = isinstance(method, AnswerCallbackQuery)
+        if not self.running or not (interactive or hasattr(method, "chat_id")):
+            return await make_request(bot, method)
+        level = INTERACTIVE if interactive else _priority.get()
+        future = asyncio.get_running_loop().create_future()
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        self._queue.put_nowait((level, next(self._counter), make_request, bot, method, future, 0))
+        return await future
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= 10_000:
+                now = time.monotonic()
+                self._chats = {key: b for key, b in self._chats.items() if not b.idle(now)}
+            bucket = self._chats[chat_id] = TokenBucket(CHAT_RATE, CHAT_BURST)
+        return bucket
+
+    def _requeue(self, item: tuple, delay: float):
+        def put():
+            if self._queue is not None:
+                self._queue.put_nowait(item)
+
+        asyncio.get_running_loop().call_later(delay, put)
+
+    async def _next(self) -> tuple:
+        while True:
+            wait = self._global.delay(time.monotonic())
+            if wait > 0:
+                await asyncio.sleep(wait)
+            item = await self._queue.get()
+            level, _, _, _, method, future, _ = item
+            if future.done():
+                continue
+            chat_id = getattr(method, "chat_id", None)
+            chat = self._chat_bucket(chat_id) if chat_id is not None and level != INTERACTIVE else None
+            wait = chat.delay(time.monotonic()) if chat else 0.0
+            if wait > 0:
+                self._requeue(item, wait)
+                continue
+            self._global.take()
+            if chat:
+                chat.take()
+            return item, chat
+
+    async def _send(self, item: tuple, chat: TokenBucket):
+        level, seq, make_request, bot, method, future, attempt = item
+        try:
+            result = await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            self.retries += 1
+            if attempt < MAX_RETRIES:
+                (chat or self._global).blocked_until = time.monotonic() + e.retry_after
+                log.warning("Flood control on chat %s, retry in %ss", getattr(method, "chat_id", None), e.retry_after)
+                self._requeue((level, seq, make_request, bot, method, future, attempt + 1), e.retry_after)
+                return
+            self.failed += 1
+            if not future.done():
+                future.set_exception(e)
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+            raise
+        except Exception as e:
+            self.failed += 1
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self.sent += 1
+            if not future.done():
+                future.set_result(result)
+
+    async def _worker(self):
+        while True:
+            async with self._gate:
+                item, chat = await self._next()
+            await self._send(item, chat)
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._gate = asyncio.Lock()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0):
+        if not self.running:
+            return
+        if self._futures:
+            await asyncio.wait(set(self._futures), timeout=timeout)
+        if self._futures:
+            log.warning("Outbox stopped with %d pending requests", len(self._futures))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        for future in list(self._futures):
+            future.cancel()
+
+
+outbox = Outbox()
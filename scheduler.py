@@ -1,114 +1,251 @@
-import asyncio
+import gc
+import logging
+import time
+from datetime import datetime
+from functools import wraps
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from aiogram import Bot
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-from config import ADMIN_ID, TIMEZONE
-from storage import load_data, get_session, update_session, reset_session
-from database import record_session_start, record_session_end, record_day_complete
+from config import TIMEZONE
+from storage import load_users, mark_loaded, all_users, get_user, update_session, reset_session
+from database import (
+    run_db, record_session_start, record_session_end, load_open_sessions, close_orphan_sessions, expire_streaks,
+)
+from ticker import LiveCountdown
+from timers import TimerQueue
+from outbox import priority, BROADCAST
+import metrics
+
+log = logging.getLogger(__name__)
+
+RETRY_SECONDS = 5
+RETRY_MAX_SECONDS = 300
+RETRY_ATTEMPTS = 8
 
 scheduler = AsyncIOScheduler(timezone=TIMEZONE)
+timers = TimerQueue()
+countdown = LiveCountdown()
 _bot: Bot = None
-_session_task: asyncio.Task = None
-_current_session_db_id: int = None
-_session_counter: int = 0
 
-async def send_work_start_prompt():
-    session = get_session()
-    if session["active"]:
-        return
-    reset_session()
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    kb = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="🚀 Начать работу", callback_data="start_work")
-    ]])
-    data = load_data()
-    await _bot.send_message(
-        ADMIN_ID,
-        f"⏰ Время работать!\n\nСегодня план: {data['work_duration_minutes']} мин "
-        f"по {data['session_minutes']} мин сессиям.\n\nНажми кнопку чтобы начать!",
-        reply_markup=kb
-    )
+START_WORK_KB = InlineKeyboardMarkup(inline_keyboard=[[
+    InlineKeyboardButton(text="🚀 Начать работу", callback_data="start_work")
+]])
+CONTINUE_WORK_KB = InlineKeyboardMarkup(inline_keyboard=[[
+    InlineKeyboardButton(text="💪 Да, готов!", callback_data="continue_work")
+]])
 
-async def run_work_session():
-    global _session_task, _current_session_db_id, _session_counter
-    data = load_data()
-    session_min = data["session_minutes"]
-    break_min = data["break_minutes"]
-    warning_min = data["warning_before_end_minutes"]
-    total_work = data["work_duration_minutes"]
-
-    session = get_session()
-    completed = session.get("completed_minutes", 0)
+async def send_work_start_prompt(user_id: int):
+    user = get_user(user_id)
+    if user is None or user.active:
+        return
+    reset_session(user_id)
+    with priority(BROADCAST):
+        await _bot.send_message(
+            user_id,
+            f"⏰ Время работать!\n\nСегодня план: {user.work_duration_minutes} мин "
+            f"по {user.session_minutes} мин сессиям.\n\nНажми кнопку чтобы начать!",
+            reply_markup=START_WORK_KB
+        )
 
-    _session_counter += 1
-    _current_session_db_id = record_session_start(_session_counter, session_min)
+def _arm(user_id: int, deadline: float, transition: str):
+    update_session(user_id, deadline=deadline, next_transition=transition)
+    timers.schedule(user_id, deadline, _TRANSITIONS[transition], user_id)
 
-    update_session(active=True, state="working", completed_minutes=completed)
-    await asyncio.sleep(session_min * 60)
+def _retrying(transition):
+    @wraps(transition)
+    async def fire(user_id: int, attempt: int = 0):
+        user = get_user(user_id)
+        armed = user and (user.next_transition, user.deadline)
+        try:
+            await transition(user_id)
+        except Exception:
+            user = get_user(user_id)
+            if user is None or (user.next_transition, user.deadline) != armed:
+                raise
+            if attempt >= RETRY_ATTEMPTS:
+                log.exception("Transition %s for user %s failed %d times, resetting the session",
+                              transition.__name__, user_id, attempt + 1)
+                countdown.untrack(user_id)
+                reset_session(user_id)
+                return
+            delay = min(RETRY_SECONDS * 2 ** attempt, RETRY_MAX_SECONDS)
+            log.exception("Transition %s for user %s failed, retrying in %d s", transition.__name__, user_id, delay)
+            metrics.inc("bot_timer_retries_total", transition=transition.__name__)
+            timers.schedule(user_id, time.time() + delay, fire, user_id, attempt + 1)
+    return fire
 
-    record_session_end(_current_session_db_id, session_min)
-    completed += session_min
-    update_session(completed_minutes=completed)
+@_retrying
+async def _on_session_end(user_id: int):
+    countdown.untrack(user_id)
+    user = get_user(user_id)
+    ended = user.deadline or time.time()
+    session_min = user.session_minutes
+    total_work = user.work_duration_minutes
+    completed = user.completed_minutes + session_min
+    day_done = completed >= total_work
+    await run_db(
+        record_session_end, user_id, user.session_db_id, session_min, completed if day_done else None,
+        datetime.fromtimestamp(ended, TIMEZONE)
+    )
+    update_session(user_id, completed_minutes=completed, session_db_id=None)
 
-    if completed >= total_work:
-        record_day_complete(completed)
-        reset_session()
-        _session_counter = 0
+    if day_done:
+        reset_session(user_id)
+        update_session(user_id, session_counter=0)
         await _bot.send_message(
-            ADMIN_ID,
+            user_id,
             f"🎉 Рабочий день завершён!\n\n"
             f"✅ Отработано: {completed} мин\n"
             f"💼 Сессий: {completed // session_min}\n\n"
             f"Ты молодец! Отдыхай 😊\n\nСтатистика: /stats"
         )
-        reschedule_daily()
+        reschedule_daily(user_id)
         return
 
-    update_session(state="break")
+    break_min = user.break_minutes
+    warning_min = user.warning_before_end_minutes
+    update_session(user_id, state="break")
+    warning_after = (break_min - warning_min) * 60
+    if warning_after > 0:
+        _arm(user_id, ended + warning_after, "break_warning")
+    else:
+        _arm(user_id, ended + break_min * 60, "break_end")
     await _bot.send_message(
-        ADMIN_ID,
+        user_id,
         f"✅ Сессия завершена! Отработано сегодня: {completed} / {total_work} мин\n\n"
         f"😌 Отдохни {break_min} минут. Заслужил!"
     )
 
-    warning_after = (break_min - warning_min) * 60
-    if warning_after > 0:
-        await asyncio.sleep(warning_after)
-        await _bot.send_message(ADMIN_ID, f"⏳ Через {warning_min} мин снова за работу!")
-        await asyncio.sleep(warning_min * 60)
-    else:
-        await asyncio.sleep(break_min * 60)
-
-    update_session(state="ready_check")
-    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    kb = InlineKeyboardMarkup(inline_keyboard=[[
-        InlineKeyboardButton(text="💪 Да, готов!", callback_data="continue_work")
-    ]])
-    await _bot.send_message(ADMIN_ID, "🔔 Отдых закончился!\n\nГотов продолжать?", reply_markup=kb)
-
-def reschedule_daily():
-    if scheduler.get_job("work_start"):
-        scheduler.remove_job("work_start")
-    data = load_data()
-    hour, minute = data["work_start_time"].split(":")
+@_retrying
+async def _on_break_warning(user_id: int):
+    user = get_user(user_id)
+    warning_min = user.warning_before_end_minutes
+    _arm(user_id, (user.deadline or time.time()) + warning_min * 60, "break_end")
+    await _bot.send_message(user_id, f"⏳ Через {warning_min} мин снова за работу!")
+
+@_retrying
+async def _on_break_end(user_id: int):
+    await _bot.send_message(user_id, "🔔 Отдых закончился!\n\nГотов продолжать?", reply_markup=CONTINUE_WORK_KB)
+    update_session(user_id, state="ready_check", deadline=None, next_transition=None)
+
+_TRANSITIONS = {
+    "session_end": _on_session_end,
+    "break_warning": _on_break_warning,
+    "break_end": _on_break_end,
+}
+
+def reschedule_daily(user_id: int):
+    user = get_user(user_id)
+    hour, minute = user.work_start_time.split(":")
     scheduler.add_job(
         send_work_start_prompt,
         CronTrigger(hour=int(hour), minute=int(minute), timezone=TIMEZONE),
-        id="work_start",
+        args=(user_id,),
+        id=f"work_start:{user_id}",
+        replace_existing=True
+    )
+
+async def start_work_session(user_id: int):
+    timers.cancel(user_id)
+    user = get_user(user_id)
+    session_min = user.session_minutes
+    session_number = user.session_counter + 1
+    session_db_id = await run_db(record_session_start, user_id, session_number, session_min)
+    update_session(
+        user_id, active=True, state="working", completed_minutes=user.completed_minutes,
+        session_counter=session_number, session_db_id=session_db_id
+    )
+    _arm(user_id, time.time() + session_min * 60, "session_end")
+
+def show_countdown(user_id: int, chat_id: int, message_id: int, header: str):
+    user = get_user(user_id)
+    if user.deadline is not None and user.next_transition == "session_end":
+        countdown.track(user_id, chat_id, message_id, header, user.deadline - user.session_minutes * 60, user.deadline)
+
+def cancel_work_session(user_id: int):
+    timers.cancel(user_id)
+    countdown.untrack(user_id)
+    update_session(user_id, deadline=None, next_transition=None)
+
+async def recover_sessions(user_ids: set = None) -> dict:
+    live = set()
+    armed = []
+    now = time.time()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        open_sessions = {
+            row[0]: row for row in await run_db(load_open_sessions) if user_ids is None or row[1] in user_ids
+        }
+        users = all_users() if user_ids is None else [get_user(user_id) for user_id in user_ids]
+        for user in users:
+            if user.deadline is None and user.state == "working" and user.session_db_id in open_sessions:
+                _, _, started_at, duration_minutes = open_sessions[user.session_db_id]
+                started = datetime.fromisoformat(started_at).timestamp()
+                update_session(user.user_id, deadline=started + duration_minutes * 60, next_transition="session_end")
+            if user.deadline is None or user.next_transition not in _TRANSITIONS:
+                continue
+            armed.append((user.user_id, user.deadline, _TRANSITIONS[user.next_transition], user.user_id))
+            if user.next_transition == "session_end":
+                live.add(user.session_db_id)
+        timers.schedule_many(armed)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    overdue = sum(1 for timer in armed if timer[1] <= now)
+    orphans = [session_id for session_id in open_sessions if session_id not in live]
+    if orphans:
+        await run_db(close_orphan_sessions, orphans)
+    log.info("Recovered %d sessions (%d overdue), closed %d orphaned", len(armed), overdue, len(orphans))
+    return {"resumed": len(armed), "overdue": overdue, "orphans": len(orphans)}
+
+async def roll_over_day():
+    expired = await run_db(expire_streaks)
+    log.info("Day rollover: %d streaks expired", expired)
+
+def pending_timers() -> int:
+    return timers.pending()
+
+def add_global_jobs():
+    scheduler.add_job(
+        roll_over_day,
+        CronTrigger(hour=0, minute=0, timezone=TIMEZONE),
+        id="day_rollover",
         replace_existing=True
     )
 
-async def start_work_session():
-    global _session_task
-    if _session_task and not _session_task.done():
-        _session_task.cancel()
-    _session_task = asyncio.create_task(run_work_session())
+def remove_global_jobs():
+    if scheduler.get_job("day_rollover"):
+        scheduler.remove_job("day_rollover")
+
+async def attach_users(user_ids: list) -> dict:
+    recovered = await recover_sessions(set(user_ids))
+    for user_id in user_ids:
+        reschedule_daily(user_id)
+    return recovered
 
-async def start_scheduler(bot: Bot):
+def detach_users(user_ids: list):
+    for user_id in user_ids:
+        timers.cancel(user_id)
+        countdown.untrack(user_id)
+        if scheduler.get_job(f"work_start:{user_id}"):
+            scheduler.remove_job(f"work_start:{user_id}")
+
+async def start_scheduler(bot: Bot, sharded: bool = False):
     global _bot
     _bot = bot
     from database import init_db
-    init_db()
+    await run_db(init_db)
+    if sharded:
+        mark_loaded()
+    else:
+        await run_db(load_users)
+        await recover_sessions()
+        add_global_jobs()
     scheduler.start()
-    reschedule_daily()
+    timers.start()
+    countdown.start(bot)
+    for user in all_users():
+        reschedule_daily(user.user_id)
@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+MAX_ENTRIES = 4096
+
+_entries: OrderedDict = OrderedDict()
+_epoch = 0
+_versions: dict = {}
+_hits = 0
+_misses = 0
+
+
+def invalidate(user_id: int = None):
+    global _epoch
+    if user_id is None:
+        _epoch += 1
+    else:
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+
+
+def period_start(period: str) -> str:
+    from config import TIMEZONE
+    today = datetime.now(TIMEZONE).date()
+    if period == "week":
+        return (today - timedelta(days=today.weekday())).isoformat()
+    if period == "month":
+        return today.replace(day=1).isoformat()
+    return today.isoformat()
+
+
+async def get_or_render(user_id: int, period: str, render):
+    global _hits, _misses
+    key = (user_id, period, period_start(period), _epoch, _versions.get(user_id, 0))
+    if key in _entries:
+        _entries.move_to_end(key)
+        _hits += 1
+        return _entries[key]
+    _misses += 1
+    value = await render()
+    _entries[key] = value
+    while len(_entries) > MAX_ENTRIES:
+        _entries.popitem(last=False)
+    return value
+
+
+def stats() -> dict:
+    total = _hits + _misses
+    return {
+        "hits": _hits,
+        "misses": _misses,
+        "size": len(_entries),
+        "hit_rate": _hits / total if total else 0.0,
+    }
+
+
+def clear():
+    global _hits, _misses
+    _entries.clear()
+    _hits = 0
+    _misses = 0
@@ -1,56 +1,236 @@
+import atexit
+import gc
 import json
 import os
+import threading
+from operator import attrgetter
+
+import metrics
 
 DATA_FILE = "data.json"
+FLUSH_DELAY_SECONDS = 1.0
 
-DEFAULT_DATA = {
+DEFAULT_SETTINGS = {
     "work_start_time": "14:00",
     "work_duration_minutes": 120,
     "session_minutes": 30,
     "break_minutes": 10,
     "warning_before_end_minutes": 3,
-    "session": {
-        "active": False,
-        "completed_minutes": 0,
-        "state": "idle"
-    }
 }
 
-def load_data() -> dict:
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r") as f:
-            data = json.load(f)
-        for key, value in DEFAULT_DATA.items():
-            if key not in data:
-                data[key] = value
-        return data
-    return DEFAULT_DATA.copy()
-
-def save_data(data: dict):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-
-def get_setting(key: str):
-    return load_data()[key]
-
-def set_setting(key: str, value):
-    data = load_data()
-    data[key] = value
-    save_data(data)
-
-def get_session() -> dict:
-    return load_data()["session"]
-
-def update_session(**kwargs):
-    data = load_data()
-    data["session"].update(kwargs)
-    save_data(data)
-
-def reset_session():
-    data = load_data()
-    data["session"] = {
-        "active": False,
-        "completed_minutes": 0,
-        "state": "idle"
-    }
-    save_data(data)
+SETTING_KEYS = tuple(DEFAULT_SETTINGS)
+SESSION_KEYS = (
+    "active", "completed_minutes", "state", "session_counter", "session_db_id", "deadline", "next_transition",
+)
+USER_COLUMNS = ("user_id", *SETTING_KEYS, *SESSION_KEYS)
+
+
+class UserState:
+    __slots__ = (*USER_COLUMNS, "version")
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        for key, value in DEFAULT_SETTINGS.items():
+            setattr(self, key, value)
+        self.session_counter = 0
+        self.session_db_id = None
+        self.version = 0
+        self.reset()
+
+    def reset(self):
+        self.active = False
+        self.completed_minutes = 0
+        self.state = "idle"
+        self.deadline = None
+        self.next_transition = None
+
+    @classmethod
+    def from_row(cls, row) -> "UserState":
+        user = cls.__new__(cls)
+        for column, value in zip(USER_COLUMNS, row):
+            setattr(user, column, value)
+        user.active = bool(user.active)
+        user.version = 0
+        return user
+
+    def as_row(self) -> tuple:
+        return _row_getter(self)
+
+
+_row_getter = attrgetter(*USER_COLUMNS)
+
+
+_lock = threading.RLock()
+_users: dict = {}
+_dirty: set = set()
+_loaded = False
+_version = 0
+_flush_timer: threading.Timer = None
+
+
+def _import_legacy_file():
+    from config import ADMIN_ID
+    if not ADMIN_ID or not os.path.exists(DATA_FILE):
+        return
+    with open(DATA_FILE, "r") as f:
+        data = json.load(f)
+    user = UserState(ADMIN_ID)
+    for key in SETTING_KEYS:
+        if key in data:
+            setattr(user, key, data[key])
+    _users[ADMIN_ID] = user
+    _dirty.add(ADMIN_ID)
+
+
+def load_users():
+    global _loaded
+    from database import load_user_rows
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        rows = load_user_rows()
+        with _lock:
+            _users.clear()
+            for row in rows:
+                user = UserState.from_row(row)
+                _users[user.user_id] = user
+            if not _users:
+                _import_legacy_file()
+            _loaded = True
+        metrics.inc("bot_storage_loads_total")
+        metrics.inc("bot_storage_load_rows_total", len(rows))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    flush()
+
+
+def mark_loaded():
+    global _loaded
+    _loaded = True
+
+
+def load_shard(shard: int, shards: int) -> list:
+    from database import load_user_rows
+    rows = load_user_rows(shard, shards)
+    with _lock:
+        for row in rows:
+            user = UserState.from_row(row)
+            _users[user.user_id] = user
+    metrics.inc("bot_storage_loads_total")
+    metrics.inc("bot_storage_load_rows_total", len(rows))
+    return [row[0] for row in rows]
+
+
+def drop_users(user_ids: list):
+    flush()
+    with _lock:
+        for user_id in user_ids:
+            _users.pop(user_id, None)
+            _dirty.discard(user_id)
+
+
+def _ensure_loaded():
+    if not _loaded:
+        load_users()
+
+
+def _mark_dirty(user: UserState, settings_changed: bool = False):
+    global _version, _flush_timer
+    with _lock:
+        _dirty.add(user.user_id)
+        if settings_changed:
+            user.version += 1
+            _version += 1
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(FLUSH_DELAY_SECONDS, _flush_soon)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+
+def _flush_soon():
+    from database import submit_db
+    submit_db(flush)
+
+
+def flush():
+    global _flush_timer
+    with _lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+        if not _dirty:
+            return
+        dirty = set(_dirty)
+        rows = [_users[user_id].as_row() for user_id in dirty]
+        _dirty.clear()
+    from database import save_user_rows
+    try:
+        save_user_rows(rows)
+    except BaseException:
+        with _lock:
+            _dirty.update(dirty)
+        raise
+    if metrics.ENABLED:
+        metrics.inc("bot_storage_flushes_total")
+        metrics.inc("bot_storage_flush_rows_total", len(rows))
+        metrics.inc("bot_storage_flush_bytes_total", sum(len(repr(row)) for row in rows))
+
+
+def settings_version() -> int:
+    return _version
+
+
+def get_user(user_id: int) -> UserState:
+    _ensure_loaded()
+    return _users.get(user_id)
+
+
+def is_registered(user_id: int) -> bool:
+    return get_user(user_id) is not None
+
+
+def register_user(user_id: int) -> UserState:
+    _ensure_loaded()
+    with _lock:
+        user = _users.get(user_id)
+        if user is None:
+            user = _users[user_id] = UserState(user_id)
+            _mark_dirty(user, settings_changed=True)
+        return user
+
+
+def all_users() -> list:
+    _ensure_loaded()
+    return list(_users.values())
+
+
+def get_setting(user_id: int, key: str):
+    return getattr(get_user(user_id), key)
+
+
+def set_setting(user_id: int, key: str, value):
+    with _lock:
+        user = get_user(user_id)
+        if getattr(user, key) == value:
+            return
+        setattr(user, key, value)
+        _mark_dirty(user, settings_changed=True)
+
+
+def update_session(user_id: int, **kwargs):
+    with _lock:
+        user = get_user(user_id)
+        for key, value in kwargs.items():
+            setattr(user, key, value)
+        _mark_dirty(user)
+
+
+def reset_session(user_id: int):
+    with _lock:
+        user = get_user(user_id)
+        user.reset()
+        _mark_dirty(user)
+
+
+atexit.register(flush)
@@ -0,0 +1,145 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+import metrics
+from config import LIVE_EDIT_RATE
+from outbox import priority, BROADCAST
+
+log = logging.getLogger(__name__)
+
+TICK_SECONDS = 1.0
+MIN_REFRESH_SECONDS = 10.0
+
+
+class LiveMessage:
+    __slots__ = ("chat_id", "message_id", "header", "started", "deadline", "text")
+
+    def __init__(self, chat_id: int, message_id: int, header: str, started: float, deadline: float):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.header = header
+        self.started = started
+        self.deadline = deadline
+        self.text = header
+
+
+def render(live: LiveMessage, now: float) -> str:
+    from handlers import progress_bar, fmt_minutes
+    total = live.deadline - live.started
+    elapsed = min(total, max(0.0, now - live.started))
+    remaining = max(0, math.ceil((live.deadline - now) / 60))
+    return f"{live.header}\n\n{progress_bar(int(elapsed), int(total))}\n⏳ Осталось: {fmt_minutes(remaining)}"
+
+
+class LiveCountdown:
+    def __init__(self, edit_rate: float = LIVE_EDIT_RATE):
+        self.edit_rate = edit_rate
+        self.bot: Bot = None
+        self._live = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._task: asyncio.Task = None
+        self._batch: asyncio.Task = None
+        self.edits = 0
+        self.unchanged = 0
+
+    def track(self, user_id: int, chat_id: int, message_id: int, header: str, started: float, deadline: float):
+        if not self.edit_rate:
+            return
+        live = self._live[user_id] = LiveMessage(chat_id, message_id, header, started, deadline)
+        heapq.heappush(self._heap, (time.time() + TICK_SECONDS, next(self._counter), user_id, live))
+
+    def untrack(self, user_id: int) -> bool:
+        if self._live.pop(user_id, None) is None:
+            return False
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._live):
+            self._heap = [e for e in self._heap if self._live.get(e[2]) is e[3]]
+            heapq.heapify(self._heap)
+        return True
+
+    def pending(self) -> int:
+        return len(self._live)
+
+    def refresh_seconds(self) -> float:
+        return max(MIN_REFRESH_SECONDS, len(self._live) / self.edit_rate) if self.edit_rate else 0.0
+
+    def _collect(self, now: float) -> list:
+        budget = max(1, int(self.edit_rate * TICK_SECONDS))
+        refresh = self.refresh_seconds()
+        batch = []
+        while self._heap and self._heap[0][0] <= now and len(batch) < budget:
+            _, _, user_id, live = heapq.heappop(self._heap)
+            if self._live.get(user_id) is not live:
+                continue
+            if now >= live.deadline:
+                del self._live[user_id]
+                continue
+            text = render(live, now)
+            if text == live.text:
+                self.unchanged += 1
+                metrics.inc("bot_live_edits_total", result="unchanged")
+            else:
+                batch.append((user_id, live, text))
+            heapq.heappush(self._heap, (now + refresh, next(self._counter), user_id, live))
+        return batch
+
+    async def _edit(self, user_id: int, live: LiveMessage, text: str):
+        try:
+            with priority(BROADCAST):
+                await self.bot.edit_message_text(text, chat_id=live.chat_id, message_id=live.message_id)
+        except TelegramBadRequest as e:
+            if "not modified" not in e.message:
+                metrics.inc("bot_live_edits_total", result="failed")
+                if self._live.get(user_id) is live:
+                    self.untrack(user_id)
+                return
+        except Exception:
+            metrics.inc("bot_live_edits_total", result="failed")
+            log.exception("Countdown edit failed for user %s", user_id)
+            return
+        live.text = text
+        self.edits += 1
+        metrics.inc("bot_live_edits_total", result="sent")
+
+    async def _send(self, batch: list):
+        await asyncio.gather(*(self._edit(*item) for item in batch))
+
+    def tick(self, now: float):
+        if self._batch is not None and not self._batch.done():
+            metrics.inc("bot_live_ticks_coalesced_total")
+            return
+        batch = self._collect(now)
+        if batch:
+            self._batch = asyncio.create_task(self._send(batch))
+        metrics.set_gauge("bot_live_sessions", len(self._live))
+        metrics.set_gauge("bot_live_refresh_seconds", self.refresh_seconds())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(TICK_SECONDS)
+            try:
+                self.tick(time.time())
+            except Exception:
+                log.exception("Countdown tick failed")
+
+    def start(self, bot: Bot):
+        self.bot = bot
+        if self.edit_rate and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        for task in (self._task, self._batch):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._batch = None
@@ -0,0 +1,94 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+
+class TimerQueue:
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task = None
+        self._running = set()
+
+    def schedule(self, key, deadline: float, callback, *args):
+        self.cancel(key)
+        entry = [deadline, next(self._counter), key, callback, args]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def schedule_many(self, timers: list):
+        for key, deadline, callback, *args in timers:
+            self.cancel(key)
+            entry = [deadline, next(self._counter), key, callback, tuple(args)]
+            self._entries[key] = entry
+            self._heap.append(entry)
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    def cancel(self, key) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[3] = None
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._entries):
+            self._heap = [e for e in self._heap if e[3] is not None]
+            heapq.heapify(self._heap)
+        return True
+
+    def deadline(self, key) -> float:
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def pending(self) -> int:
+        return len(self._entries)
+
+    def _fire_due(self, now: float):
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key, callback, args = heapq.heappop(self._heap)
+            if callback is None:
+                continue
+            del self._entries[key]
+            metrics.observe("bot_timer_lag_seconds", now - deadline, metrics.LAG_BUCKETS, transition=callback.__name__)
+            task = asyncio.create_task(callback(*args))
+            self._running.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        self._running.discard(task)
+        if not task.cancelled() and task.exception():
+            log.error("Timer callback failed", exc_info=task.exception())
+
+    async def run(self):
+        while True:
+            self._fire_due(time.time())
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            if timeout is not None and timeout <= 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
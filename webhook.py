@@ -0,0 +1,115 @@
+import asyncio
+import hmac
+import logging
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, MAX_CONCURRENT_UPDATES
+
+log = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+DRAIN_TIMEOUT_SECONDS = 30.0
+
+
+class WebhookServer:
+    def __init__(self, dp: Dispatcher, bot: Bot, secret: str = WEBHOOK_SECRET,
+                 max_concurrent: int = MAX_CONCURRENT_UPDATES, path: str = WEBHOOK_PATH, ingest=None):
+        if not secret:
+            raise ValueError("WEBHOOK_SECRET must be set in webhook mode")
+        self.dp = dp
+        self.bot = bot
+        self.ingest = ingest
+        self.secret = secret
+        self.path = path
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._tasks = set()
+        self._closing = False
+        self._runner: web.AppRunner = None
+        self.port = None
+
+    def _authorized(self, request: web.Request) -> bool:
+        return hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return web.Response(status=401)
+        if self._closing:
+            return web.Response(status=503)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except ValueError:
+            return web.Response(status=400)
+        if self.ingest is not None:
+            try:
+                await self.ingest(self.bot, update)
+            except Exception:
+                log.exception("Failed to queue update %s", update.update_id)
+                return web.Response(status=503)
+            return web.Response()
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update):
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            log.exception("Failed to process update %s", update.update_id)
+        finally:
+            self._semaphore.release()
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def start(self, host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT, reuse_port: bool = False):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port, reuse_port=reuse_port or None)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        log.info("Webhook server listening on %s:%s%s", host, self.port, self.path)
+
+    async def stop(self, timeout: float = DRAIN_TIMEOUT_SECONDS):
+        self._closing = True
+        if self._tasks:
+            log.info("Draining %d in-flight updates", len(self._tasks))
+            _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+        await self._runner.cleanup()
+
+
+async def wait_for_shutdown():
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+    await stopped.wait()
+
+
+async def set_webhook(dp: Dispatcher, bot: Bot):
+    await bot.set_webhook(
+        WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    server = WebhookServer(dp, bot)
+    await server.start()
+    await set_webhook(dp, bot)
+    await dp.emit_startup(bot=bot)
+    try:
+        await wait_for_shutdown()
+    finally:
+        await server.stop()
+        await dp.emit_shutdown(bot=bot)